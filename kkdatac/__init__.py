@@ -1,13 +1,42 @@
+from .client import KKDataClient, get_client
+from .aio import AsyncKKDataClient, get_async_client, async_sql, async_get_price
+from .cache import QueryCache, enable_cache, disable_cache
+from .panel import Panel
+from .factor_engine import FactorEngine
+from .ticks import TickStream, subscribe_ticks
 from .wrapper import (
     get_price,
     get_fundamentals,
+    get_fundamentals_pit,
     get_trading_dates,
-    sql
+    get_previous_trading_date,
+    get_next_trading_date,
+    get_latest_trading_date,
+    sql,
+    iter_sql
 )
 
 __all__ = [
+    "KKDataClient",
+    "get_client",
+    "AsyncKKDataClient",
+    "get_async_client",
+    "async_sql",
+    "async_get_price",
+    "QueryCache",
+    "enable_cache",
+    "disable_cache",
+    "Panel",
+    "FactorEngine",
+    "TickStream",
+    "subscribe_ticks",
     "get_price",
     "get_fundamentals", 
+    "get_fundamentals_pit",
     "get_trading_dates",
-    "sql"
+    "get_previous_trading_date",
+    "get_next_trading_date",
+    "get_latest_trading_date",
+    "sql",
+    "iter_sql"
 ]
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""
+Forward (pre) and backward (post) price adjustment.
+
+Adjustment factors are fetched once per symbol and kept in-process as their change
+points only, so a symbol with ten years of history usually costs a handful of entries.
+Applying them is one binary search over a (symbol, date) key for all rows at once,
+followed by an in-place multiply per price column; nothing loops over rows in Python.
+"""
+import threading
+import time
+import numpy as np
+import pandas as pd
+from kkdatac.client import get_client
+from kkdatac.codec import concat_frames
+from kkdatac.config import ADJ_FACTOR_TTL, SHARD_SIZE, MAX_CONCURRENCY
+from kkdatac.utils.query_templates import QueryTemplates
+from kkdatac.utils.sharding import chunk_list
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'pre_close', 'limit_up', 'limit_down')
+ADJUST_TYPES = ('none', 'pre', 'post')
+
+# Keys combine a symbol index with days since the epoch, offset so that days within
+# ~1400 years either side of 1970 fit in 20 non-negative bits
+_DAY_BITS = 20
+_DAY_OFFSET = 1 << (_DAY_BITS - 1)
+
+
+def _to_days(values) -> np.ndarray:
+    """Dates or timestamps as int64 days since the epoch, parsing each distinct value once"""
+    row_values, uniques = pd.factorize(np.asarray(values))
+    days = pd.to_datetime(uniques).to_numpy().astype('datetime64[D]').astype(np.int64)
+    return days[row_values]
+
+
+def _keys(symbols: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """Sortable (symbol, day) keys"""
+    return (symbols.astype(np.int64) << _DAY_BITS) | (days + _DAY_OFFSET)
+
+
+class AdjFactorStore:
+    def __init__(self, ttl: float = ADJ_FACTOR_TTL, api_key: str | None = None, base_url: str | None = None):
+        """
+        :param ttl: seconds before a symbol's factors are fetched again
+        :param api_key: API key used to fetch factors
+        :param base_url: kkdatad endpoint used to fetch factors
+        """
+        self.ttl = ttl
+        self.api_key = api_key
+        self.base_url = base_url
+        # ts_code -> (change point days, factors, first day covered or None for full history, loaded at)
+        self._factors: dict[str, tuple[np.ndarray, np.ndarray, int | None, float]] = {}
+        self._lock = threading.Lock()
+
+    def _missing(self, ts_codes, start_day: int | None) -> list[str]:
+        now = time.time()
+        missing = []
+        for code in ts_codes:
+            entry = self._factors.get(code)
+            if (entry is None or now - entry[3] >= self.ttl
+                    or (entry[2] is not None and (start_day is None or start_day < entry[2]))):
+                missing.append(code)
+        return missing
+
+    def load(self, ts_codes, start_date=None, max_workers: int = MAX_CONCURRENCY) -> None:
+        """
+        Fetch factors for the symbols not held yet (or held from a later date than start_date).
+        Pre-adjustment needs the latest factor, so factors are always fetched up to today.
+        """
+        start_day = int(_to_days([start_date])[0]) if start_date else None
+        with self._lock:
+            missing = self._missing(dict.fromkeys(ts_codes), start_day)
+        if not missing:
+            return
+        # Fetch without the lock so that readers of symbols already held are not blocked
+        queries = [QueryTemplates.adj_factor(codes, start_date) for codes in chunk_list(missing, SHARD_SIZE)]
+        client = get_client(api_key=self.api_key, base_url=self.base_url)
+        df = concat_frames(client.run_queries(queries, max_workers=max_workers))
+        with self._lock:
+            # A concurrent load may have stored some of them meanwhile, possibly from an earlier date
+            self._store(self._missing(missing, start_day), df, start_day)
+
+    def _store(self, ts_codes: list[str], df: pd.DataFrame, start_day: int | None) -> None:
+        if not ts_codes:
+            return
+        now = time.time()
+        empty = (np.empty(0, np.int64), np.empty(0, np.float64), start_day, now)
+        for code in ts_codes:
+            self._factors[code] = empty
+        if df.empty:
+            return
+        codes = df['ts_code'].to_numpy()
+        days = _to_days(df['trade_date'])
+        factors = df['adj_factor'].to_numpy(dtype=np.float64)
+        order = np.lexsort((days, codes))
+        codes, days, factors = codes[order], days[order], factors[order]
+        # Keep only the rows where a symbol's factor changes
+        keep = np.ones(len(codes), dtype=bool)
+        keep[1:] = (codes[1:] != codes[:-1]) | (factors[1:] != factors[:-1])
+        codes, days, factors = codes[keep], days[keep], factors[keep]
+        uniques, starts = np.unique(codes, return_index=True)
+        bounds = np.append(starts, len(codes))
+        wanted = set(ts_codes)
+        for i, code in enumerate(uniques):
+            if code not in wanted:
+                continue
+            lo, hi = bounds[i], bounds[i + 1]
+            self._factors[code] = (days[lo:hi], factors[lo:hi], start_day, now)
+
+    def ratio(self, ts_codes, days: np.ndarray, adjust_type: str) -> np.ndarray:
+        """
+        Multiplier for each (symbol, day) row, days given as int64 days since the epoch:
+        the factor in force on that day for 'post', divided by the symbol's latest factor
+        for 'pre'. Rows without factors get 1.
+        """
+        if adjust_type not in ADJUST_TYPES:
+            raise ValueError(f"Unknown adjust type: {adjust_type}")
+        row_symbols, symbols = pd.factorize(np.asarray(ts_codes))
+        if adjust_type == 'none' or len(row_symbols) == 0:
+            return np.ones(len(row_symbols))
+        entries = [self._factors.get(code, (np.empty(0, np.int64), np.empty(0), None, 0)) for code in symbols]
+        sizes = np.array([len(e[0]) for e in entries])
+        if sizes.sum() == 0:
+            return np.ones(len(row_symbols))
+        point_symbols = np.repeat(np.arange(len(symbols)), sizes)
+        point_keys = _keys(point_symbols, np.concatenate([e[0] for e in entries]))
+        point_factors = np.concatenate([e[1] for e in entries])
+
+        row_keys = _keys(row_symbols, np.asarray(days, dtype=np.int64))
+        pos = np.searchsorted(point_keys, row_keys, side='right') - 1
+        # Rows before a symbol's first change point use its first factor
+        first = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        pos = np.maximum(pos, first[row_symbols])
+        valid = (row_symbols >= 0) & (sizes[row_symbols] > 0)
+        pos = np.where(valid, pos, 0)
+        result = np.where(valid, point_factors[pos], 1.0)
+        if adjust_type == 'pre':
+            last = np.cumsum(sizes) - 1
+            latest = np.where(sizes > 0, point_factors[np.maximum(last, 0)], 1.0)
+            result /= latest[np.maximum(row_symbols, 0)]
+        return result
+
+
+def adjust_prices(
+    df: pd.DataFrame,
+    adjust_type: str,
+    date_col: str = 'trade_date',
+    store: 'AdjFactorStore | None' = None,
+    price_columns=PRICE_COLUMNS,
+):
+    """
+    Adjust the price columns of a DataFrame or pyarrow.Table of bars in internal codes.
+    Works for daily and minute bars alike: minute timestamps use their day's factor.
+    """
+    is_frame = isinstance(df, pd.DataFrame)
+    names = df.columns if is_frame else df.column_names
+    columns = [c for c in price_columns if c in names]
+    if adjust_type == 'none' or not columns or len(df) == 0:
+        return df
+    store = store or get_adj_factor_store()
+    codes = df['ts_code'].to_numpy() if is_frame else df.column('ts_code').to_numpy()
+    dates = df[date_col].to_numpy() if is_frame else df.column(date_col).to_numpy()
+    days = _to_days(dates)
+    store.load(pd.unique(codes), np.datetime64(int(days.min()), 'D'))
+    ratio = store.ratio(codes, days, adjust_type)
+    for column in columns:
+        if is_frame:
+            values = df[column].to_numpy()
+            df[column] = (values * ratio).astype(values.dtype, copy=False)
+        else:
+            import pyarrow as pa
+            values = df.column(column).to_numpy()
+            df = df.set_column(names.index(column), column, pa.array((values * ratio).astype(values.dtype, copy=False)))
+    return df
+
+
+_store: AdjFactorStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_adj_factor_store() -> AdjFactorStore:
+    """Return the shared adjustment factor store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AdjFactorStore()
+    return _store
@@ -0,0 +1,486 @@
+"""
+asyncio client for kkdatad.
+
+AsyncKKDataClient mirrors KKDataClient's query and factor endpoints on an aiohttp
+connection pool. Each endpoint group ("sql", "factors") is bounded by its own semaphore,
+requests honour per-call timeouts and cancellation, and response decoding runs in a
+worker thread so large results do not stall the event loop.
+"""
+import asyncio
+import json
+import warnings
+import weakref
+import pandas as pd
+from urllib.parse import quote
+from kkdatac import metrics
+from kkdatac.cache import QueryCache, cache_namespace, default_cache
+from kkdatac.client import _check_return_type, _factor_format, _frame_result
+from kkdatac.codec import (
+    DATASET_EVICTED_STATUSES,
+    UPLOAD_CONTENT_TYPES,
+    UPLOAD_UNSUPPORTED_STATUS,
+    accept_header,
+    cast_floats,
+    concat_frames,
+    decode_body,
+    decode_records,
+    frame_digest,
+    spool_encoded,
+    to_arrow,
+)
+from kkdatac.config import (
+    KKDATAD_ENDPOINT,
+    POOL_MAXSIZE,
+    MAX_RETRIES,
+    RETRY_BACKOFF_FACTOR,
+    RETRY_STATUS_FORCELIST,
+    PREFER_BINARY,
+    RESULT_FORMAT,
+    UPLOAD_FORMAT,
+    UPLOAD_CHUNK_ROWS,
+    SHARD_SIZE,
+    SHARD_DAYS,
+    ASYNC_CONCURRENCY,
+    ASYNC_TIMEOUT,
+)
+from kkdatac.resample import base_table, resample_bars
+from kkdatac.utils.code_converter import CodeConverter
+from kkdatac.utils.sharding import chunk_list, split_date_range
+from kkdatac.utils.query_templates import Query, bind_params, date_column, query_text
+from kkdatac.wrapper import (
+    _adjust_price,
+    _as_return_type,
+    _convert_code_column,
+    _get_table_by_frequency,
+    _price_queries,
+    _result_format,
+    _sort_bars,
+)
+
+
+# Same span names as the synchronous client
+_NETWORK_SPANS = {'sql': 'query.network', 'factors': 'factors.network'}
+
+
+def _import_aiohttp():
+    """Import aiohttp, which is only needed for the asyncio client."""
+    try:
+        import aiohttp
+    except ImportError as e:
+        raise ImportError(
+            "aiohttp is required for AsyncKKDataClient, install it with `pip install kkdatac[async]`"
+        ) from e
+    return aiohttp
+
+
+def _join(values: str | list[str] | None) -> str | None:
+    return values if isinstance(values, str) or values is None else ",".join(values)
+
+
+def _params(params: dict) -> dict:
+    """Drop unset query parameters and stringify the rest, as requests does."""
+    return {k: str(v) for k, v in params.items() if v is not None}
+
+
+class AsyncKKDataClient:
+    def __init__(
+        self,
+        base_url: str = KKDATAD_ENDPOINT,
+        api_key: str | None = None,
+        pool_maxsize: int = POOL_MAXSIZE,
+        concurrency: dict[str, int] | None = None,
+        timeout: float | None = ASYNC_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        cache: QueryCache | None = None,
+    ):
+        """
+        Initialize the client with the base URL of the kkdatad server and an API key.
+        :param pool_maxsize: maximum open connections in the client's pool
+        :param concurrency: in-flight requests allowed per endpoint group, defaults to ASYNC_CONCURRENCY
+        :param timeout: default total timeout of a request in seconds
+        :param max_retries: retries with exponential backoff on connection errors and 5xx responses
+        :param cache: query cache, defaults to the shared one from kkdatac.cache.enable_cache
+        """
+        self.base_url = base_url or KKDATAD_ENDPOINT
+        self.api_key = api_key
+        self.headers = {'api_key': self.api_key} if self.api_key else {}
+        self.pool_maxsize = pool_maxsize
+        self.concurrency = {**ASYNC_CONCURRENCY, **(concurrency or {})}
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.cache = cache
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        # Digests of the datasets this client has uploaded to the server
+        self._datasets: set[str] = set()
+        self._session = None
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            aiohttp = _import_aiohttp()
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_maxsize),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    def _semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            semaphore = self._semaphores[endpoint] = asyncio.Semaphore(self.concurrency.get(endpoint, 8))
+        return semaphore
+
+    async def close(self) -> None:
+        """Close all pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def cache_namespace(self) -> str:
+        return cache_namespace(self.base_url, self.api_key)
+
+    async def _request(
+        self,
+        method: str,
+        endpoint: str,
+        url: str,
+        action: str,
+        timeout: float | None = None,
+        expected: tuple[int, ...] = (200,),
+        **kwargs,
+    ) -> tuple[int, str, bytes]:
+        """
+        Send a request while holding the endpoint group's semaphore and return the
+        response's status, content type and body. Statuses other than expected raise;
+        connection errors and 5xx responses of GETs and read-only SQL POSTs are retried
+        with exponential backoff, other POSTs are sent once.
+        """
+        aiohttp = _import_aiohttp()
+        session = await self._get_session()
+        if timeout is not None:
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+        max_retries = self.max_retries if method == 'GET' or endpoint == 'sql' else 0
+        async with self._semaphore(endpoint):
+            for attempt in range(max_retries + 1):
+                retry = attempt < max_retries
+                if hasattr(kwargs.get('data'), 'seek'):
+                    # File bodies are read to the end by each attempt
+                    kwargs['data'].seek(0)
+                try:
+                    with metrics.span(_NETWORK_SPANS[endpoint], action=action, attempt=attempt):
+                        async with session.request(method, url, **kwargs) as response:
+                            body = await response.read()
+                    if response.status in expected:
+                        return response.status, response.content_type, body
+                    if not (retry and response.status in RETRY_STATUS_FORCELIST):
+                        raise Exception(f"Failed to {action}: {response.status} - {body.decode(errors='replace')}")
+                    reason = str(response.status)
+                except aiohttp.ClientConnectionError as e:
+                    if not retry:
+                        raise
+                    reason = type(e).__name__
+                metrics.count("http.retries", method=method, reason=reason)
+                await asyncio.sleep(RETRY_BACKOFF_FACTOR * 2 ** attempt)
+
+    async def _get_json(self, url: str, action: str, timeout: float | None = None, **kwargs):
+        _, _, body = await self._request('GET', 'factors', url, action, timeout=timeout,
+                                         headers=self.headers, **kwargs)
+        return json.loads(body)
+
+    async def _get_frame(
+        self,
+        url: str,
+        action: str,
+        params: dict,
+        binary: bool = PREFER_BINARY,
+        result_format: str = RESULT_FORMAT,
+        return_type: str = "pandas",
+        float_dtype: str | None = None,
+        timeout: float | None = None,
+    ):
+        """GET a factor endpoint in the binary encodings of run_query and decode the frame off the loop."""
+        headers = {**self.headers, 'accept': accept_header(result_format, binary)}
+        _, media, body = await self._request('GET', 'factors', url, action, timeout=timeout,
+                                             headers=headers, params=params)
+        data = await asyncio.to_thread(decode_records, media, body, "arrow" if return_type == "arrow" else "pandas")
+        return cast_floats(data, float_dtype)
+
+    async def run_query(
+        self,
+        sql_query: str | Query,
+        binary: bool = PREFER_BINARY,
+        result_format: str = RESULT_FORMAT,
+        return_type: str = "pandas",
+        use_cache: bool = True,
+        timeout: float | None = None,
+    ):
+        """
+        Send a SQL query to the kkdatad server and return the result as a pandas DataFrame,
+        or a pyarrow.Table with return_type='arrow'. See KKDataClient.run_query.
+        """
+        _check_return_type(return_type)
+        cache = (self.cache or default_cache()) if use_cache and QueryCache.cacheable(sql_query) else None
+        if cache is not None:
+            data = await asyncio.to_thread(cache.get, sql_query, self.cache_namespace)
+            if data is not None:
+                return to_arrow(data) if return_type == "arrow" else data
+
+        headers = {'accept': accept_header(result_format, binary)}
+        if self.api_key is None:
+            warnings.warn("API key is not set. Using free version now. Some features may not be available.")
+            url = f"{self.base_url}/sql-free/?query={quote(query_text(sql_query))}"
+        else:
+            url = f"{self.base_url}/sql/?query={quote(query_text(sql_query))}"
+            headers['api-key'] = self.api_key
+        _, media, body = await self._request('POST', 'sql', url, 'query data', timeout=timeout, headers=headers)
+
+        if cache is None:
+            return await asyncio.to_thread(decode_body, media, body, return_type)
+        data = await asyncio.to_thread(decode_body, media, body)
+        await asyncio.to_thread(cache.put, sql_query, data, self.cache_namespace)
+        return to_arrow(data) if return_type == "arrow" else data
+
+    async def run_queries(self, sql_queries: list[str | Query], **kwargs) -> list:
+        """Run several queries concurrently and return their results in input order."""
+        return list(await asyncio.gather(*(self.run_query(query, **kwargs) for query in sql_queries)))
+
+    async def create_factor(self, name: str, description: str, category: str, code: str,
+                            metadata: dict = None, is_public: bool = False) -> dict:
+        """Create a new factor"""
+        url = f"{self.base_url}/api/v1/factors/"
+        payload = {
+            "name": name,
+            "description": description,
+            "category": category,
+            "code": code,
+            "metadata": metadata or {},
+            "is_public": is_public
+        }
+        _, _, body = await self._request('POST', 'factors', url, 'create factor', json=payload, headers=self.headers)
+        return json.loads(body)
+
+    async def list_factors(self, category: str = None) -> list:
+        """List available factors"""
+        url = f"{self.base_url}/api/v1/factors/"
+        return await self._get_json(url, 'list factors', params=_params({"category": category}))
+
+    async def get_factor(self, factor_id: int) -> dict:
+        """Get factor details"""
+        return await self._get_json(f"{self.base_url}/api/v1/factors/{factor_id}", 'get factor')
+
+    async def evaluate_factor(
+        self,
+        factor_id: int,
+        returns_data: pd.DataFrame,
+        upload_format: str = UPLOAD_FORMAT,
+        chunk_rows: int | None = UPLOAD_CHUNK_ROWS,
+        reuse_dataset: bool = True,
+    ) -> dict:
+        """
+        Evaluate factor performance; see KKDataClient.evaluate_factor, whose upload,
+        dataset reuse and fallback rules this follows. The body is encoded off the loop.
+        """
+        if upload_format not in UPLOAD_CONTENT_TYPES:
+            raise ValueError(f"Unknown upload format: {upload_format}")
+        url = f"{self.base_url}/api/v1/factors/{factor_id}/evaluate"
+        dataset_id = await asyncio.to_thread(frame_digest, returns_data)
+        if reuse_dataset and dataset_id in self._datasets:
+            status, _, body = await self._request('POST', 'factors', url, 'evaluate factor',
+                                                  expected=(200, *DATASET_EVICTED_STATUSES), headers=self.headers,
+                                                  json={"returns_dataset": dataset_id})
+            if status == 200:
+                return json.loads(body)
+            self._datasets.discard(dataset_id)
+
+        payload = await asyncio.to_thread(spool_encoded, returns_data, upload_format, chunk_rows)
+        headers = {**self.headers, 'content-type': UPLOAD_CONTENT_TYPES[upload_format]}
+        with payload:
+            status, _, body = await self._request('POST', 'factors', url, 'evaluate factor',
+                                                  expected=(200, UPLOAD_UNSUPPORTED_STATUS),
+                                                  data=payload, params={"dataset_id": dataset_id}, headers=headers)
+        if status == UPLOAD_UNSUPPORTED_STATUS:
+            _, _, body = await self._request('POST', 'factors', url, 'evaluate factor',
+                                             json={"returns_data": returns_data.to_dict()}, headers=self.headers)
+        else:
+            self._datasets.add(dataset_id)
+        return json.loads(body)
+
+    async def get_factor_data(
+        self,
+        order_book_ids: str | list[str],
+        factors: str | list[str] | None = None,
+        start_date: str | None = None,
+        end_date: str | None = None,
+        universe: str | None = None,
+        expect_df: bool = True,
+        shard_size: int | None = SHARD_SIZE,
+        shard_days: int | None = SHARD_DAYS,
+        timeout: float | None = None,
+        return_type: str = "pandas",
+        binary: bool = PREFER_BINARY,
+        result_format: str | None = None,
+        float_dtype: str | None = None,
+    ) -> pd.DataFrame:
+        """
+        Get factor data from server, sharded like KKDataClient.get_factor_data and
+        fetched concurrently within the "factors" concurrency limit.
+        """
+        _check_return_type(return_type, ("pandas", "arrow", "panel"))
+        shards = [
+            (codes, start, end)
+            for codes in (chunk_list(order_book_ids, shard_size) if expect_df else [order_book_ids])
+            for start, end in (split_date_range(start_date, end_date, shard_days) if expect_df
+                               else [(start_date, end_date)])
+        ]
+        url = f"{self.base_url}/api/v1/factors/data"
+        shard_requests = [
+            (url, 'get factor data', _params({
+                "order_book_ids": _join(codes),
+                "factors": _join(factors),
+                "start_date": start,
+                "end_date": end,
+                "universe": universe,
+                "expect_df": expect_df
+            }))
+            for codes, start, end in shards
+        ]
+        if not expect_df:
+            url, action, params = shard_requests[0]
+            return (await self._get_json(url, action, timeout=timeout, params=params))["data"]
+        result_format = _factor_format(result_format, return_type)
+        parts = await asyncio.gather(*(
+            self._get_frame(*request, binary, result_format, return_type, float_dtype, timeout)
+            for request in shard_requests
+        ))
+        return _frame_result(concat_frames(list(parts)), return_type)
+
+    async def get_factor_exposure(
+        self,
+        order_book_ids: str | list[str],
+        start_date: str,
+        end_date: str,
+        factors: str | list[str] | None = None,
+        industry_mapping: str = 'sws_2021',
+        timeout: float | None = None,
+        return_type: str = "pandas",
+        binary: bool = PREFER_BINARY,
+        result_format: str | None = None,
+        float_dtype: str | None = None,
+    ) -> pd.DataFrame:
+        """Get factor exposure data; see KKDataClient.get_factor_exposure"""
+        _check_return_type(return_type, ("pandas", "arrow", "panel"))
+        url = f"{self.base_url}/api/v1/factors/exposure"
+        data = await self._get_frame(url, 'get factor exposure', _params({
+            "order_book_ids": _join(order_book_ids),
+            "start_date": start_date,
+            "end_date": end_date,
+            "factors": _join(factors),
+            "industry_mapping": industry_mapping
+        }), binary, _factor_format(result_format, return_type), return_type, float_dtype, timeout)
+        return _frame_result(data, return_type)
+
+    async def get_factor_return(
+        self,
+        start_date: str,
+        end_date: str,
+        factors: str | list[str] | None = None,
+        universe: str = 'whole_market',
+        method: str = 'implicit',
+        industry_mapping: str = 'sws_2021',
+        timeout: float | None = None,
+        return_type: str = "pandas",
+        binary: bool = PREFER_BINARY,
+        result_format: str | None = None,
+        float_dtype: str | None = None,
+    ) -> pd.DataFrame:
+        """Get factor returns; see KKDataClient.get_factor_return"""
+        _check_return_type(return_type)
+        url = f"{self.base_url}/api/v1/factors/return"
+        return await self._get_frame(url, 'get factor returns', _params({
+            "start_date": start_date,
+            "end_date": end_date,
+            "factors": _join(factors),
+            "universe": universe,
+            "method": method,
+            "industry_mapping": industry_mapping
+        }), binary, _factor_format(result_format, return_type), return_type, float_dtype, timeout)
+
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+def get_async_client(api_key: str | None = None, base_url: str | None = None) -> AsyncKKDataClient:
+    """
+    Return the shared async client for (base_url, api_key) on the running event loop,
+    creating it on first use.
+    """
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    key = (base_url or KKDATAD_ENDPOINT, api_key)
+    client = clients.get(key)
+    if client is None:
+        client = clients[key] = AsyncKKDataClient(base_url=key[0], api_key=api_key)
+    return client
+
+
+async def async_sql(
+    sql_query: str | Query,
+    api_key: str | None = None,
+    base_url: str | None = None,
+    result_format: str | None = None,
+    return_type: str = 'pandas',
+    use_cache: bool = True,
+    timeout: float | None = None,
+    params: dict | None = None,
+) -> pd.DataFrame:
+    """
+    Send a SQL query to the kkdatad server and return the result as a pandas DataFrame.
+    Async counterpart of kkdatac.sql.
+    """
+    client = get_async_client(api_key=api_key, base_url=base_url)
+    return await client.run_query(bind_params(sql_query, params), result_format=_result_format(result_format, return_type),
+                                  return_type=return_type, use_cache=use_cache, timeout=timeout)
+
+
+async def async_get_price(
+    order_book_ids: str | list[str],
+    start_date: str | None = None,
+    end_date: str | None = None,
+    frequency: str = '1d',
+    fields: list[str] | None = None,
+    adjust_type: str = 'pre',
+    skip_suspended: bool = False,
+    return_type: str = 'pandas',
+    resample: bool | None = None,
+    shard_size: int | None = SHARD_SIZE,
+    shard_days: int | None = SHARD_DAYS,
+    api_key: str | None = None,
+    base_url: str | None = None,
+) -> pd.DataFrame:
+    """Get price data for securities. Async counterpart of kkdatac.get_price"""
+    internal_codes = CodeConverter.convert_codes(order_book_ids, 'internal')
+    table = _get_table_by_frequency(frequency)
+    if resample is None:
+        resample = table is None
+    if resample:
+        table = base_table(frequency)
+    queries = _price_queries(internal_codes, table, fields, start_date, end_date, skip_suspended,
+                             shard_size, shard_days)
+    fetch_type = 'pandas' if return_type == 'panel' or resample else return_type
+    parts = await asyncio.gather(*(
+        async_sql(query, api_key=api_key, base_url=base_url, return_type=fetch_type) for query in queries
+    ))
+    df = concat_frames(list(parts))
+    if len(split_date_range(start_date, end_date, shard_days)) > 1:
+        df = _sort_bars(df, date_column(table))
+    # Factor lookups go through the synchronous factor store
+    df = await asyncio.to_thread(_adjust_price, df, adjust_type, table)
+    if resample:
+        df = await asyncio.to_thread(resample_bars, df, frequency, date_column(table))
+        if return_type == 'arrow':
+            df = to_arrow(df)
+    return _as_return_type(_convert_code_column(df, 'rq'), return_type, date_column(table))
@@ -0,0 +1,221 @@
+"""
+Persistent on-disk cache for query results.
+
+Results are keyed on the normalized SQL text (or, for a bound Query, its template and
+canonical parameters) plus the endpoint and API key they were fetched with, stored as
+LZ4-compressed Feather (Arrow) files when pyarrow is available and LZ4-compressed
+pickles otherwise, and indexed in a small SQLite database that tracks expiry and last
+access for LRU eviction by total size.
+"""
+import datetime
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import pandas as pd
+from kkdatac import metrics
+from kkdatac.codec import read_frame, write_frame
+from kkdatac.utils.query_templates import Query, canonical_sql, query_text
+from kkdatac.config import (
+    CACHE_ENABLED,
+    CACHE_DIR,
+    CACHE_MAX_BYTES,
+    CACHE_DEFAULT_TTL,
+    CACHE_TTLS,
+    CACHE_TODAY_TTL,
+)
+
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+([\w.`\"]+)", re.IGNORECASE)
+_CACHEABLE_PATTERN = re.compile(r"^\s*(SELECT|WITH|SHOW|DESCRIBE|DESC)\b", re.IGNORECASE)
+
+
+def normalize_sql(sql_query: str) -> str:
+    """Collapse whitespace outside string literals and drop a trailing semicolon so equivalent texts share a key."""
+    return canonical_sql(sql_query)
+
+
+def query_tables(sql_query: str) -> list[str]:
+    """Table names a query reads, without schema prefix or quoting."""
+    return [name.strip('`"').split(".")[-1].lower() for name in _TABLE_PATTERN.findall(sql_query)]
+
+
+def cache_namespace(base_url: str, api_key: str | None) -> str:
+    """Cache namespace: the endpoint plus a digest of the API key (or the free tier)."""
+    tier = hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else "free"
+    return f"{base_url}|{tier}"
+
+
+class QueryCache:
+    def __init__(
+        self,
+        cache_dir: str = CACHE_DIR,
+        max_bytes: int = CACHE_MAX_BYTES,
+        ttls: dict[str, int] | None = None,
+        default_ttl: int = CACHE_DEFAULT_TTL,
+    ):
+        """
+        :param cache_dir: directory holding the result files and the index
+        :param max_bytes: total size of cached files before least-recently used ones are evicted
+        :param ttls: seconds a result stays fresh by table name, defaults to CACHE_TTLS
+        :param default_ttl: seconds for tables without an entry in ttls
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, path TEXT, size INTEGER, expires REAL, accessed REAL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def key(sql_query: str | Query, namespace: str = "") -> str:
+        """Cache key for a query under a namespace (endpoint and API key tier)."""
+        text = sql_query.cache_key() if isinstance(sql_query, Query) else normalize_sql(sql_query)
+        return hashlib.sha256(f"{namespace}\n{text}".encode()).hexdigest()
+
+    @staticmethod
+    def cacheable(sql_query: str | Query) -> bool:
+        """Only read-only statements are cached."""
+        text = sql_query.template.text if isinstance(sql_query, Query) else sql_query
+        return bool(_CACHEABLE_PATTERN.match(text))
+
+    def ttl(self, sql_query: str | Query) -> int:
+        """Freshness of a query's result: the shortest TTL of the tables it reads."""
+        sql_query = query_text(sql_query)
+        ttl = min((self.ttls.get(t, self.default_ttl) for t in query_tables(sql_query)),
+                  default=self.default_ttl)
+        today = datetime.date.today()
+        if today.strftime("%Y%m%d") in sql_query or today.strftime("%Y-%m-%d") in sql_query:
+            ttl = min(ttl, CACHE_TODAY_TTL)
+        return ttl
+
+    def get(self, sql_query: str | Query, namespace: str = "") -> pd.DataFrame | None:
+        """Return the cached result of a query, or None if it is missing or expired."""
+        key = self.key(sql_query, namespace)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT path, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            path = None
+            if row is None or row[1] < now or not os.path.exists(row[0]):
+                if row is not None:
+                    self._remove(key, row[0])
+                self.misses += 1
+            else:
+                self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                path = row[0]
+        if path is None:
+            metrics.count("cache.miss")
+            return None
+        try:
+            with metrics.span("cache.read"):
+                data = read_frame(path)
+        except Exception:
+            # A corrupt or concurrently evicted file is just a miss
+            with self._lock:
+                self._remove(key, path)
+                self.misses += 1
+            metrics.count("cache.miss")
+            return None
+        with self._lock:
+            self.hits += 1
+        metrics.count("cache.hit")
+        return data
+
+    def put(self, sql_query: str | Query, data: pd.DataFrame, namespace: str = "") -> None:
+        """Store a query result and evict least-recently used entries beyond max_bytes."""
+        if not isinstance(data, pd.DataFrame):
+            return
+        key = self.key(sql_query, namespace)
+        path = write_frame(os.path.join(self.cache_dir, key), data)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, path, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, path, os.path.getsize(path), now + self.ttl(sql_query), now),
+            )
+            self._db.commit()
+            self._evict()
+
+    def clear(self) -> None:
+        """Remove every cached result."""
+        with self._lock:
+            for key, path in self._db.execute("SELECT key, path FROM entries").fetchall():
+                self._remove(key, path)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size of the cache."""
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def _evict(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        now = time.time()
+        for key, path, size, expires in self._db.execute(
+            "SELECT key, path, size, expires FROM entries ORDER BY expires < ? DESC, accessed ASC", (now,)
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._remove(key, path)
+            total -= size
+            self.evictions += 1
+
+    def _remove(self, key: str, path: str) -> None:
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._db.commit()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_default_cache: QueryCache | None = None
+_default_enabled = CACHE_ENABLED
+_default_lock = threading.Lock()
+
+
+def enable_cache(cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, **kwargs) -> QueryCache:
+    """Turn on the shared query cache used by every client without a cache of its own."""
+    global _default_cache, _default_enabled
+    with _default_lock:
+        _default_cache = QueryCache(cache_dir=cache_dir, max_bytes=max_bytes, **kwargs)
+        _default_enabled = True
+    return _default_cache
+
+
+def disable_cache() -> None:
+    """Turn off the shared query cache. Cached files stay on disk."""
+    global _default_enabled
+    _default_enabled = False
+
+
+def default_cache() -> QueryCache | None:
+    """The shared query cache, or None when caching is disabled."""
+    global _default_cache
+    if not _default_enabled:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = QueryCache()
+    return _default_cache
@@ -1,70 +1,285 @@
 import requests
 import pandas as pd
-import lz4.frame
-import binascii
+import io
 import pickle
+import threading
 import warnings
-from kkdatac.config import KKDATAD_ENDPOINT
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from kkdatac.config import (
+    KKDATAD_ENDPOINT,
+    POOL_CONNECTIONS,
+    POOL_MAXSIZE,
+    MAX_RETRIES,
+    RETRY_BACKOFF_FACTOR,
+    RETRY_STATUS_FORCELIST,
+    PREFER_BINARY,
+    STREAM_CHUNK_ROWS,
+    STREAM_READ_BYTES,
+    RESULT_FORMAT,
+    SHARD_SIZE,
+    SHARD_DAYS,
+    MAX_CONCURRENCY,
+    UPLOAD_FORMAT,
+    UPLOAD_CHUNK_ROWS,
+    TICK_POLL_TIMEOUT,
+    TICK_POLL_GRACE,
+)
+from kkdatac.utils.sharding import chunk_list, run_concurrently, split_date_range
+from kkdatac import metrics
+from kkdatac.cache import QueryCache, cache_namespace, default_cache
+from kkdatac.panel import Panel
+from kkdatac.utils.query_templates import Query, query_text
+from kkdatac.codec import (
+    ARROW_CONTENT_TYPE,
+    BINARY_CONTENT_TYPE,
+    UPLOAD_CONTENT_TYPES,
+    UPLOAD_UNSUPPORTED_STATUS,
+    DATASET_EVICTED_STATUSES,
+    LZ4StreamReader,
+    IterStreamReader,
+    accept_header,
+    arrow_to_pandas,
+    cast_floats,
+    content_type,
+    concat_frames,
+    decode_body,
+    decode_records,
+    frame_digest,
+    iter_arrow_batches,
+    spool_encoded,
+    split_frame,
+    to_arrow,
+)
+from typing import Iterator
+
+
+class _CountingRetry(Retry):
+    """urllib3 Retry that counts every retry in kkdatac.metrics"""
+
+    def increment(self, method=None, url=None, response=None, error=None, *args, **kwargs):
+        metrics.count("http.retries", method=method or "",
+                      reason=type(error).__name__ if error is not None else str(getattr(response, "status", "")))
+        return super().increment(method, url, response, error, *args, **kwargs)
+
+
+# Endpoints whose POSTs only read data, and so can be retried like GETs
+READ_ONLY_POST_PATHS = ("/sql/", "/sql-free/")
+
+
+def _build_adapter(
+    pool_connections: int,
+    pool_maxsize: int,
+    max_retries: int,
+    allowed_methods: frozenset[str] = frozenset({"GET"}),
+) -> HTTPAdapter:
+    """
+    Build a keep-alive HTTP adapter that retries requests of allowed_methods with
+    exponential backoff on connection resets and 5xx responses.
+    """
+    retry = _CountingRetry(
+        total=max_retries,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_FORCELIST,
+        allowed_methods=allowed_methods,
+        raise_on_status=False,
+    )
+    return HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+
+def _check_return_type(return_type: str, allowed: tuple[str, ...] = ("pandas", "arrow")) -> None:
+    if return_type not in allowed:
+        raise ValueError(f"Unknown return type: {return_type}")
+
+
+def _factor_format(result_format: str | None, return_type: str) -> str:
+    """Wire format for a factor endpoint: Arrow when the caller wants a pyarrow.Table back"""
+    return result_format or ("arrow" if return_type == "arrow" else RESULT_FORMAT)
+
+
+def _frame_result(data, return_type: str):
+    """A factor endpoint frame as the caller asked for it: DataFrame, pyarrow.Table or Panel"""
+    if return_type == "panel":
+        return Panel.from_long(data if isinstance(data, pd.DataFrame) else arrow_to_pandas(data))
+    return data
+
 
 class KKDataClient:
-    def __init__(self, base_url: str = KKDATAD_ENDPOINT, api_key: str | None = None):
+    def __init__(
+        self,
+        base_url: str = KKDATAD_ENDPOINT,
+        api_key: str | None = None,
+        pool_connections: int = POOL_CONNECTIONS,
+        pool_maxsize: int = POOL_MAXSIZE,
+        max_retries: int = MAX_RETRIES,
+        cache: QueryCache | None = None,
+    ):
         """
         Initialize the client with the base URL of the kkdatad server and an API key.
+        The client owns a connection pool that is reused across calls and threads.
+        Query results go through cache, or the shared cache from kkdatac.cache.enable_cache.
         """
-        self.base_url = base_url
+        self.base_url = base_url or KKDATAD_ENDPOINT
         self.api_key = api_key
         self.headers = {'api_key': self.api_key}
+        self.cache = cache
+        self._adapter = _build_adapter(pool_connections, pool_maxsize, max_retries)
+        # Queries are read-only, so their POSTs are retried too; mutating POSTs
+        # (create_factor, evaluate_factor, register) never are
+        self._query_adapter = _build_adapter(pool_connections, pool_maxsize, max_retries,
+                                             frozenset({"GET", "POST"}))
+        self._local = threading.local()
+        # Digests of the datasets this client has uploaded to the server
+        self._datasets: set[str] = set()
 
-    def _decompress_data(self, compressed_data_hex: str):
-        """
-        Decompress the received hex-encoded LZ4 compressed data.
-        Also returns the size of the compressed and decompressed data.
-        """
-        import time
-        start = time.time()
-        # Convert hex to binary
-        compressed_data = binascii.unhexlify(compressed_data_hex)
-        conversion_time = time.time() - start
-        # Size of the compressed data
-        compressed_size = len(compressed_data)
-
-        # Decompress data
-        decompressed_data = lz4.frame.decompress(compressed_data)
-        decompression_time = time.time() - start - conversion_time
-        # Size of the decompressed data
-        decompressed_size = len(decompressed_data)
-
-        # Load the decompressed pickle data into Python objects
-        data = pickle.loads(decompressed_data)
-        data_load_time = time.time() - start - conversion_time - decompression_time
-        print(f"Traffic used: {compressed_size} bytes (compressed), {decompressed_size} bytes (decompressed)")
-        print(f"Time used: {conversion_time:.2f} s (conversion), {decompression_time:.2f} s (decompression), {data_load_time:.2f} s (loading)")
-        return data
+    @property
+    def session(self) -> requests.Session:
+        """
+        Per-thread session mounted on the client's shared adapters, so every thread
+        draws keep-alive connections from the same pools without sharing session state.
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            for path in READ_ONLY_POST_PATHS:
+                session.mount(f"{self.base_url.rstrip('/')}{path}", self._query_adapter)
+            self._local.session = session
+        return session
 
-    def run_query(self, sql_query: str) -> pd.DataFrame:
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self._adapter.close()
+        self._query_adapter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _post_query(self, sql_query: str | Query, accept: str, **kwargs) -> requests.Response:
         """
-        Send a SQL query to the kkdatad server and return the result as a pandas DataFrame.
+        POST a SQL query to the free or keyed endpoint and return the raw response.
         """
+        sql_query = query_text(sql_query)
         if self.api_key is None:
             warnings.warn("API key is not set. Using free version now. Some features may not be available.")
             # Free version: append the query to the URL
             url = f"{self.base_url}/sql-free/?query={requests.utils.quote(sql_query)}"
-            response = requests.post(url)
+            headers = {'accept': accept}
         else:
             # Non-free version: append the query to the URL
             url = f"{self.base_url}/sql/?query={requests.utils.quote(sql_query)}"
             # Correct the header to match your curl command
-            headers = {'api-key': self.api_key, 'accept': 'application/json'}
-            # Send the request with API key in headers
-            response = requests.post(url, headers=headers)
-
-        # Handle the response
-        if response.status_code == 200:
-            result = response.json()
-            compressed_data_hex = result['data']
-            return self._decompress_data(compressed_data_hex)
-        else:
+            headers = {'api-key': self.api_key, 'accept': accept}
+        # Send the request with API key in headers
+        with metrics.span("query.network", stream=bool(kwargs.get("stream"))):
+            response = self.session.post(url, headers=headers, **kwargs)
+        if response.status_code != 200:
             raise Exception(f"Failed to query data: {response.status_code} - {response.text}")
+        return response
+
+    @property
+    def cache_namespace(self) -> str:
+        return cache_namespace(self.base_url, self.api_key)
+
+    def _decode_response(self, response: requests.Response, return_type: str = "pandas"):
+        """
+        Decode a query response according to the content type the server chose.
+        return_type='arrow' gives a pyarrow.Table instead of a DataFrame.
+        """
+        return decode_body(content_type(response), response.content, return_type)
+
+    def run_query(
+        self,
+        sql_query: str | Query,
+        binary: bool = PREFER_BINARY,
+        stream: bool = False,
+        chunk_size: int | None = STREAM_CHUNK_ROWS,
+        result_format: str = RESULT_FORMAT,
+        return_type: str = "pandas",
+        use_cache: bool = True,
+    ):
+        """
+        Send a SQL query to the kkdatad server and return the result as a pandas DataFrame.
+
+        With binary=True the client asks for raw LZ4 frames (application/octet-stream) and
+        falls back to the hex-encoded JSON payload if the server does not offer them.
+        result_format='arrow' or 'parquet' requests a columnar result decoded with pyarrow,
+        again falling back to the pickle transports. return_type='arrow' returns a
+        pyarrow.Table instead of a DataFrame.
+        With stream=True an iterator of chunks is returned instead, see iter_query.
+        sql_query may be a Query bound from a template (kkdatac.utils.query_templates),
+        which is cached on its template and parameters rather than its text.
+        Read-only queries are served from the query cache when one is enabled, unless
+        use_cache=False; streamed queries always go to the server.
+        """
+        _check_return_type(return_type)
+        if stream:
+            return self.iter_query(sql_query, binary=binary, chunk_size=chunk_size,
+                                   result_format=result_format, return_type=return_type)
+
+        cache = (self.cache or default_cache()) if use_cache and QueryCache.cacheable(sql_query) else None
+        if cache is not None:
+            data = cache.get(sql_query, self.cache_namespace)
+            if data is not None:
+                return to_arrow(data) if return_type == "arrow" else data
+
+        response = self._post_query(sql_query, accept_header(result_format, binary))
+        if cache is None:
+            return self._decode_response(response, return_type)
+        data = self._decode_response(response)
+        cache.put(sql_query, data, self.cache_namespace)
+        return to_arrow(data) if return_type == "arrow" else data
+
+    def iter_query(
+        self,
+        sql_query: str | Query,
+        binary: bool = PREFER_BINARY,
+        chunk_size: int | None = STREAM_CHUNK_ROWS,
+        result_format: str = RESULT_FORMAT,
+        return_type: str = "pandas",
+    ) -> Iterator:
+        """
+        Send a SQL query and yield the result as DataFrame chunks of at most chunk_size rows.
+
+        Binary responses are read off the socket and decompressed incrementally, so neither
+        the full compressed nor the full decompressed payload is ever held in memory. A
+        server that pickles the result as a sequence of DataFrames keeps peak memory at one
+        chunk; a single pickled DataFrame is sliced after loading. Arrow IPC streams are
+        regrouped from their record batches. Parquet and JSON responses fall back to
+        buffered decoding.
+        """
+        _check_return_type(return_type)
+        response = self._post_query(sql_query, accept_header(result_format, binary), stream=True)
+        with response:
+            media = content_type(response)
+            if media == ARROW_CONTENT_TYPE:
+                stream = io.BufferedReader(IterStreamReader(response.iter_content(STREAM_READ_BYTES)))
+                for table in iter_arrow_batches(stream, chunk_size):
+                    yield table if return_type == "arrow" else arrow_to_pandas(table)
+                return
+            if media != BINARY_CONTENT_TYPE:
+                yield from split_frame(self._decode_response(response, return_type), chunk_size)
+                return
+            reader = io.BufferedReader(LZ4StreamReader(response.iter_content(STREAM_READ_BYTES)))
+            while True:
+                try:
+                    data = pickle.load(reader)
+                except EOFError:
+                    break
+                for chunk in split_frame(data, chunk_size):
+                    yield to_arrow(chunk) if return_type == "arrow" else chunk
+
+    def run_queries(self, sql_queries: list[str | Query], max_workers: int = MAX_CONCURRENCY, **kwargs) -> list:
+        """
+        Run several queries concurrently over the client's connection pool and return
+        their results in input order. Keyword arguments are passed to run_query.
+        """
+        return run_concurrently(lambda query: self.run_query(query, **kwargs),
+                                [(query,) for query in sql_queries], max_workers)
 
     @staticmethod
     def get_apikey(username: str, password: str) -> str:
@@ -73,7 +288,7 @@ class KKDataClient:
         """
         url = f"{KKDATAD_ENDPOINT}/login/"
         payload = {'username': username, 'password': password}
-        response = requests.post(url, json=payload)
+        response = get_client().session.post(url, json=payload)
         if response.status_code == 200:
             result = response.json()
             return result['access_token']
@@ -87,7 +302,7 @@ class KKDataClient:
         """
         url = f"{KKDATAD_ENDPOINT}/register/"
         payload = {'username': username, 'password': password}
-        response = requests.post(url, json=payload)
+        response = get_client().session.post(url, json=payload)
         if response.status_code == 200:
             result = response.json()
             return result['message']
@@ -106,7 +321,7 @@ class KKDataClient:
             "metadata": metadata or {},
             "is_public": is_public
         }
-        response = requests.post(url, json=payload, headers=self.headers)
+        response = self.session.post(url, json=payload, headers=self.headers)
         if response.status_code == 200:
             return response.json()
         raise Exception(f"Failed to create factor: {response.status_code} - {response.text}")
@@ -116,7 +331,7 @@ class KKDataClient:
         url = f"{self.base_url}/api/v1/factors/"
         if category:
             url += f"?category={category}"
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url, headers=self.headers)
         if response.status_code == 200:
             return response.json()
         raise Exception(f"Failed to list factors: {response.status_code} - {response.text}")
@@ -124,20 +339,81 @@ class KKDataClient:
     def get_factor(self, factor_id: int) -> dict:
         """Get factor details"""
         url = f"{self.base_url}/api/v1/factors/{factor_id}"
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url, headers=self.headers)
         if response.status_code == 200:
             return response.json()
         raise Exception(f"Failed to get factor: {response.status_code} - {response.text}")
 
-    def evaluate_factor(self, factor_id: int, returns_data: pd.DataFrame) -> dict:
-        """Evaluate factor performance"""
+    def evaluate_factor(
+        self,
+        factor_id: int,
+        returns_data: pd.DataFrame,
+        upload_format: str = UPLOAD_FORMAT,
+        chunk_rows: int | None = UPLOAD_CHUNK_ROWS,
+        reuse_dataset: bool = True,
+    ) -> dict:
+        """
+        Evaluate factor performance against a returns matrix.
+
+        The returns are uploaded as LZ4-compressed binary chunks of chunk_rows rows
+        (upload_format 'pickle' or 'arrow'); frames of several chunks are spooled to a
+        temporary file and streamed from it, so the body can be resent without holding
+        it in memory. Each upload is tagged with a digest of the frame; with
+        reuse_dataset=True a frame this client has uploaded before is referenced by that
+        digest instead of being sent again, and uploaded again if the server answers
+        404 or 410 (evicted). Servers without binary uploads (415) get the JSON payload;
+        other errors are raised.
+        """
+        if upload_format not in UPLOAD_CONTENT_TYPES:
+            raise ValueError(f"Unknown upload format: {upload_format}")
         url = f"{self.base_url}/api/v1/factors/{factor_id}/evaluate"
-        response = requests.post(url, json={"returns_data": returns_data.to_dict()}, 
-                               headers=self.headers)
+        dataset_id = frame_digest(returns_data)
+        if reuse_dataset and dataset_id in self._datasets:
+            response = self.session.post(url, json={"returns_dataset": dataset_id}, headers=self.headers)
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in DATASET_EVICTED_STATUSES:
+                raise Exception(f"Failed to evaluate factor: {response.status_code} - {response.text}")
+            self._datasets.discard(dataset_id)
+
+        headers = {**self.headers, 'content-type': UPLOAD_CONTENT_TYPES[upload_format]}
+        with spool_encoded(returns_data, upload_format, chunk_rows) as body:
+            response = self.session.post(url, data=body, params={"dataset_id": dataset_id}, headers=headers)
+        if response.status_code == UPLOAD_UNSUPPORTED_STATUS:
+            response = self.session.post(url, json={"returns_data": returns_data.to_dict()},
+                                         headers=self.headers)
+        elif response.status_code == 200:
+            self._datasets.add(dataset_id)
         if response.status_code == 200:
             return response.json()
         raise Exception(f"Failed to evaluate factor: {response.status_code} - {response.text}")
 
+    def _get_frame(
+        self,
+        url: str,
+        params: dict,
+        action: str,
+        binary: bool = PREFER_BINARY,
+        result_format: str = RESULT_FORMAT,
+        return_type: str = "pandas",
+        float_dtype: str | None = None,
+    ):
+        """
+        GET a factor endpoint, asking for the same LZ4/Arrow encodings as run_query and
+        falling back to JSON records, and decode the frame.
+        """
+        headers = {**self.headers, 'accept': accept_header(result_format, binary)}
+        with metrics.span("factors.network", action=action):
+            response = self.session.get(url, params=params, headers=headers)
+        if response.status_code != 200:
+            raise Exception(f"Failed to {action}: {response.status_code} - {response.text}")
+        data = decode_records(content_type(response), response.content,
+                              "arrow" if return_type == "arrow" else "pandas")
+        if float_dtype is None:
+            return data
+        with metrics.span("decode.postprocess", step="cast_floats"):
+            return cast_floats(data, float_dtype)
+
     def get_factor_data(
         self,
         order_book_ids: str | list[str],
@@ -145,9 +421,48 @@ class KKDataClient:
         start_date: str | None = None,
         end_date: str | None = None,
         universe: str | None = None,
-        expect_df: bool = True
+        expect_df: bool = True,
+        shard_size: int | None = SHARD_SIZE,
+        shard_days: int | None = SHARD_DAYS,
+        max_workers: int = MAX_CONCURRENCY,
+        return_type: str = "pandas",
+        binary: bool = PREFER_BINARY,
+        result_format: str | None = None,
+        float_dtype: str | None = None,
+    ) -> pd.DataFrame:
+        """
+        Get factor data from server.
+        Large requests are split into shards of at most shard_size securities and
+        shard_days calendar days, fetched concurrently and concatenated in order.
+        Frames travel in the binary encodings of run_query (see result_format and binary).
+        return_type='arrow' returns a pyarrow.Table, 'panel' a kkdatac.panel.Panel of
+        (date x security) arrays. float_dtype='float32' halves the memory of factor values.
+        """
+        _check_return_type(return_type, ("pandas", "arrow", "panel"))
+        if not expect_df:
+            return self._get_factor_data(order_book_ids, factors, start_date, end_date, universe, expect_df)
+        options = (binary, _factor_format(result_format, return_type), return_type, float_dtype)
+        shards = [
+            (codes, factors, start, end, universe, expect_df, *options)
+            for codes in chunk_list(order_book_ids, shard_size)
+            for start, end in split_date_range(start_date, end_date, shard_days)
+        ]
+        data = concat_frames(run_concurrently(self._get_factor_data, shards, max_workers))
+        return _frame_result(data, return_type)
+
+    def _get_factor_data(
+        self,
+        order_book_ids: str | list[str],
+        factors: str | list[str] | None,
+        start_date: str | None,
+        end_date: str | None,
+        universe: str | None,
+        expect_df: bool,
+        binary: bool = PREFER_BINARY,
+        result_format: str = RESULT_FORMAT,
+        return_type: str = "pandas",
+        float_dtype: str | None = None,
     ) -> pd.DataFrame:
-        """Get factor data from server"""
         url = f"{self.base_url}/api/v1/factors/data"
         params = {
             "order_book_ids": order_book_ids if isinstance(order_book_ids, str) else ",".join(order_book_ids),
@@ -157,10 +472,12 @@ class KKDataClient:
             "universe": universe,
             "expect_df": expect_df
         }
-        response = requests.get(url, params=params, headers=self.headers)
+        if expect_df:
+            return self._get_frame(url, params, 'get factor data', binary, result_format, return_type, float_dtype)
+        response = self.session.get(url, params=params, headers=self.headers)
         if response.status_code == 200:
             result = response.json()
-            return pd.DataFrame(result["data"]) if expect_df else result["data"]
+            return result["data"]
         raise Exception(f"Failed to get factor data: {response.status_code} - {response.text}")
 
     def get_factor_exposure(
@@ -169,9 +486,14 @@ class KKDataClient:
         start_date: str,
         end_date: str,
         factors: str | list[str] | None = None,
-        industry_mapping: str = 'sws_2021'
+        industry_mapping: str = 'sws_2021',
+        return_type: str = "pandas",
+        binary: bool = PREFER_BINARY,
+        result_format: str | None = None,
+        float_dtype: str | None = None,
     ) -> pd.DataFrame:
-        """Get factor exposure data"""
+        """Get factor exposure data; return_type, binary, result_format and float_dtype as in get_factor_data"""
+        _check_return_type(return_type, ("pandas", "arrow", "panel"))
         url = f"{self.base_url}/api/v1/factors/exposure"
         params = {
             "order_book_ids": order_book_ids if isinstance(order_book_ids, str) else ",".join(order_book_ids),
@@ -180,11 +502,9 @@ class KKDataClient:
             "factors": factors if isinstance(factors, str) else ",".join(factors) if factors else None,
             "industry_mapping": industry_mapping
         }
-        response = requests.get(url, params=params, headers=self.headers)
-        if response.status_code == 200:
-            result = response.json()
-            return pd.DataFrame(result["data"])
-        raise Exception(f"Failed to get factor exposure: {response.status_code} - {response.text}")
+        data = self._get_frame(url, params, 'get factor exposure', binary,
+                               _factor_format(result_format, return_type), return_type, float_dtype)
+        return _frame_result(data, return_type)
 
     def get_factor_return(
         self,
@@ -193,9 +513,14 @@ class KKDataClient:
         factors: str | list[str] | None = None,
         universe: str = 'whole_market',
         method: str = 'implicit',
-        industry_mapping: str = 'sws_2021'
+        industry_mapping: str = 'sws_2021',
+        return_type: str = "pandas",
+        binary: bool = PREFER_BINARY,
+        result_format: str | None = None,
+        float_dtype: str | None = None,
     ) -> pd.DataFrame:
-        """Get factor returns"""
+        """Get factor returns; return_type, binary, result_format and float_dtype as in get_factor_data"""
+        _check_return_type(return_type)
         url = f"{self.base_url}/api/v1/factors/return"
         params = {
             "start_date": start_date,
@@ -205,16 +530,85 @@ class KKDataClient:
             "method": method,
             "industry_mapping": industry_mapping
         }
-        response = requests.get(url, params=params, headers=self.headers)
-        if response.status_code == 200:
-            result = response.json()
-            return pd.DataFrame(result["data"])
-        raise Exception(f"Failed to get factor returns: {response.status_code} - {response.text}")
+        return self._get_frame(url, params, 'get factor returns', binary,
+                               _factor_format(result_format, return_type), return_type, float_dtype)
+
+
+    def get_ticks(
+        self,
+        order_book_ids: str | list[str],
+        channel: str = "tick",
+        start_date: str | None = None,
+        end_date: str | None = None,
+        binary: bool = PREFER_BINARY,
+        result_format: str = RESULT_FORMAT,
+    ) -> pd.DataFrame:
+        """Level-1 snapshots of the current day, or of a date range for channel='auction'"""
+        url = f"{self.base_url}/api/v1/ticks"
+        params = {
+            "order_book_ids": order_book_ids if isinstance(order_book_ids, str) else ",".join(order_book_ids),
+            "channel": channel,
+            "start_date": start_date,
+            "end_date": end_date,
+        }
+        data = self._get_frame(url, params, 'get ticks', binary, result_format)
+        if 'datetime' in data.columns and data['datetime'].dtype.kind != 'M':
+            # JSON records carry timestamps as text
+            data['datetime'] = pd.to_datetime(data['datetime'])
+        return data
+
+    def poll_ticks(
+        self,
+        order_book_ids: str | list[str],
+        channel: str = "tick",
+        cursor: int | None = None,
+        timeout: float = TICK_POLL_TIMEOUT,
+        binary: bool = PREFER_BINARY,
+        result_format: str = RESULT_FORMAT,
+    ) -> tuple[int | None, pd.DataFrame | None]:
+        """
+        Long-poll for the snapshots after cursor (the latest ones when None): the server holds
+        the request until snapshots arrive or timeout seconds pass (204 No Content).
+        Returns the cursor to poll from next and the snapshots, None if there were none.
+        """
+        url = f"{self.base_url}/api/v1/ticks/poll"
+        params = {
+            "order_book_ids": order_book_ids if isinstance(order_book_ids, str) else ",".join(order_book_ids),
+            "channel": channel,
+            "cursor": cursor,
+            "timeout": timeout,
+        }
+        headers = {**self.headers, 'accept': accept_header(result_format, binary)}
+        response = self.session.get(url, params=params, headers=headers, timeout=timeout + TICK_POLL_GRACE)
+        next_cursor = response.headers.get('x-cursor')
+        next_cursor = int(next_cursor) if next_cursor is not None else cursor
+        if response.status_code == 204:
+            return next_cursor, None
+        if response.status_code != 200:
+            raise Exception(f"Failed to poll ticks: {response.status_code} - {response.text}")
+        return next_cursor, decode_records(content_type(response), response.content)
+
+
+_clients: dict[tuple[str, str | None], KKDataClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: str | None = None, base_url: str | None = None) -> KKDataClient:
+    """
+    Return the shared client for (base_url, api_key), creating it on first use.
+    Reusing it keeps connections alive across calls instead of re-handshaking per query.
+    """
+    key = (base_url or KKDATAD_ENDPOINT, api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = KKDataClient(base_url=key[0], api_key=api_key)
+    return client
 
 
 # Example usage:
 if __name__ == "__main__":
-    client = KKDataClient()
+    client = get_client()
 
     # Run a query and get a pandas DataFrame
     query = "show databases"
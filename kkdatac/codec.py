@@ -0,0 +1,405 @@
+"""
+Wire formats for kkdatad responses.
+
+kkdatad can answer a query in several encodings, chosen by the Accept header:
+- JSON: {"data": <hex>} of an LZ4 frame holding a pickled DataFrame (legacy)
+- application/octet-stream: the same LZ4 frame, sent raw
+- Arrow IPC stream / Parquet: columnar results decoded with pyarrow
+The factor endpoints negotiate the same binary encodings and otherwise answer with
+{"data": <records>} JSON. Uploads go the other way in the same encodings: a sequence of
+LZ4-compressed pickled chunks, or an LZ4-compressed Arrow IPC stream.
+
+The same encodings back the on-disk frames written by the local stores.
+"""
+import binascii
+import hashlib
+import io
+import json
+import os
+import pickle
+import tempfile
+import lz4.frame
+import numpy as np
+import pandas as pd
+from typing import Iterator
+from kkdatac import metrics
+
+JSON_CONTENT_TYPE = "application/json"
+BINARY_CONTENT_TYPE = "application/octet-stream"
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+
+RESULT_FORMATS = ("pickle", "arrow", "parquet")
+
+
+def accept_header(result_format: str = "pickle", binary: bool = True) -> str:
+    """
+    Build the Accept header for a result format, listing cheaper fallbacks at lower
+    priority so older servers can still answer with hex-encoded JSON.
+    """
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format: {result_format}")
+    preferred = []
+    if result_format == "arrow":
+        preferred.append(ARROW_CONTENT_TYPE)
+    elif result_format == "parquet":
+        preferred.append(PARQUET_CONTENT_TYPE)
+    if binary or result_format != "pickle":
+        preferred.append(BINARY_CONTENT_TYPE)
+    preferred.append(JSON_CONTENT_TYPE)
+    return ", ".join(
+        media if i == 0 else f"{media};q={1 - i / 10:.1f}" for i, media in enumerate(preferred)
+    )
+
+
+def content_type(response) -> str:
+    """Media type of a response without parameters, lower-cased."""
+    return response.headers.get("content-type", "").split(";")[0].strip().lower()
+
+
+def import_pyarrow():
+    """Import pyarrow, which is only needed for the Arrow and Parquet formats."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "pyarrow is required for Arrow/Parquet results, install it with `pip install kkdatac[arrow]`"
+        ) from e
+    return pyarrow
+
+
+def arrow_to_pandas(table) -> pd.DataFrame:
+    """
+    Convert an Arrow table to pandas, letting numeric columns without nulls share
+    Arrow's buffers and releasing Arrow memory as each column is converted.
+    """
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def read_arrow(data: bytes):
+    """Read an Arrow IPC stream held in memory into a Table without copying its buffers."""
+    pa = import_pyarrow()
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+
+
+def read_parquet(data: bytes):
+    """Read a Parquet file held in memory into a Table."""
+    pa = import_pyarrow()
+    return pa.parquet.read_table(pa.BufferReader(data))
+
+
+def to_arrow(df: pd.DataFrame):
+    """Convert a DataFrame to an Arrow table, dropping a default RangeIndex."""
+    pa = import_pyarrow()
+    return pa.Table.from_pandas(df, preserve_index=None)
+
+
+def decompress_data(compressed_data: str | bytes):
+    """
+    Decompress the received LZ4 compressed data, either hex-encoded (JSON transport)
+    or raw bytes (binary transport). Sizes and stage timings go to kkdatac.metrics.
+    """
+    # Convert hex to binary; binary transport already delivers raw bytes
+    if isinstance(compressed_data, str):
+        with metrics.span("decode.unhex"):
+            compressed_data = binascii.unhexlify(compressed_data)
+    metrics.count("bytes.compressed", len(compressed_data))
+
+    with metrics.span("decode.decompress"):
+        decompressed_data = lz4.frame.decompress(compressed_data)
+    metrics.count("bytes.decompressed", len(decompressed_data))
+
+    # Load the decompressed pickle data into Python objects
+    with metrics.span("decode.unpickle"):
+        return pickle.loads(decompressed_data)
+
+
+def decode_body(media: str, body: bytes, return_type: str = "pandas"):
+    """
+    Decode a query response body of the given media type.
+    return_type='arrow' gives a pyarrow.Table instead of a DataFrame.
+    """
+    metrics.count("bytes.received", len(body), media=media)
+    if media in (ARROW_CONTENT_TYPE, PARQUET_CONTENT_TYPE):
+        with metrics.span("decode.arrow", media=media):
+            table = read_arrow(body) if media == ARROW_CONTENT_TYPE else read_parquet(body)
+        if return_type == "arrow":
+            return table
+        with metrics.span("decode.postprocess", step="arrow_to_pandas"):
+            return arrow_to_pandas(table)
+    if media == BINARY_CONTENT_TYPE:
+        data = decompress_data(body)
+    else:
+        with metrics.span("decode.json"):
+            payload = json.loads(body)['data']
+        data = decompress_data(payload)
+    if return_type != "arrow":
+        return data
+    with metrics.span("decode.postprocess", step="to_arrow"):
+        return to_arrow(data)
+
+
+def decode_records(media: str, body: bytes, return_type: str = "pandas"):
+    """
+    Decode a factor endpoint response: any binary result format, or JSON whose "data"
+    holds either records or a hex-encoded LZ4 frame.
+    """
+    if media in (BINARY_CONTENT_TYPE, ARROW_CONTENT_TYPE, PARQUET_CONTENT_TYPE):
+        return decode_body(media, body, return_type)
+    metrics.count("bytes.received", len(body), media=media)
+    with metrics.span("decode.json"):
+        data = json.loads(body)["data"]
+    if isinstance(data, str):
+        data = decompress_data(data)
+    else:
+        with metrics.span("decode.postprocess", step="records"):
+            data = pd.DataFrame(data)
+    return to_arrow(data) if return_type == "arrow" else data
+
+
+def cast_floats(data, dtype: str | None):
+    """Cast the floating point columns of a DataFrame or pyarrow.Table to dtype (e.g. 'float32')."""
+    if dtype is None:
+        return data
+    if isinstance(data, pd.DataFrame):
+        columns = [c for c in data.columns if data[c].dtype.kind == "f" and data[c].dtype != dtype]
+        return data.astype({c: dtype for c in columns}, copy=False) if columns else data
+    pa = import_pyarrow()
+    target = pa.from_numpy_dtype(dtype)
+    for i, field in enumerate(data.schema):
+        if pa.types.is_floating(field.type) and field.type != target:
+            data = data.set_column(i, field.name, data.column(i).cast(target))
+    return data
+
+
+class LZ4StreamReader(io.RawIOBase):
+    """
+    Read-only file object that decompresses LZ4 frames incrementally from an iterator
+    of compressed chunks, holding at most one decompressed chunk in memory.
+    """
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._decompressor = lz4.frame.LZ4FrameDecompressor()
+        self._buffer = bytearray()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            if self._decompressor.eof and self._decompressor.unused_data:
+                # Concatenated frames: start a new decompressor on what is left over
+                chunk = self._decompressor.unused_data
+            else:
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    return 0
+            if self._decompressor.eof:
+                self._decompressor = lz4.frame.LZ4FrameDecompressor()
+            self._buffer += self._decompressor.decompress(chunk)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        del self._buffer[:n]
+        return n
+
+
+class IterStreamReader(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = chunk
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+UPLOAD_CONTENT_TYPES = {"pickle": BINARY_CONTENT_TYPE, "arrow": ARROW_CONTENT_TYPE}
+# How a server without binary uploads rejects one; any other error is the upload's own
+UPLOAD_UNSUPPORTED_STATUS = 415
+# How a server answers a reference to a dataset it no longer holds: upload it again.
+# Any other error on a dataset reference is raised.
+DATASET_EVICTED_STATUSES = (404, 410)
+
+
+def iter_encoded(data: pd.DataFrame, upload_format: str = "pickle", chunk_size: int | None = None) -> Iterator[bytes]:
+    """
+    Encode a DataFrame for upload as a sequence of byte chunks, one per chunk_size rows,
+    so a large frame is never held encoded in full: concatenated LZ4 frames of pickled
+    chunks (read back like a streamed binary result), or an Arrow IPC stream with LZ4
+    compressed record batches.
+    """
+    if upload_format not in UPLOAD_CONTENT_TYPES:
+        raise ValueError(f"Unknown upload format: {upload_format}")
+    if upload_format == "pickle":
+        for chunk in split_frame(data, chunk_size):
+            yield lz4.frame.compress(pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL))
+        return
+    pa = import_pyarrow()
+    table = to_arrow(data)
+    sink = io.BytesIO()
+    options = pa.ipc.IpcWriteOptions(compression="lz4")
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        for batch in table.to_batches(max_chunksize=chunk_size):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # End-of-stream marker
+    yield sink.getvalue()
+
+
+def spool_encoded(data: pd.DataFrame, upload_format: str = "pickle", chunk_size: int | None = None):
+    """
+    Encode a DataFrame for upload into a seekable body, so that a retry can rewind and
+    resend it: a BytesIO for a single chunk, otherwise an anonymous temporary file the
+    chunks are written to one at a time, so a large frame is not held encoded in memory.
+    Close the body when done.
+    """
+    chunks = iter_encoded(data, upload_format, chunk_size)
+    if not chunk_size or len(data) <= chunk_size:
+        return io.BytesIO(b"".join(chunks))
+    body = tempfile.TemporaryFile()
+    for chunk in chunks:
+        body.write(chunk)
+    body.seek(0)
+    return body
+
+
+def frame_digest(data: pd.DataFrame) -> str:
+    """Content hash of a DataFrame (values, index and column names) identifying an uploaded dataset."""
+    digest = hashlib.sha256(repr(list(data.columns)).encode())
+    digest.update(np.ascontiguousarray(pd.util.hash_pandas_object(data, index=True).to_numpy()).tobytes())
+    return digest.hexdigest()[:32]
+
+
+def split_frame(data, chunk_size: int | None) -> Iterator:
+    """Yield a DataFrame or Arrow table in row slices of at most chunk_size rows."""
+    if not chunk_size or len(data) <= chunk_size:
+        yield data
+        return
+    for start in range(0, len(data), chunk_size):
+        if isinstance(data, pd.DataFrame):
+            yield data.iloc[start:start + chunk_size]
+        else:
+            yield data.slice(start, chunk_size)
+
+
+def concat_frames(parts: list):
+    """Concatenate DataFrame or Arrow table shards in order."""
+    if len(parts) == 1:
+        return parts[0]
+    if isinstance(parts[0], pd.DataFrame):
+        return pd.concat(parts, ignore_index=True)
+    pa = import_pyarrow()
+    if int(pa.__version__.split(".")[0]) < 14:
+        # promote_options replaced the promote flag in pyarrow 14
+        return pa.concat_tables(parts, promote=True)
+    return pa.concat_tables(parts, promote_options="default")
+
+
+def iter_arrow_batches(stream, chunk_size: int | None) -> Iterator:
+    """
+    Read an Arrow IPC stream from a file object and yield Tables of roughly
+    chunk_size rows, regrouping the server's record batches.
+    """
+    pa = import_pyarrow()
+    reader = pa.ipc.open_stream(stream)
+    batches, rows, emitted = [], 0, False
+    for batch in reader:
+        batches.append(batch)
+        rows += batch.num_rows
+        if chunk_size and rows >= chunk_size:
+            yield pa.Table.from_batches(batches, schema=reader.schema)
+            batches, rows, emitted = [], 0, True
+    if batches or not emitted:
+        yield pa.Table.from_batches(batches, schema=reader.schema)
+
+
+FRAME_SUFFIXES = (".feather", ".pkl.lz4")
+
+
+def find_frame(stem: str) -> str | None:
+    """Path of the frame written for stem, whichever format it was stored in."""
+    for suffix in FRAME_SUFFIXES:
+        if os.path.exists(stem + suffix):
+            return stem + suffix
+    return None
+
+
+def list_frames(directory: str) -> dict[str, str]:
+    """Stem name -> path of the frames written in a directory, ignoring other files such as temporaries."""
+    frames = {}
+    for name in sorted(os.listdir(directory)):
+        for suffix in FRAME_SUFFIXES:
+            if name.endswith(suffix):
+                frames.setdefault(name[:-len(suffix)], os.path.join(directory, name))
+    return frames
+
+
+def write_frame(stem: str, data: pd.DataFrame) -> str:
+    """Write a DataFrame next to stem as compressed Feather, or an LZ4 pickle without pyarrow."""
+    previous = find_frame(stem)
+    path = _write_frame(stem, data)
+    if previous is not None and previous != path:
+        os.remove(previous)
+    return path
+
+
+def _temp_path(path: str) -> str:
+    """A fresh temporary file next to path, so concurrent writers never share one."""
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    return temp
+
+
+def _write_frame(stem: str, data: pd.DataFrame) -> str:
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        feather = None
+    if feather is not None:
+        path = stem + ".feather"
+        temp = _temp_path(path)
+        try:
+            feather.write_feather(data, temp, compression="lz4")
+            os.replace(temp, path)
+            return path
+        except Exception:
+            # Columns Arrow cannot represent (mixed objects) fall back to pickle
+            if os.path.exists(temp):
+                os.remove(temp)
+    path = stem + ".pkl.lz4"
+    temp = _temp_path(path)
+    try:
+        with lz4.frame.open(temp, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return path
+
+
+def read_frame(path: str) -> pd.DataFrame:
+    """Read a DataFrame written by write_frame."""
+    if path.endswith(".feather"):
+        import pyarrow.feather as feather
+        return feather.read_feather(path)
+    with lz4.frame.open(path, "rb") as f:
+        return pickle.load(f)
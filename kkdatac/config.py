@@ -1 +1,97 @@
-KKDATAD_ENDPOINT = "https://api.kakiquant.icu"
\ No newline at end of file
+import os
+
+# KKDATAC_ENDPOINT points the client at another kkdatad, e.g. test/mock_kkdatad.py
+KKDATAD_ENDPOINT = os.environ.get("KKDATAC_ENDPOINT", "https://api.kakiquant.icu")
+
+# HTTP connection pool shared by every request a client makes
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+MAX_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_FORCELIST = (500, 502, 503, 504)
+
+# Ask kkdatad for raw LZ4 frames instead of hex-encoded JSON when it supports them
+PREFER_BINARY = True
+
+# Streaming result decoding: rows per yielded chunk and bytes per socket read
+STREAM_CHUNK_ROWS = 1_000_000
+STREAM_READ_BYTES = 1 << 20
+
+# Preferred result encoding: "pickle", "arrow" or "parquet" (the latter two need pyarrow)
+RESULT_FORMAT = "pickle"
+
+# Uploads (evaluate_factor): "pickle" or "arrow" encoding, sent as LZ4-compressed chunks of rows
+UPLOAD_FORMAT = "pickle"
+UPLOAD_CHUNK_ROWS = 250_000
+
+# Local on-disk query result cache (see kkdatac.cache), off unless enabled
+CACHE_ENABLED = os.environ.get("KKDATAC_CACHE", "0") == "1"
+CACHE_DIR = os.environ.get("KKDATAC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "kkdatac"))
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+# Seconds a cached result stays fresh, by the tables a query reads; the shortest one wins
+CACHE_DEFAULT_TTL = 3600
+CACHE_TTLS = {
+    "trade_cal": 7 * 86400,
+    "stock_basic": 86400,
+    "income": 86400,
+    "balancesheet": 86400,
+    "cashflow": 86400,
+    "daily": 6 * 3600,
+    "weekly": 6 * 3600,
+    "monthly": 6 * 3600,
+    "mins1": 300,
+    "mins5": 300,
+    "mins15": 300,
+    "mins30": 300,
+    "mins60": 300,
+}
+# Queries that mention today's date are about live bars and expire quickly
+CACHE_TODAY_TTL = 60
+
+# Local append-only mirror of price tables (see kkdatac.mirror)
+MIRROR_DIR = os.environ.get("KKDATAC_MIRROR_DIR", os.path.join(os.path.expanduser("~"), ".kkdatac", "mirror"))
+# Seconds after a sync during which the mirror answers without asking the server for new bars
+MIRROR_SYNC_INTERVAL = 600
+# First date fetched for symbols the mirror has never synced
+MIRROR_START_DATE = os.environ.get("KKDATAC_MIRROR_START", "2010-01-01")
+
+# Local store of factor values (see kkdatac.factor_store)
+FACTOR_STORE_DIR = os.environ.get("KKDATAC_FACTOR_DIR", os.path.join(os.path.expanduser("~"), ".kkdatac", "factors"))
+# Seconds after a check of a factor's definition version during which it is not re-checked
+FACTOR_VERSION_INTERVAL = 600
+
+# Large requests are split into shards run concurrently on a bounded thread pool
+SHARD_SIZE = 500  # securities per shard
+SHARD_DAYS = 366  # calendar days per shard when a query has a date range
+MAX_CONCURRENCY = 8
+
+# AsyncKKDataClient: concurrent requests allowed per endpoint group and total timeout in seconds
+ASYNC_CONCURRENCY = {"sql": 16, "factors": 8}
+ASYNC_TIMEOUT = 300
+
+# Live snapshots (kkdatac.ticks): snapshots kept per symbol (a session of 3-second snapshots),
+# seconds the server may hold a long-poll, extra seconds to wait for its answer, and the pause
+# before polling again after a failure
+TICK_BUFFER_SIZE = 4800
+TICK_POLL_TIMEOUT = 30
+TICK_POLL_GRACE = 10
+TICK_RETRY_DELAY = 1
+
+# Intraday trading sessions per market, used to bin minute bars when resampling (kkdatac.resample);
+# markets without sessions trade around the clock
+TRADING_SESSIONS = {"cn": (("09:30", "11:30"), ("13:00", "15:00"))}
+
+# Trading calendars are reloaded from the server (and rewritten on disk) once this many seconds old
+CALENDAR_TTL = 86400
+CALENDAR_DIR = os.path.join(CACHE_DIR, "calendars")
+
+# The instrument master (listing data) is reloaded from the server once this many seconds old
+INSTRUMENTS_TTL = 86400
+INSTRUMENTS_DIR = os.path.join(CACHE_DIR, "instruments")
+
+# Price adjustment factors are re-fetched once this many seconds old
+ADJ_FACTOR_TTL = 86400
+
+# Point-in-time fundamentals: statements for periods ending this many days before the start
+# date are fetched too, so the report in force on the first day (e.g. last year's annual) is known
+PIT_LOOKBACK_DAYS = 540
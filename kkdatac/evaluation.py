@@ -0,0 +1,270 @@
+"""
+Local factor evaluation.
+
+Factors and prices are (date x symbol) matrices, e.g. fields of a kkdatac.panel.Panel.
+Every statistic is computed for all dates at once: correlations are masked row-wise
+reductions, ranks come from one argsort per matrix with ties averaged through bincount,
+and quantile portfolios are bincount sums over (date, quantile) cells. Many factors can
+be screened in parallel on a process pool that receives the prices once per worker.
+"""
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from kkdatac.panel import Panel
+
+HORIZONS = (1, 5, 10, 20)
+QUANTILES = 5
+
+
+def _as_matrix(data, field: str | None = None):
+    """(values, dates, symbols) of a Panel field, a wide DataFrame or an array"""
+    if isinstance(data, Panel):
+        if field is None:
+            if len(data.fields) != 1:
+                raise ValueError(f"Panel has fields {data.fields}, pick one with field=")
+            field = data.fields[0]
+        return np.asarray(data[field], dtype=float), data.dates, data.symbols
+    if isinstance(data, pd.DataFrame):
+        return data.to_numpy(dtype=float), pd.to_datetime(data.index).to_numpy(), pd.Index(data.columns)
+    return np.asarray(data, dtype=float), None, None
+
+
+def align(factor, prices, field: str | None = None, price_field: str = 'close'):
+    """
+    Factor and price matrices over their common dates and symbols.
+    Arrays without an index must already have the same shape.
+    """
+    x, x_dates, x_symbols = _as_matrix(factor, field)
+    y, y_dates, y_symbols = _as_matrix(prices, price_field if isinstance(prices, Panel) else None)
+    if x_dates is None or y_dates is None:
+        if x.shape != y.shape:
+            raise ValueError(f"Factor shape {x.shape} does not match price shape {y.shape}")
+        return x, y, x_dates if x_dates is not None else y_dates, x_symbols if x_symbols is not None else y_symbols
+    dates = np.intersect1d(x_dates, y_dates)
+    symbols = x_symbols.intersection(y_symbols, sort=False)
+    x = x[np.searchsorted(x_dates, dates)][:, x_symbols.get_indexer(symbols)]
+    y = y[np.searchsorted(y_dates, dates)][:, y_symbols.get_indexer(symbols)]
+    return x, y, dates, symbols
+
+
+def forward_returns(close: np.ndarray, horizon: int = 1) -> np.ndarray:
+    """Return from each date's close to the close horizon dates later (NaN at the end)"""
+    result = np.full(close.shape, np.nan)
+    if horizon < len(close):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    return result
+
+
+def rank(x: np.ndarray) -> np.ndarray:
+    """Ranks (1..n) within each row, NaN left out and ties given their average rank"""
+    x = np.asarray(x, dtype=float)
+    n_rows, n_cols = x.shape
+    order = np.argsort(x, axis=1)
+    xs = np.take_along_axis(x, order, axis=1)
+    valid = ~np.isnan(xs)
+    # A new tie group starts at each row start and wherever the sorted value changes
+    starts = np.ones(xs.shape, dtype=bool)
+    starts[:, 1:] = xs[:, 1:] != xs[:, :-1]
+    groups = np.cumsum(starts.reshape(-1)) - 1
+    positions = np.tile(np.arange(1, n_cols + 1, dtype=float), n_rows)
+    averages = np.bincount(groups, weights=positions) / np.bincount(groups)
+    ranks_sorted = np.where(valid, averages[groups].reshape(xs.shape), np.nan)
+    result = np.empty_like(ranks_sorted)
+    np.put_along_axis(result, order, ranks_sorted, axis=1)
+    return result
+
+
+def row_corr(x: np.ndarray, y: np.ndarray, min_count: int = 3) -> np.ndarray:
+    """Pearson correlation of x and y within each row over the cells valid in both"""
+    mask = ~(np.isnan(x) | np.isnan(y))
+    n = mask.sum(axis=1)
+    x = np.where(mask, x, 0.0)
+    y = np.where(mask, y, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mx = x.sum(axis=1) / n
+        my = y.sum(axis=1) / n
+        dx = np.where(mask, x - mx[:, None], 0.0)
+        dy = np.where(mask, y - my[:, None], 0.0)
+        corr = (dx * dy).sum(axis=1) / np.sqrt((dx * dx).sum(axis=1) * (dy * dy).sum(axis=1))
+    corr[n < min_count] = np.nan
+    return corr
+
+
+def information_coefficient(factor: np.ndarray, returns: np.ndarray, method: str = 'rank') -> np.ndarray:
+    """Cross-sectional IC per date: 'pearson' on the values, 'rank' (Spearman) on their ranks"""
+    if method == 'rank':
+        mask = np.isnan(factor) | np.isnan(returns)
+        factor = rank(np.where(mask, np.nan, factor))
+        returns = rank(np.where(mask, np.nan, returns))
+    elif method != 'pearson':
+        raise ValueError(f"Unknown IC method: {method}")
+    return row_corr(factor, returns)
+
+
+def _rank_ic(x: np.ndarray, x_ranks: np.ndarray, returns: np.ndarray) -> np.ndarray:
+    """
+    Rank IC reusing the factor's ranks: only dates where returns are missing for some
+    (but not all) symbols with a factor value are re-ranked on the joint mask.
+    """
+    missing = np.isnan(returns)
+    dropped = missing & ~np.isnan(x)
+    rows = dropped.any(axis=1) & ~missing.all(axis=1)
+    if rows.any():
+        x_ranks = x_ranks.copy()
+        x_ranks[rows] = rank(np.where(dropped[rows], np.nan, x[rows]))
+    return row_corr(x_ranks, rank(np.where(np.isnan(x), np.nan, returns)))
+
+
+def quantile_buckets(factor: np.ndarray, quantiles: int = QUANTILES, ranks: np.ndarray | None = None) -> np.ndarray:
+    """Quantile (0..quantiles-1) of each cell within its date by factor rank, -1 where missing"""
+    if ranks is None:
+        ranks = rank(factor)
+    counts = (~np.isnan(ranks)).sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        buckets = np.floor((ranks - 1) * quantiles / counts)
+    return np.where(np.isnan(buckets), -1, buckets).astype(np.int64)
+
+
+def quantile_returns(buckets: np.ndarray, returns: np.ndarray, quantiles: int = QUANTILES) -> np.ndarray:
+    """Equal-weighted mean return of each quantile per date, shape (dates, quantiles)"""
+    valid = (buckets >= 0) & ~np.isnan(returns)
+    cells = (np.arange(len(buckets))[:, None] * quantiles + buckets)[valid]
+    size = len(buckets) * quantiles
+    sums = np.bincount(cells, weights=returns[valid], minlength=size)
+    counts = np.bincount(cells, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums / counts).reshape(len(buckets), quantiles)
+
+
+def quantile_turnover(buckets: np.ndarray, quantiles: int = QUANTILES) -> np.ndarray:
+    """Share of each quantile's members that were not in it the previous date, shape (dates, quantiles)"""
+    result = np.full((len(buckets), quantiles), np.nan)
+    for q in range(quantiles):
+        members = buckets == q
+        held = members.sum(axis=1)
+        stayed = (members[1:] & members[:-1]).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[1:, q] = 1 - stayed / held[1:]
+    return result
+
+
+def _summary(ic: np.ndarray) -> dict:
+    ic = ic[~np.isnan(ic)]
+    if len(ic) < 2:
+        return {'mean': np.nan, 'std': np.nan, 'ir': np.nan, 't_stat': np.nan, 'positive': np.nan}
+    mean, std = ic.mean(), ic.std(ddof=1)
+    return {
+        'mean': mean,
+        'std': std,
+        'ir': mean / std if std else np.nan,
+        't_stat': mean / std * np.sqrt(len(ic)) if std else np.nan,
+        'positive': (ic > 0).mean(),
+    }
+
+
+def evaluate(
+    factor,
+    prices,
+    field: str | None = None,
+    horizons: tuple[int, ...] = HORIZONS,
+    quantiles: int = QUANTILES,
+    price_field: str = 'close',
+) -> dict:
+    """
+    Evaluate a factor against forward returns of prices.
+
+    :param factor: factor values as a Panel (pick the field with field=), a wide
+        (date x symbol) DataFrame or an array
+    :param prices: prices in the same forms; a Panel contributes its price_field
+    :param horizons: forward return horizons in dates; the first one drives the IC
+        series, quantile returns and turnover
+    :param quantiles: number of quantile portfolios
+    :return: dict with the daily 'ic' and 'rank_ic' Series, 'ic_decay' (IC and rank IC
+        summary per horizon), 'quantile_returns' and 'turnover' (date x quantile), the
+        per-date 'long_short' spread and a 'summary' of the headline numbers
+    """
+    x, close, dates, symbols = align(factor, prices, field, price_field)
+    index = pd.DatetimeIndex(dates) if dates is not None else None
+    x = np.where(np.isfinite(x), x, np.nan)
+    x_ranks = rank(x)
+
+    decay = {}
+    ic_series = rank_ic_series = None
+    for horizon in horizons:
+        returns = forward_returns(close, horizon)
+        ic = information_coefficient(x, returns, 'pearson')
+        rank_ic = _rank_ic(x, x_ranks, returns)
+        decay[horizon] = {
+            **{f'ic_{k}': v for k, v in _summary(ic).items()},
+            **{f'rank_ic_{k}': v for k, v in _summary(rank_ic).items()},
+        }
+        if ic_series is None:
+            ic_series, rank_ic_series, base_returns = ic, rank_ic, returns
+
+    buckets = quantile_buckets(x, quantiles, x_ranks)
+    q_returns = quantile_returns(buckets, base_returns, quantiles)
+    turnover = quantile_turnover(buckets, quantiles)
+    long_short = q_returns[:, -1] - q_returns[:, 0]
+    columns = pd.RangeIndex(1, quantiles + 1, name='quantile')
+    ic_summary, rank_ic_summary = _summary(ic_series), _summary(rank_ic_series)
+    return {
+        'ic': pd.Series(ic_series, index=index, name='ic'),
+        'rank_ic': pd.Series(rank_ic_series, index=index, name='rank_ic'),
+        'ic_decay': pd.DataFrame.from_dict(decay, orient='index').rename_axis('horizon'),
+        'quantile_returns': pd.DataFrame(q_returns, index=index, columns=columns),
+        'turnover': pd.DataFrame(turnover, index=index, columns=columns),
+        'long_short': pd.Series(long_short, index=index, name='long_short'),
+        'summary': {
+            'ic': ic_summary['mean'],
+            'icir': ic_summary['ir'],
+            'rank_ic': rank_ic_summary['mean'],
+            'rank_icir': rank_ic_summary['ir'],
+            'rank_ic_t_stat': rank_ic_summary['t_stat'],
+            'long_short': np.nanmean(long_short) if np.isfinite(long_short).any() else np.nan,
+            'top_turnover': np.nanmean(turnover[:, -1]) if np.isfinite(turnover[:, -1]).any() else np.nan,
+            'symbols': len(symbols) if symbols is not None else x.shape[1],
+            'dates': len(x),
+        },
+    }
+
+
+# Prices shared with pool workers, sent once per process instead of once per factor
+_worker_prices = None
+
+
+def _init_worker(prices) -> None:
+    global _worker_prices
+    _worker_prices = prices
+
+
+def _evaluate_in_worker(name: str, factor, kwargs: dict) -> tuple[str, dict]:
+    return name, evaluate(factor, _worker_prices, **kwargs)
+
+
+def evaluate_factors(
+    factors: dict | Panel,
+    prices,
+    processes: int | None = None,
+    **kwargs,
+) -> tuple[pd.DataFrame, dict[str, dict]]:
+    """
+    Evaluate many factors against the same prices.
+
+    :param factors: name -> factor (any form accepted by evaluate), or a Panel whose
+        fields are the factors
+    :param prices: prices as accepted by evaluate
+    :param processes: worker processes; None or 1 evaluates in this process
+    :param kwargs: passed to evaluate (horizons, quantiles, price_field)
+    :return: a summary DataFrame with one row per factor, and the full result of each
+    """
+    if isinstance(factors, Panel):
+        factors = {name: factors[[name]] for name in factors.fields}
+    if processes is None or processes <= 1 or len(factors) <= 1:
+        results = {name: evaluate(factor, prices, **kwargs) for name, factor in factors.items()}
+    else:
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(prices,)) as pool:
+            futures = [pool.submit(_evaluate_in_worker, name, factor, kwargs) for name, factor in factors.items()]
+            results = dict(future.result() for future in futures)
+    summary = pd.DataFrame.from_dict({name: result['summary'] for name, result in results.items()}, orient='index')
+    return summary, results
@@ -0,0 +1,330 @@
+"""
+Local factor computation.
+
+Factor code, as stored with create_factor, is Python evaluated against a price Panel:
+either a single expression, or statements that assign the result to `factor`. Panel
+fields (open, high, low, close, vol, ...) are (date x symbol) arrays, combined with the
+operators below, e.g. "ts_mean(close, 5) / ts_mean(close, 20) - 1".
+
+All factors of an engine are computed in one pass over the same arrays, and operator
+results are memoized by (operator, inputs, window), so a 20-day moving average or
+volatility used by several factors is computed once. Rolling sums, means and standard
+deviations use cumulative sums, so their cost does not grow with the window.
+
+The history each factor needs is read off its code (the windows of nested time-series
+operators add up), so when a new day of bars arrives only that tail of history is
+recomputed. Factor code runs as Python in this process with the caller's privileges;
+the restricted builtins are not a sandbox, so only compute code you trust.
+"""
+import ast
+import builtins
+import warnings
+import numpy as np
+from kkdatac.panel import Panel
+
+# Window argument position and default, and the rows of history a window of n needs
+_WINDOW_OPS = {
+    'delay': (1, None, lambda n: n),
+    'delta': (1, None, lambda n: n),
+    'pct_change': (1, None, lambda n: n),
+    'returns': (0, 1, lambda n: n),
+    'ts_sum': (1, None, lambda n: n - 1),
+    'ts_mean': (1, None, lambda n: n - 1),
+    'ts_std': (1, None, lambda n: n - 1),
+    'ts_min': (1, None, lambda n: n - 1),
+    'ts_max': (1, None, lambda n: n - 1),
+    'ts_corr': (2, None, lambda n: n - 1),
+}
+# Builtins factor code may call; this keeps expressions tidy but does not contain them
+_BUILTINS = {name: getattr(builtins, name) for name in ('abs', 'min', 'max', 'len', 'range', 'float', 'int', 'round')}
+
+
+def _shift(x: np.ndarray, n: int) -> np.ndarray:
+    result = np.full(x.shape, np.nan)
+    if 0 < n < len(x):
+        result[n:] = x[:-n]
+    elif n == 0:
+        result[:] = x
+    return result
+
+
+def _rolling_sum(x: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    """Rolling sums of x (NaN as 0) and of its valid-cell count over n rows, via cumulative sums"""
+    valid = ~np.isnan(x)
+    padded = np.zeros((len(x) + 1,) + x.shape[1:])
+    counts = np.zeros((len(x) + 1,) + x.shape[1:])
+    np.cumsum(np.where(valid, x, 0.0), axis=0, out=padded[1:])
+    np.cumsum(valid, axis=0, out=counts[1:])
+    sums = np.full(x.shape, np.nan)
+    totals = np.zeros(x.shape)
+    if n <= len(x):
+        sums[n - 1:] = padded[n:] - padded[:-n]
+        totals[n - 1:] = counts[n:] - counts[:-n]
+    return sums, totals
+
+
+def _cross_section(func, x):
+    """Per-date nan-reduction of x, NaN without warnings on dates with no values"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return func(x, axis=1, keepdims=True)
+
+
+class _Operators:
+    """Operators available to factor code, memoized for the lifetime of one computation"""
+
+    def __init__(self, panel: Panel):
+        self._panel = panel
+        self._memo = {}
+        # Memo keys use id(); holding the inputs keeps those ids unique
+        self._inputs = []
+
+    def _cached(self, name: str, func, *args):
+        key = (name,) + tuple(id(a) if isinstance(a, np.ndarray) else a for a in args)
+        if key not in self._memo:
+            self._inputs.append(args)
+            self._memo[key] = func(*args)
+        return self._memo[key]
+
+    def namespace(self) -> dict:
+        ops = {
+            name: getattr(self, name) for name in (
+                'delay', 'delta', 'pct_change', 'returns', 'ts_sum', 'ts_mean', 'ts_std',
+                'ts_min', 'ts_max', 'ts_corr', 'rank', 'zscore', 'demean',
+            )
+        }
+        ops.update(np=np, log=np.log, sign=np.sign, sqrt=np.sqrt, where=np.where, nan=np.nan)
+        ops.update(self._panel.data)
+        return ops
+
+    def delay(self, x, n: int):
+        """x n dates earlier"""
+        return self._cached('delay', _shift, x, n)
+
+    def delta(self, x, n: int):
+        """x minus x n dates earlier"""
+        return self._cached('delta', lambda x, n: x - self.delay(x, n), x, n)
+
+    def pct_change(self, x, n: int):
+        """Relative change of x over n dates"""
+        def compute(x, n):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return x / self.delay(x, n) - 1
+        return self._cached('pct_change', compute, x, n)
+
+    def returns(self, n: int = 1):
+        """Close-to-close returns over n dates"""
+        return self.pct_change(self._panel['close'], n)
+
+    def ts_sum(self, x, n: int):
+        """Sum over the last n dates, NaN unless all n are present"""
+        def compute(x, n):
+            sums, counts = _rolling_sum(x, n)
+            return np.where(counts == n, sums, np.nan)
+        return self._cached('ts_sum', compute, x, n)
+
+    def ts_mean(self, x, n: int):
+        """Mean over the last n dates, NaN unless all n are present"""
+        return self._cached('ts_mean', lambda x, n: self.ts_sum(x, n) / n, x, n)
+
+    def ts_std(self, x, n: int):
+        """Sample standard deviation over the last n dates"""
+        def compute(x, n):
+            mean = self.ts_mean(x, n)
+            squares = self.ts_mean(self._cached('square', np.square, x), n)
+            with np.errstate(invalid='ignore'):
+                return np.sqrt(np.maximum(squares - mean * mean, 0) * n / (n - 1))
+        return self._cached('ts_std', compute, x, n)
+
+    def ts_min(self, x, n: int):
+        """Minimum over the last n dates"""
+        return self._cached('ts_min', lambda x, n: self._window_reduce(x, n, np.min), x, n)
+
+    def ts_max(self, x, n: int):
+        """Maximum over the last n dates"""
+        return self._cached('ts_max', lambda x, n: self._window_reduce(x, n, np.max), x, n)
+
+    @staticmethod
+    def _window_reduce(x, n, reduce):
+        result = np.full(x.shape, np.nan)
+        if n <= len(x):
+            windows = np.lib.stride_tricks.sliding_window_view(x, n, axis=0)
+            result[n - 1:] = reduce(windows, axis=-1)
+        return result
+
+    def ts_corr(self, x, y, n: int):
+        """Correlation of x and y over the last n dates"""
+        def compute(x, y, n):
+            mean_x, mean_y = self.ts_mean(x, n), self.ts_mean(y, n)
+            mean_xy = self.ts_mean(self._cached('product', np.multiply, x, y), n)
+            std_x, std_y = self.ts_std(x, n), self.ts_std(y, n)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return (mean_xy - mean_x * mean_y) * n / (n - 1) / (std_x * std_y)
+        return self._cached('ts_corr', compute, x, y, n)
+
+    def rank(self, x):
+        """Cross-sectional percentile rank within each date"""
+        def compute(x):
+            from kkdatac.evaluation import rank
+            counts = (~np.isnan(x)).sum(axis=1, keepdims=True)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return rank(x) / counts
+        return self._cached('rank', compute, x)
+
+    def zscore(self, x):
+        """Cross-sectional z-score within each date"""
+        def compute(x):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return self.demean(x) / _cross_section(np.nanstd, x)
+        return self._cached('zscore', compute, x)
+
+    def demean(self, x):
+        """x minus its cross-sectional mean within each date"""
+        return self._cached('demean', lambda x: x - _cross_section(np.nanmean, x), x)
+
+
+def _window(node: ast.Call, position: int, default: int | None) -> int | None:
+    arg = next((k.value for k in node.keywords if k.arg == 'n'), None)
+    if arg is None and len(node.args) > position:
+        arg = node.args[position]
+    if arg is None:
+        return default
+    if isinstance(arg, ast.Constant) and isinstance(arg.value, int):
+        return arg.value
+    return None
+
+
+def _lookback(node: ast.AST, names: dict[str, int | None]) -> int | None:
+    """Rows of history an expression needs; None when a window is not a literal"""
+    if isinstance(node, ast.Name):
+        return names.get(node.id, 0)
+    extra = 0
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _WINDOW_OPS:
+        position, default, rows = _WINDOW_OPS[node.func.id]
+        n = _window(node, position, default)
+        if n is None:
+            return None
+        extra = rows(n)
+    deepest = 0
+    for child in ast.iter_child_nodes(node):
+        child_lookback = _lookback(child, names)
+        if child_lookback is None:
+            return None
+        deepest = max(deepest, child_lookback)
+    return extra + deepest
+
+
+class CompiledFactor:
+    """Factor code compiled once, with the history it needs"""
+
+    def __init__(self, name: str, code: str):
+        self.name = name
+        self.code = code
+        tree = ast.parse(code.strip(), mode='exec')
+        if len(tree.body) == 1 and isinstance(tree.body[0], ast.Expr):
+            self.mode = 'eval'
+            expression = ast.Expression(tree.body[0].value)
+            self._code = compile(expression, f"<factor {name}>", 'eval')
+            self.lookback = _lookback(expression, {})
+        else:
+            self.mode = 'exec'
+            self._code = compile(tree, f"<factor {name}>", 'exec')
+            names: dict[str, int | None] = {}
+            for statement in tree.body:
+                lookback = _lookback(statement.value, names) if isinstance(statement, ast.Assign) else 0
+                if isinstance(statement, ast.Assign):
+                    for target in statement.targets:
+                        if isinstance(target, ast.Name):
+                            names[target.id] = lookback
+                elif not isinstance(statement, ast.Expr):
+                    # Control flow: assume full history
+                    lookback = None
+                if lookback is None:
+                    names = {k: None for k in names}
+            if 'factor' not in names:
+                raise ValueError(f"Factor {name} does not assign its result to `factor`")
+            self.lookback = names['factor']
+
+    def evaluate(self, namespace: dict) -> np.ndarray:
+        """Run the factor code against namespace; the code executes unsandboxed."""
+        if self.mode == 'eval':
+            result = eval(self._code, {'__builtins__': _BUILTINS}, namespace)
+        else:
+            scope = dict(namespace)
+            exec(self._code, {'__builtins__': _BUILTINS}, scope)
+            result = scope['factor']
+        return np.asarray(result, dtype=float)
+
+
+class FactorEngine:
+    def __init__(self, factors: dict[str, str] | None = None):
+        """
+        :param factors: factor name -> code
+        """
+        self.factors: dict[str, CompiledFactor] = {}
+        self.history: Panel | None = None
+        for name, code in (factors or {}).items():
+            self.add(name, code)
+
+    @classmethod
+    def from_server(cls, factor_ids: list[int], api_key: str | None = None, trusted: bool = False) -> 'FactorEngine':
+        """
+        Build an engine from factors stored on the server with create_factor.
+
+        Factor code is executed as Python on this machine, so running someone else's
+        factor is running their code with your privileges. Unless trusted=True, only
+        private factors are accepted: the server shows those to their owner alone, so
+        they are the caller's own. Public factors, possibly written by other users, are
+        refused; pass trusted=True only after reading their code.
+        """
+        from kkdatac.client import get_client
+        client = get_client(api_key=api_key)
+        engine = cls()
+        for factor_id in factor_ids:
+            factor = client.get_factor(factor_id)
+            if not trusted and factor.get('is_public') is not False:
+                raise ValueError(
+                    f"Factor {factor_id} is public or of unknown ownership and its code would run locally; "
+                    "review it and pass trusted=True to compute it"
+                )
+            engine.add(factor.get('name', str(factor_id)), factor['code'])
+        return engine
+
+    def add(self, name: str, code: str) -> CompiledFactor:
+        """Compile a factor and add it to the engine."""
+        factor = CompiledFactor(name, code)
+        self.factors[name] = factor
+        return factor
+
+    @property
+    def lookback(self) -> int | None:
+        """Rows of history the engine's factors need, None if some need all of it"""
+        lookbacks = [f.lookback for f in self.factors.values()]
+        return None if any(lb is None for lb in lookbacks) else max(lookbacks, default=0)
+
+    def compute(self, panel: Panel, names: list[str] | None = None) -> Panel:
+        """
+        Compute factors over a price panel in one pass sharing intermediate results, and
+        keep the tail of the panel needed for later updates.
+        """
+        ops = _Operators(panel)
+        namespace = ops.namespace()
+        data = {name: self.factors[name].evaluate(namespace) for name in (names or self.factors)}
+        # Rows to keep for the next update: the lookback, plus the last row it is counted from
+        lookback = self.lookback
+        if lookback is None or len(panel.dates) <= lookback + 1:
+            self.history = panel
+        else:
+            self.history = panel.slice(start_date=panel.dates[-lookback - 1])
+        return Panel(data, panel.dates, panel.symbols)
+
+    def update(self, bars: Panel) -> Panel:
+        """
+        Compute factors for new dates of bars, recomputing only the history the factors
+        need instead of the whole panel.
+        """
+        if self.history is None:
+            return self.compute(bars)
+        panel = self.history.append(bars)
+        result = self.compute(panel)
+        return result.slice(start_date=bars.dates[0])
@@ -0,0 +1,287 @@
+"""
+Local store of factor values with incremental backfill.
+
+Values are stored per factor, partitioned by year, in columnar frames with one row per
+(security, date). A state file remembers, per factor and security, the date ranges already
+fetched, so a request only asks /api/v1/factors/data for the parts of its range that are
+not held yet; overlapping research queries are then served from local disk.
+
+Each factor's definition version (from the factor metadata) is recorded with its data;
+when the server reports a different version the factor's data is dropped and re-fetched.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from kkdatac.client import get_client, _check_return_type
+from kkdatac.codec import find_frame, read_frame, write_frame, to_arrow
+from kkdatac.config import FACTOR_STORE_DIR, FACTOR_VERSION_INTERVAL
+from kkdatac.panel import Panel, SYMBOL_COLUMNS, DATE_COLUMNS, _find_column
+
+SYMBOL_COLUMN = 'order_book_id'
+DATE_COLUMN = 'date'
+
+
+def _day(date) -> int:
+    return int(np.datetime64(pd.Timestamp(date).date(), 'D').astype(np.int64))
+
+
+def _day_str(day: int) -> str:
+    return str(np.datetime64(day, 'D'))
+
+
+def _missing(held: list[list[int]], start: int, end: int) -> list[tuple[int, int]]:
+    """Parts of [start, end] not covered by the sorted, disjoint held ranges"""
+    gaps = []
+    for lo, hi in held:
+        if hi < start:
+            continue
+        if lo > end:
+            break
+        if lo > start:
+            gaps.append((start, lo - 1))
+        start = max(start, hi + 1)
+    if start <= end:
+        gaps.append((start, end))
+    return gaps
+
+
+def _merge(held: list[list[int]], start: int, end: int) -> list[list[int]]:
+    """Held ranges with [start, end] added, merging ranges that overlap or touch"""
+    merged = []
+    for lo, hi in sorted(held + [[start, end]]):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def _version(factor: dict) -> str | None:
+    """Version of a factor definition: its version field, else its update time, else a digest of its code"""
+    for key in ('version', 'updated_at'):
+        if factor.get(key) is not None:
+            return str(factor[key])
+    if factor.get('code') is not None:
+        return hashlib.sha256(factor['code'].encode()).hexdigest()[:16]
+    return None
+
+
+def _normalize(data: pd.DataFrame) -> pd.DataFrame:
+    """Factor data with the security and date as columns named order_book_id and date"""
+    if not any(name in data.columns for name in SYMBOL_COLUMNS):
+        data = data.reset_index()
+    symbol_col = _find_column(data.columns, SYMBOL_COLUMNS, 'symbol')
+    date_col = _find_column(data.columns, DATE_COLUMNS, 'date')
+    data = data.rename(columns={symbol_col: SYMBOL_COLUMN, date_col: DATE_COLUMN})
+    data[DATE_COLUMN] = pd.to_datetime(data[DATE_COLUMN].astype(str)).astype('datetime64[ns]')
+    data[SYMBOL_COLUMN] = data[SYMBOL_COLUMN].astype(str)
+    return data
+
+
+class FactorStore:
+    def __init__(
+        self,
+        root: str = FACTOR_STORE_DIR,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        version_interval: float = FACTOR_VERSION_INTERVAL,
+    ):
+        """
+        :param root: directory holding one sub-directory per stored factor
+        :param api_key: API key used to fetch factor data
+        :param base_url: kkdatad endpoint used to fetch factor data
+        :param version_interval: seconds after a version check during which factor versions are not re-checked
+        """
+        self.root = root
+        self.api_key = api_key
+        self.base_url = base_url
+        self.version_interval = version_interval
+        self._lock = threading.Lock()
+
+    def _client(self):
+        return get_client(api_key=self.api_key, base_url=self.base_url)
+
+    def _state_path(self) -> str:
+        return os.path.join(self.root, '_state.json')
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self._state_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_state(self, state: dict) -> None:
+        path = self._state_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
+
+    def held(self, factor: str, order_book_id: str) -> list[tuple[str, str]]:
+        """Date ranges of a factor held locally for a security"""
+        ranges = self._load_state().get(factor, {}).get('ranges', {}).get(order_book_id, [])
+        return [(_day_str(lo), _day_str(hi)) for lo, hi in ranges]
+
+    def _check_versions(self, state: dict, factors: list[str]) -> None:
+        """Drop the data of factors whose definition changed since it was fetched"""
+        now = time.time()
+        stale = [f for f in factors if now - state.get(f, {}).get('checked_at', 0) >= self.version_interval]
+        if not stale:
+            return
+        versions = {f.get('name'): _version(f) for f in self._client().list_factors()}
+        for factor in stale:
+            entry = state.setdefault(factor, {'version': None, 'ranges': {}})
+            version = versions.get(factor)
+            if entry['ranges'] and version != entry.get('version'):
+                self._drop(state, factor)
+            entry['version'] = version
+            entry['checked_at'] = now
+
+    def invalidate(self, factor: str) -> None:
+        """Remove everything held for a factor"""
+        with self._lock:
+            state = self._load_state()
+            self._drop(state, factor)
+            self._save_state(state)
+
+    def _drop(self, state: dict, factor: str) -> None:
+        shutil.rmtree(os.path.join(self.root, factor), ignore_errors=True)
+        state.setdefault(factor, {})['ranges'] = {}
+
+    def sync(
+        self,
+        order_book_ids: str | list[str],
+        factors: str | list[str],
+        start_date: str,
+        end_date: str,
+    ) -> int:
+        """
+        Fetch the parts of [start_date, end_date] not held yet for each factor and security.
+        Requests missing the same range for the same securities are combined across factors.
+        Returns the number of rows fetched.
+        """
+        codes = [order_book_ids] if isinstance(order_book_ids, str) else list(dict.fromkeys(order_book_ids))
+        factors = [factors] if isinstance(factors, str) else list(dict.fromkeys(factors))
+        start = _day(start_date)
+        # Values for today may still change, so today is never recorded as held
+        end = _day(end_date)
+        held_end = min(end, _day(pd.Timestamp.today()) - 1)
+        client = self._client()
+        with self._lock:
+            state = self._load_state()
+            self._check_versions(state, factors)
+
+            gaps = defaultdict(list)
+            for factor in factors:
+                ranges = state[factor]['ranges']
+                for code in codes:
+                    for gap in _missing(ranges.get(code, []), start, end):
+                        gaps[(gap, factor)].append(code)
+            requests = defaultdict(list)
+            for (gap, factor), gap_codes in gaps.items():
+                requests[(gap, tuple(gap_codes))].append(factor)
+
+            fetched = 0
+            for ((lo, hi), gap_codes), gap_factors in requests.items():
+                data = client.get_factor_data(list(gap_codes), gap_factors, _day_str(lo), _day_str(hi))
+                data = _normalize(data)
+                fetched += len(data)
+                for factor in gap_factors:
+                    if factor in data.columns:
+                        self._append(factor, data[[SYMBOL_COLUMN, DATE_COLUMN, factor]])
+                    if lo <= held_end:
+                        ranges = state[factor]['ranges']
+                        for code in gap_codes:
+                            ranges[code] = _merge(ranges.get(code, []), lo, min(hi, held_end))
+                self._save_state(state)
+            self._save_state(state)
+        return fetched
+
+    def _append(self, factor: str, rows: pd.DataFrame) -> None:
+        """Merge new values into the factor's yearly partitions, rewriting only the partitions they touch"""
+        directory = os.path.join(self.root, factor)
+        os.makedirs(directory, exist_ok=True)
+        years = rows[DATE_COLUMN].dt.year.to_numpy()
+        for year, part in rows.groupby(years, sort=False):
+            stem = os.path.join(directory, str(year))
+            path = find_frame(stem)
+            if path is not None:
+                part = pd.concat([read_frame(path), part], ignore_index=True)
+                part = part.drop_duplicates(subset=[SYMBOL_COLUMN, DATE_COLUMN], keep='last')
+            write_frame(stem, part.sort_values([SYMBOL_COLUMN, DATE_COLUMN]).reset_index(drop=True))
+
+    def _read_factor(self, factor: str, codes: list[str], start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        directory = os.path.join(self.root, factor)
+        frames = []
+        for year in range(start.year, end.year + 1):
+            path = find_frame(os.path.join(directory, str(year)))
+            if path is not None:
+                frames.append(read_frame(path))
+        if not frames:
+            return pd.DataFrame({SYMBOL_COLUMN: pd.Series(dtype=str), DATE_COLUMN: pd.Series(dtype='datetime64[ns]'),
+                                 factor: pd.Series(dtype=float)})
+        df = pd.concat(frames, ignore_index=True)
+        dates = df[DATE_COLUMN].to_numpy()
+        mask = (dates >= start.to_datetime64()) & (dates <= end.to_datetime64()) & df[SYMBOL_COLUMN].isin(codes).to_numpy()
+        return df[mask]
+
+    def read(
+        self,
+        order_book_ids: str | list[str],
+        factors: str | list[str],
+        start_date: str,
+        end_date: str,
+    ) -> pd.DataFrame:
+        """Read stored values, one row per (security, date) and one column per factor"""
+        codes = [order_book_ids] if isinstance(order_book_ids, str) else list(dict.fromkeys(order_book_ids))
+        factors = [factors] if isinstance(factors, str) else list(dict.fromkeys(factors))
+        start, end = pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
+        keys = [SYMBOL_COLUMN, DATE_COLUMN]
+        if not factors:
+            return pd.DataFrame(columns=keys)
+        result = None
+        for factor in factors:
+            df = self._read_factor(factor, codes, start, end)
+            result = df if result is None else result.merge(df, on=keys, how='outer')
+        return result.sort_values(keys).reset_index(drop=True)
+
+    def get(
+        self,
+        order_book_ids: str | list[str],
+        factors: str | list[str],
+        start_date: str,
+        end_date: str,
+        return_type: str = 'pandas',
+        float_dtype: str | None = None,
+    ):
+        """Sync the missing ranges, then read the values from the store"""
+        _check_return_type(return_type, ('pandas', 'arrow', 'panel'))
+        self.sync(order_book_ids, factors, start_date, end_date)
+        df = self.read(order_book_ids, factors, start_date, end_date)
+        if float_dtype is not None:
+            columns = df.columns.difference([SYMBOL_COLUMN, DATE_COLUMN])
+            df[columns] = df[columns].astype(float_dtype)
+        if return_type == 'panel':
+            return Panel.from_long(df, date_col=DATE_COLUMN, symbol_col=SYMBOL_COLUMN)
+        return to_arrow(df) if return_type == 'arrow' else df
+
+
+_stores: dict[tuple, FactorStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_factor_store(root: str = FACTOR_STORE_DIR, api_key: str | None = None, base_url: str | None = None) -> FactorStore:
+    """Return the shared factor store for (root, api_key, base_url), creating it on first use."""
+    key = (root, api_key, base_url)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = FactorStore(root=root, api_key=api_key, base_url=base_url)
+    return store
@@ -1,6 +1,7 @@
 from typing import Dict, Optional
 import pandas as pd
-from .client import KKDataClient
+from .client import get_client
+from .factor_store import get_factor_store
 
 def create_factor(name: str, description: str, category: str, code: str, 
                  metadata: Optional[Dict] = None, is_public: bool = False,
@@ -20,12 +21,12 @@ def create_factor(name: str, description: str, category: str, code: str,
     Returns:
         dict: Created factor details
     """
-    client = KKDataClient(api_key=api_key)
+    client = get_client(api_key=api_key)
     return client.create_factor(name, description, category, code, metadata, is_public)
 
 def list_factors(category: Optional[str] = None, api_key: Optional[str] = None) -> list:
     """List available factors"""
-    client = KKDataClient(api_key=api_key)
+    client = get_client(api_key=api_key)
     return client.list_factors(category)
 
 def get_factor(
@@ -34,7 +35,10 @@ def get_factor(
     start_date: str | None = None,
     end_date: str | None = None,
     universe: str | None = None,
-    expect_df: bool = True
+    expect_df: bool = True,
+    return_type: str = 'pandas',
+    float_dtype: str | None = None,
+    store: bool = False
 ) -> pd.DataFrame:
     """
     Get factor data for given securities
@@ -46,18 +50,31 @@ def get_factor(
         end_date: End date (YYYY-MM-DD) 
         universe: Stock universe filter ('000300.XSHG' for CSI300 etc)
         expect_df: Return DataFrame if True, dict if False
+        return_type: 'pandas', 'arrow' or 'panel' (a kkdatac.panel.Panel, the input
+            of kkdatac.evaluation.evaluate)
+        float_dtype: e.g. 'float32' to halve the memory of factor values
+        store: Serve values from the local factor store (kkdatac.factor_store), which
+            only fetches the date ranges it does not hold yet. Needs factors and dates
         
     Returns:
         DataFrame with multi-index (order_book_id, date) and factor columns
     """
-    client = KKDataClient()
+    if store:
+        if not factors or not start_date or not end_date:
+            raise ValueError("store=True needs factors, start_date and end_date")
+        if universe:
+            raise ValueError("store=True does not support universe filters")
+        return get_factor_store().get(order_book_ids, factors, start_date, end_date, return_type, float_dtype)
+    client = get_client()
     return client.get_factor_data(
         order_book_ids=order_book_ids,
         factors=factors,
         start_date=start_date,
         end_date=end_date,
         universe=universe,
-        expect_df=expect_df
+        expect_df=expect_df,
+        return_type=return_type,
+        float_dtype=float_dtype
     )
 
 def get_factor_exposure(
@@ -65,7 +82,9 @@ def get_factor_exposure(
     start_date: str,
     end_date: str,
     factors: str | list[str] | None = None,
-    industry_mapping: str = 'sws_2021'
+    industry_mapping: str = 'sws_2021',
+    return_type: str = 'pandas',
+    float_dtype: str | None = None
 ) -> pd.DataFrame:
     """
     Get factor exposure data
@@ -76,17 +95,21 @@ def get_factor_exposure(
         end_date: End date
         factors: Factor name(s) to fetch
         industry_mapping: Industry classification standard
+        return_type: 'pandas', 'arrow' or 'panel'
+        float_dtype: e.g. 'float32' for compact exposures
         
     Returns:
         DataFrame with factor exposures
     """
-    client = KKDataClient()
+    client = get_client()
     return client.get_factor_exposure(
         order_book_ids=order_book_ids,
         start_date=start_date,
         end_date=end_date,
         factors=factors,
-        industry_mapping=industry_mapping
+        industry_mapping=industry_mapping,
+        return_type=return_type,
+        float_dtype=float_dtype
     )
 
 def get_factor_return(
@@ -111,7 +134,7 @@ def get_factor_return(
     Returns:
         DataFrame with factor returns
     """
-    client = KKDataClient()
+    client = get_client()
     return client.get_factor_return(
         start_date=start_date,
         end_date=end_date,
@@ -133,6 +156,8 @@ def evaluate_factor(factor_id: int, returns_data: pd.DataFrame,
     
     Returns:
         dict: Factor evaluation metrics
+
+    To evaluate locally without a round trip, see kkdatac.evaluation.evaluate.
     """
-    client = KKDataClient(api_key=api_key)
+    client = get_client(api_key=api_key)
     return client.evaluate_factor(factor_id, returns_data) 
\ No newline at end of file
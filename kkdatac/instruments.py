@@ -0,0 +1,187 @@
+"""
+In-process instrument master.
+
+Listing data of every instrument is held column-wise in numpy arrays (dates as
+datetime64[D]) and indexed by order_book_id, so filtering by type, exchange or date and
+computing days from listing or to expiry are vectorized over thousands of symbols at
+once. Instrument records are thin __slots__ views onto one row of those arrays.
+The master is loaded from kkdatad once, kept on disk under INSTRUMENTS_DIR and reloaded
+after INSTRUMENTS_TTL.
+"""
+import datetime
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from kkdatac.client import get_client
+from kkdatac.codec import find_frame, read_frame, write_frame
+from kkdatac.config import INSTRUMENTS_DIR, INSTRUMENTS_TTL
+from kkdatac.trading_calendar import _as_days
+from kkdatac.utils.code_converter import CodeConverter
+
+# Instrument type -> query of its listing data; the stock list is required, others are optional
+_INSTRUMENT_QUERIES = {
+    "cn": {
+        "CS": "SELECT ts_code, name AS symbol, exchange, market AS board_type, industry AS industry_name, "
+              "list_date AS listed_date, delist_date AS de_listed_date FROM stock_basic",
+        "INDX": "SELECT ts_code, name AS symbol, market AS exchange, list_date AS listed_date FROM index_basic",
+        "ETF": "SELECT ts_code, name AS symbol, market AS exchange, list_date AS listed_date, "
+               "delist_date AS de_listed_date FROM fund_basic WHERE market = 'E'",
+        "Future": "SELECT ts_code, name AS symbol, exchange, list_date AS listed_date, "
+                  "delist_date AS de_listed_date FROM fut_basic",
+    },
+}
+_REQUIRED_TYPES = ("CS",)
+COLUMNS = ("order_book_id", "symbol", "type", "exchange", "board_type", "industry_name",
+           "listed_date", "de_listed_date")
+_DATE_COLUMNS = ("listed_date", "de_listed_date")
+
+
+class Instrument:
+    """One instrument, reading its fields from the master's arrays"""
+    __slots__ = ("_master", "_position")
+
+    def __init__(self, master: "InstrumentMaster", position: int):
+        self._master = master
+        self._position = position
+
+    def __getattr__(self, name: str):
+        column = self._master.columns.get(name)
+        if column is None:
+            raise AttributeError(name)
+        value = column[self._position]
+        if isinstance(value, np.datetime64):
+            return None if np.isnat(value) else str(value)
+        return value
+
+    def days_from_listed(self, date=None) -> int:
+        """Days from listing to date (today by default), -1 if not listed by then"""
+        return int(self._master.days_from_listed(np.array([self._position]), date)[0])
+
+    def days_to_expire(self, date=None) -> int:
+        """Days from date (today by default) to delisting or expiry, -1 without an expiry date"""
+        return int(self._master.days_to_expire(np.array([self._position]), date)[0])
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in COLUMNS)
+        return f"Instrument({fields})"
+
+
+class InstrumentMaster:
+    def __init__(self, data: pd.DataFrame, market: str = "cn"):
+        """
+        :param data: one row per instrument with an order_book_id column and any of COLUMNS
+        :param market: market the instruments belong to
+        """
+        self.market = market
+        self.columns = {}
+        for name in COLUMNS:
+            values = data[name] if name in data.columns else pd.Series(None, index=data.index, dtype=object)
+            if name in _DATE_COLUMNS:
+                dates = pd.to_datetime(values.astype(str), format="%Y%m%d", errors="coerce")
+                self.columns[name] = dates.to_numpy().astype("datetime64[D]")
+            else:
+                self.columns[name] = values.to_numpy(dtype=object)
+        self.index = pd.Index(self.columns["order_book_id"])
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def positions(self, order_book_ids) -> np.ndarray:
+        """Rows of the given order_book_ids, in any supported code format"""
+        codes = [order_book_ids] if isinstance(order_book_ids, str) else order_book_ids
+        converted = CodeConverter.convert_series(pd.Series(codes, dtype=object), "rq")
+        positions = self.index.get_indexer(converted.astype(object))
+        if (positions < 0).any():
+            missing = [c for c, p in zip(codes, positions) if p < 0]
+            raise KeyError(f"Unknown instruments: {', '.join(map(str, missing[:10]))}")
+        return positions
+
+    def instrument(self, order_book_id: str) -> Instrument:
+        return Instrument(self, int(self.positions(order_book_id)[0]))
+
+    def mask(self, type: str | list[str] | None = None, date=None, exchange: str | list[str] | None = None) -> np.ndarray:
+        """
+        Rows of the given types and exchanges, listed on date and not delisted before it
+        (every row when a filter is None)
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if type is not None:
+            mask &= np.isin(self.columns["type"], [type] if isinstance(type, str) else type)
+        if exchange is not None:
+            mask &= np.isin(self.columns["exchange"], [exchange] if isinstance(exchange, str) else exchange)
+        if date is not None:
+            day = _as_days(date)
+            listed, delisted = self.columns["listed_date"], self.columns["de_listed_date"]
+            mask &= (listed <= day) & (np.isnat(delisted) | (delisted > day))
+        return mask
+
+    def frame(self, mask: np.ndarray | None = None) -> pd.DataFrame:
+        """Instruments as a DataFrame, optionally only the rows of a mask"""
+        columns = self.columns if mask is None else {name: values[mask] for name, values in self.columns.items()}
+        return pd.DataFrame(columns)
+
+    def days_from_listed(self, positions: np.ndarray, date=None) -> np.ndarray:
+        """Days from listing to date (today by default) for rows, -1 where not listed by then"""
+        day = _as_days(datetime.date.today() if date is None else date)
+        listed = self.columns["listed_date"][positions]
+        days = (day - listed).astype(np.int64)
+        return np.where(np.isnat(listed) | (listed > day), -1, days)
+
+    def days_to_expire(self, positions: np.ndarray, date=None) -> np.ndarray:
+        """Days from date (today by default) to delisting or expiry for rows, -1 where there is none"""
+        day = _as_days(datetime.date.today() if date is None else date)
+        expiry = self.columns["de_listed_date"][positions]
+        days = (expiry - day).astype(np.int64)
+        return np.where(np.isnat(expiry), -1, days)
+
+
+def _load_from_server(market: str) -> pd.DataFrame:
+    queries = _INSTRUMENT_QUERIES.get(market)
+    if queries is None:
+        raise ValueError(f"Unsupported market: {market}")
+    client = get_client()
+    frames = []
+    for instrument_type, query in queries.items():
+        try:
+            df = client.run_query(query, use_cache=False)
+        except Exception as e:
+            if instrument_type in _REQUIRED_TYPES:
+                raise Exception(f"Failed to load the {market} instruments: {e}")
+            continue
+        df = df.assign(type=instrument_type, order_book_id=CodeConverter.convert_codes(df["ts_code"], "rq").astype(object))
+        frames.append(df.drop(columns="ts_code"))
+    data = pd.concat(frames, ignore_index=True)
+    for name in _DATE_COLUMNS:
+        # Stored as 'YYYYMMDD' text so the frame round-trips through any on-disk format
+        if name in data.columns:
+            data[name] = data[name].astype(str)
+    return data.drop_duplicates("order_book_id", keep="first").reset_index(drop=True)
+
+
+_masters: dict[str, tuple[float, InstrumentMaster]] = {}
+_masters_lock = threading.Lock()
+
+
+def get_instrument_master(market: str = "cn", refresh: bool = False) -> InstrumentMaster:
+    """
+    Return the instrument master of a market, loading it at most once per INSTRUMENTS_TTL:
+    from memory, then from the copy on disk, then from the server.
+    """
+    now = time.time()
+    with _masters_lock:
+        loaded = _masters.get(market)
+        if loaded is not None and not refresh and now - loaded[0] < INSTRUMENTS_TTL:
+            return loaded[1]
+        stem = os.path.join(INSTRUMENTS_DIR, market)
+        path = find_frame(stem)
+        if not refresh and path is not None and now - os.path.getmtime(path) < INSTRUMENTS_TTL:
+            loaded_at, data = os.path.getmtime(path), read_frame(path)
+        else:
+            loaded_at, data = now, _load_from_server(market)
+            os.makedirs(INSTRUMENTS_DIR, exist_ok=True)
+            write_frame(stem, data)
+        master = InstrumentMaster(data, market)
+        _masters[market] = (loaded_at, master)
+        return master
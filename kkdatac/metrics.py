@@ -0,0 +1,149 @@
+"""
+Client-side instrumentation.
+
+Requests are timed stage by stage in spans (network round trip, unhex, decompress,
+unpickle, Arrow decoding and DataFrame post-processing) and counted in counters (bytes
+received and decompressed, cache hits and misses, retries). Every measurement is
+aggregated in-process, readable at any time with stats(), logged at DEBUG level on the
+"kkdatac" logger and passed to the hooks registered with add_hook, such as the
+OpenTelemetry exporter of enable_opentelemetry.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable
+
+logger = logging.getLogger("kkdatac")
+
+# hook(kind, name, value, attributes): kind is "span" (value in seconds) or "counter"
+Hook = Callable[[str, str, float, dict], None]
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hooks: list[Hook] = []
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear the aggregated counters and timings."""
+        with self._lock:
+            self._counters = defaultdict(float)
+            # name -> [count, total seconds, max seconds]
+            self._timings = defaultdict(lambda: [0, 0.0, 0.0])
+
+    def count(self, name: str, value: float = 1, **attributes) -> None:
+        """Add value to a counter."""
+        with self._lock:
+            self._counters[name] += value
+        self._emit("counter", name, value, attributes)
+
+    def record(self, name: str, seconds: float, **attributes) -> None:
+        """Record the duration of a stage."""
+        with self._lock:
+            timing = self._timings[name]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+        self._emit("span", name, seconds, attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time the enclosed block; the yielded dict collects attributes set inside it."""
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.record(name, time.perf_counter() - start, **attributes)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of everything recorded since the last reset: counters, per-stage timings
+        (count, total, mean and max seconds) and the cache hit ratio.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {
+                name: {"count": count, "total": total, "mean": total / count if count else 0.0, "max": longest}
+                for name, (count, total, longest) in self._timings.items()
+            }
+        lookups = counters.get("cache.hit", 0) + counters.get("cache.miss", 0)
+        return {
+            "counters": counters,
+            "timings": timings,
+            "cache_hit_ratio": counters.get("cache.hit", 0) / lookups if lookups else None,
+        }
+
+    def add_hook(self, hook: Hook) -> Hook:
+        """Pass every measurement to hook(kind, name, value, attributes)."""
+        with self._lock:
+            self._hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook: Hook) -> None:
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def _emit(self, kind: str, name: str, value: float, attributes: dict) -> None:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s %s=%.6g %s", kind, name, value, attributes or "")
+        for hook in self._hooks:
+            try:
+                hook(kind, name, value, attributes)
+            except Exception:
+                # Instrumentation must never break a query
+                logger.exception("Metrics hook %r failed", hook)
+
+
+metrics = Metrics()
+
+count = metrics.count
+record = metrics.record
+span = metrics.span
+stats = metrics.stats
+reset = metrics.reset
+add_hook = metrics.add_hook
+remove_hook = metrics.remove_hook
+
+
+def _import_opentelemetry():
+    """Import the OpenTelemetry metrics API, which is only needed for enable_opentelemetry."""
+    try:
+        from opentelemetry import metrics as otel_metrics
+    except ImportError as e:
+        raise ImportError(
+            "enable_opentelemetry requires opentelemetry-api; install it with `pip install kkdatac[otel]`"
+        ) from e
+    return otel_metrics
+
+
+def enable_opentelemetry(meter_provider=None) -> Hook:
+    """
+    Export counters as OpenTelemetry counters and spans as histograms (in seconds), named
+    kkdatac.<name>, through meter_provider or the globally configured one.
+    Returns the hook, for remove_hook.
+    """
+    otel_metrics = _import_opentelemetry()
+    meter = (meter_provider or otel_metrics.get_meter_provider()).get_meter("kkdatac")
+    instruments = {}
+    lock = threading.Lock()
+
+    def export(kind: str, name: str, value: float, attributes: dict) -> None:
+        with lock:
+            instrument = instruments.get((kind, name))
+            if instrument is None:
+                if kind == "counter":
+                    instrument = meter.create_counter(f"kkdatac.{name}")
+                else:
+                    instrument = meter.create_histogram(f"kkdatac.{name}", unit="s")
+                instruments[(kind, name)] = instrument
+        attributes = {k: v for k, v in attributes.items() if isinstance(v, (str, bool, int, float))}
+        if kind == "counter":
+            instrument.add(value, attributes)
+        else:
+            instrument.record(value, attributes)
+
+    return add_hook(export)
@@ -0,0 +1,225 @@
+"""
+Incremental, append-only local mirror of price tables.
+
+Bars are stored per table and per symbol, partitioned by year (by month for minute
+tables), next to a state file remembering the last bar synced for each symbol. A sync
+only asks kkdatad for bars after that point, so keeping years of history current costs
+one small query per day instead of a full re-download. New symbols are seeded from
+start_date, and every sync is sharded by symbols and dates like get_price.
+"""
+import datetime
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+import pandas as pd
+from kkdatac.client import get_client
+from kkdatac.codec import concat_frames, find_frame, list_frames, read_frame, write_frame
+from kkdatac.config import (
+    MAX_CONCURRENCY,
+    MIRROR_DIR,
+    MIRROR_START_DATE,
+    MIRROR_SYNC_INTERVAL,
+    SHARD_DAYS,
+    SHARD_SIZE,
+)
+from kkdatac.utils.query_templates import Query, QueryTemplates, date_column as _date_column, date_literal
+from kkdatac.utils.sharding import chunk_list, split_date_range
+
+
+def _partition_format(table: str) -> str:
+    return '%Y%m' if table.startswith('mins') else '%Y'
+
+
+def _to_datetime(values) -> pd.Series:
+    return pd.to_datetime(pd.Series(values).astype(str))
+
+
+class PriceMirror:
+    def __init__(
+        self,
+        root: str = MIRROR_DIR,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        sync_interval: float = MIRROR_SYNC_INTERVAL,
+        start_date: str = MIRROR_START_DATE,
+        shard_size: int | None = SHARD_SIZE,
+        shard_days: int | None = SHARD_DAYS,
+        max_workers: int = MAX_CONCURRENCY,
+    ):
+        """
+        :param root: directory holding one sub-directory per mirrored table
+        :param api_key: API key used to fetch new bars
+        :param base_url: kkdatad endpoint used to fetch new bars
+        :param sync_interval: seconds after a symbol's last sync during which it is not re-synced
+        :param start_date: first date fetched for symbols never synced before
+        :param shard_size: symbols per sync query
+        :param shard_days: calendar days per sync query
+        :param max_workers: sync queries in flight at once
+        """
+        self.root = root
+        self.api_key = api_key
+        self.base_url = base_url
+        self.sync_interval = sync_interval
+        self.start_date = start_date
+        self.shard_size = shard_size
+        self.shard_days = shard_days
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+
+    def _state_path(self, table: str) -> str:
+        return os.path.join(self.root, table, '_state.json')
+
+    def _load_state(self, table: str) -> dict:
+        try:
+            with open(self._state_path(table), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_state(self, table: str, state: dict) -> None:
+        path = self._state_path(table)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
+
+    def last_synced(self, table: str, ts_code: str) -> str | None:
+        """Timestamp of the last bar held locally for a symbol"""
+        return self._load_state(table).get(ts_code, {}).get('last')
+
+    def _windows(self, table: str, last: str | None) -> list[tuple[str | None, str | None]]:
+        """
+        (after, until) bounds of the date shards of bars after last, or from start_date
+        when last is None; the newest shard is left open-ended.
+        """
+        if last is None:
+            first = pd.Timestamp(self.start_date)
+            after = date_literal(table, first - pd.Timedelta(days=1), end=True)
+        else:
+            first, after = pd.Timestamp(last).normalize(), date_literal(table, last)
+        ends = [end for _, end in split_date_range(first.strftime('%Y-%m-%d'),
+                                                   datetime.date.today().strftime('%Y-%m-%d'), self.shard_days)]
+        untils = [date_literal(table, end, end=True) for end in ends[:-1]]
+        return list(zip([after] + untils, untils + [None]))
+
+    def _sync_queries(self, table: str, codes: list[str], last: str | None) -> list[list[Query]]:
+        """Queries for the bars after last, one list of date shards per chunk of shard_size symbols"""
+        windows = self._windows(table, last)
+        return [
+            [QueryTemplates.price_after(table, chunk, after, until) for after, until in windows]
+            for chunk in chunk_list(codes, self.shard_size)
+        ]
+
+    def sync(self, table: str, ts_codes: list[str], force: bool = False) -> int:
+        """
+        Fetch the bars after each symbol's last synced bar and append them locally.
+        Symbols never seen before are fetched from start_date. Queries are sharded by
+        shard_size symbols and shard_days days and run max_workers at a time; one chunk
+        of symbols is held in memory at once. Returns the number of rows fetched.
+        """
+        date_column = _date_column(table)
+        client = get_client(api_key=self.api_key, base_url=self.base_url)
+        with self._lock:
+            state = self._load_state(table)
+            now = time.time()
+            # Symbols synced up to the same bar share one delta query
+            groups = defaultdict(list)
+            for code in dict.fromkeys(ts_codes):
+                entry = state.get(code)
+                if entry and not force and now - entry['synced_at'] < self.sync_interval:
+                    continue
+                groups[entry['last'] if entry else None].append(code)
+
+            fetched = 0
+            for last, codes in groups.items():
+                for queries in self._sync_queries(table, codes, last):
+                    delta = concat_frames(client.run_queries(queries, max_workers=self.max_workers, use_cache=False))
+                    fetched += len(delta)
+                    for code, rows in delta.groupby('ts_code', sort=False):
+                        self._append(table, code, rows)
+                        # Stored in the table's literal format, whatever type the server sent
+                        state[code] = {'last': date_literal(table, rows[date_column].max())}
+                for code in codes:
+                    state.setdefault(code, {'last': last})['synced_at'] = now
+            self._save_state(table, state)
+        return fetched
+
+    def _append(self, table: str, ts_code: str, rows: pd.DataFrame) -> None:
+        """Merge new bars into the symbol's partitions, rewriting only the partitions they touch"""
+        date_column = _date_column(table)
+        directory = os.path.join(self.root, table, ts_code)
+        os.makedirs(directory, exist_ok=True)
+        keys = _to_datetime(rows[date_column]).dt.strftime(_partition_format(table)).to_numpy()
+        for key, part in rows.groupby(keys, sort=False):
+            stem = os.path.join(directory, key)
+            path = find_frame(stem)
+            if path is not None:
+                part = pd.concat([read_frame(path), part], ignore_index=True)
+                part = part.drop_duplicates(subset=[date_column], keep='last')
+            write_frame(stem, part.sort_values(date_column).reset_index(drop=True))
+
+    def read(
+        self,
+        table: str,
+        ts_codes: list[str],
+        start_date: str | None = None,
+        end_date: str | None = None,
+        fields: list[str] | None = None,
+    ) -> pd.DataFrame:
+        """Read mirrored bars for symbols, loading only the partitions inside the date range"""
+        date_column = _date_column(table)
+        fmt = _partition_format(table)
+        start = pd.Timestamp(start_date) if start_date else None
+        end = pd.Timestamp(end_date) if end_date else None
+        frames = []
+        for code in dict.fromkeys(ts_codes):
+            directory = os.path.join(self.root, table, code)
+            if not os.path.isdir(directory):
+                continue
+            for key, path in list_frames(directory).items():
+                if (start is not None and key < start.strftime(fmt)) or (end is not None and key > end.strftime(fmt)):
+                    continue
+                frames.append(read_frame(path))
+        if not frames:
+            return pd.DataFrame(columns=['ts_code', date_column] + [f for f in fields or [] if f not in ('ts_code', date_column)])
+        df = pd.concat(frames, ignore_index=True)
+        if start is not None or end is not None:
+            dates = _to_datetime(df[date_column])
+            mask = pd.Series(True, index=df.index)
+            if start is not None:
+                mask &= dates >= start
+            if end is not None:
+                # A bare end date includes every bar on that day
+                mask &= dates < end + pd.Timedelta(days=1) if end == end.normalize() else dates <= end
+            df = df[mask.to_numpy()].reset_index(drop=True)
+        if fields:
+            df = df[['ts_code', date_column] + [f for f in fields if f not in ('ts_code', date_column)]]
+        return df
+
+    def get(
+        self,
+        table: str,
+        ts_codes: list[str],
+        start_date: str | None = None,
+        end_date: str | None = None,
+        fields: list[str] | None = None,
+    ) -> pd.DataFrame:
+        """Sync the symbols, then read them from the mirror"""
+        self.sync(table, ts_codes)
+        return self.read(table, ts_codes, start_date, end_date, fields)
+
+
+_mirrors: dict[tuple, PriceMirror] = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_mirror(root: str = MIRROR_DIR, api_key: str | None = None, base_url: str | None = None) -> PriceMirror:
+    """Return the shared mirror for (root, api_key, base_url), creating it on first use."""
+    key = (root, api_key, base_url)
+    with _mirrors_lock:
+        mirror = _mirrors.get(key)
+        if mirror is None:
+            mirror = _mirrors[key] = PriceMirror(root=root, api_key=api_key, base_url=base_url)
+    return mirror
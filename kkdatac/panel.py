@@ -0,0 +1,201 @@
+"""
+Columnar panel of multi-symbol data.
+
+A Panel keeps one contiguous (date x symbol) NumPy array per field, all sharing a sorted
+date index and a symbol index. Building one from a long DataFrame scatters each column
+into place through integer date and symbol codes, without pandas pivots, and slicing by a
+date range returns views of the same arrays.
+"""
+import numpy as np
+import pandas as pd
+
+SYMBOL_COLUMNS = ('ts_code', 'order_book_id', 'symbol', 'code')
+DATE_COLUMNS = ('trade_time', 'trade_date', 'datetime', 'date')
+
+
+def _find_column(columns, candidates: tuple[str, ...], kind: str) -> str:
+    for name in candidates:
+        if name in columns:
+            return name
+    raise ValueError(f"No {kind} column found, expected one of: {', '.join(candidates)}")
+
+
+def _symbol_codes(values) -> tuple[np.ndarray, pd.Index]:
+    """Integer codes and symbol index of a column, reusing categorical codes when present"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), pd.Index(values.cat.categories)
+    codes, uniques = pd.factorize(values)
+    return codes, pd.Index(uniques)
+
+
+def _date_codes(values) -> tuple[np.ndarray, np.ndarray]:
+    """Integer codes into the sorted distinct dates of a column, parsing each date once"""
+    codes, uniques = pd.factorize(values)
+    dates = pd.to_datetime(uniques).to_numpy()
+    order = np.argsort(dates, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return np.where(codes >= 0, rank[np.maximum(codes, 0)], -1), dates[order]
+
+
+class Panel:
+    def __init__(self, data: dict[str, np.ndarray], dates, symbols):
+        """
+        :param data: field name -> array of shape (len(dates), len(symbols))
+        :param dates: sorted datetime64 index of the first axis
+        :param symbols: symbol index of the second axis
+        """
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.symbols = pd.Index(symbols)
+        shape = (len(self.dates), len(self.symbols))
+        for name, values in data.items():
+            if values.shape != shape:
+                raise ValueError(f"Field {name} has shape {values.shape}, expected {shape}")
+        self.data = data
+
+    @classmethod
+    def from_long(
+        cls,
+        df: pd.DataFrame,
+        fields: list[str] | None = None,
+        date_col: str | None = None,
+        symbol_col: str | None = None,
+    ) -> 'Panel':
+        """
+        Build a panel from a long DataFrame with one row per (date, symbol).
+        The date and symbol columns are detected from common names when not given; fields
+        default to every other column. Numeric fields with missing cells become float with
+        NaN, other fields object arrays with None. Duplicate rows keep the last value.
+        """
+        date_col = date_col or _find_column(df.columns, DATE_COLUMNS, 'date')
+        symbol_col = symbol_col or _find_column(df.columns, SYMBOL_COLUMNS, 'symbol')
+        if fields is None:
+            fields = [c for c in df.columns if c not in (date_col, symbol_col)]
+        date_codes, dates = _date_codes(df[date_col])
+        symbol_codes, symbols = _symbol_codes(df[symbol_col])
+        valid = (date_codes >= 0) & (symbol_codes >= 0)
+        if not valid.all():
+            date_codes, symbol_codes = date_codes[valid], symbol_codes[valid]
+        shape = (len(dates), len(symbols))
+        flat = date_codes.astype(np.int64) * shape[1] + symbol_codes
+        filled = np.zeros(shape[0] * shape[1], dtype=bool)
+        filled[flat] = True
+        dense = bool(filled.all())
+
+        data = {}
+        for field in fields:
+            values = df[field].to_numpy()
+            if not valid.all():
+                values = values[valid]
+            if values.dtype.kind in 'fc' or (values.dtype.kind in 'iub' and dense):
+                array = np.full(shape, np.nan, dtype=values.dtype) if values.dtype.kind in 'fc' \
+                    else np.zeros(shape, dtype=values.dtype)
+            elif values.dtype.kind in 'iub':
+                array = np.full(shape, np.nan)
+            elif values.dtype.kind == 'M':
+                array = np.full(shape, np.datetime64('NaT'), dtype=values.dtype)
+            else:
+                array = np.full(shape, None, dtype=object)
+            array.reshape(-1)[flat] = values
+            data[field] = array
+        return cls(data, dates, symbols)
+
+    def to_long(self, date_col: str = 'trade_date', symbol_col: str = 'ts_code', dropna: bool = True) -> pd.DataFrame:
+        """
+        Long DataFrame sorted by symbol then date, with a categorical symbol column.
+        With dropna=True cells missing in every field are left out.
+        """
+        n_dates, n_symbols = len(self.dates), len(self.symbols)
+        # Symbol-major order, matching the ORDER BY ts_code, date of the query results
+        date_idx = np.tile(np.arange(n_dates), n_symbols)
+        symbol_idx = np.repeat(np.arange(n_symbols), n_dates)
+        columns = {name: values.T.reshape(-1) for name, values in self.data.items()}
+        if dropna and columns:
+            keep = np.zeros(n_dates * n_symbols, dtype=bool)
+            for values in columns.values():
+                keep |= pd.notna(values)
+            date_idx, symbol_idx = date_idx[keep], symbol_idx[keep]
+            columns = {name: values[keep] for name, values in columns.items()}
+        result = {
+            symbol_col: pd.Categorical.from_codes(symbol_idx, categories=self.symbols),
+            date_col: self.dates[date_idx],
+        }
+        result.update(columns)
+        return pd.DataFrame(result)
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self.data)
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        """(fields, dates, symbols)"""
+        return len(self.data), len(self.dates), len(self.symbols)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.data
+
+    def __getitem__(self, key):
+        """A field's (date x symbol) array, or a panel of the listed fields"""
+        if isinstance(key, str):
+            return self.data[key]
+        return Panel({name: self.data[name] for name in key}, self.dates, self.symbols)
+
+    def __repr__(self) -> str:
+        span = f", {pd.Timestamp(self.dates[0])} to {pd.Timestamp(self.dates[-1])}" if len(self.dates) else ""
+        return f"Panel({len(self.dates)} dates x {len(self.symbols)} symbols{span}, fields={self.fields})"
+
+    def append(self, other: 'Panel') -> 'Panel':
+        """
+        Panel with other's dates added after this one's, over the union of both symbol
+        indexes. Dates of this panel from other's first date on are replaced by other's.
+        """
+        keep = np.searchsorted(self.dates, other.dates[0], side='left') if len(other.dates) else len(self.dates)
+        symbols = self.symbols.append(other.symbols.difference(self.symbols, sort=False))
+        own, theirs = symbols.get_indexer(self.symbols), symbols.get_indexer(other.symbols)
+        data = {}
+        for name in dict.fromkeys(self.fields + other.fields):
+            parts = []
+            for panel, positions, rows in ((self, own, keep), (other, theirs, len(other.dates))):
+                values = panel.data.get(name)
+                dtype = values.dtype if values is not None and values.dtype.kind in 'fcOM' else float
+                fill = {'O': None, 'M': np.datetime64('NaT')}.get(np.dtype(dtype).kind, np.nan)
+                block = np.full((rows, len(symbols)), fill, dtype=dtype)
+                if values is not None:
+                    block[:, positions] = values[:rows]
+                parts.append(block)
+            data[name] = np.concatenate(parts)
+        return Panel(data, np.concatenate([self.dates[:keep], other.dates]), symbols)
+
+    def frame(self, field: str) -> pd.DataFrame:
+        """A field as a (date x symbol) DataFrame over the panel's array"""
+        return pd.DataFrame(self.data[field], index=pd.DatetimeIndex(self.dates), columns=self.symbols, copy=False)
+
+    def slice(
+        self,
+        start_date=None,
+        end_date=None,
+        symbols: list[str] | None = None,
+        fields: list[str] | None = None,
+    ) -> 'Panel':
+        """
+        Sub-panel of a date range (inclusive), symbols and fields. A date range alone
+        returns views of this panel's arrays; selecting symbols copies.
+        """
+        lo = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start_date)), side='left') if start_date else 0
+        hi = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end_date)), side='right') if end_date \
+            else len(self.dates)
+        names = self.fields if fields is None else fields
+        data = {name: self.data[name][lo:hi] for name in names}
+        symbol_index = self.symbols
+        if symbols is not None:
+            positions = self.symbols.get_indexer(symbols)
+            if (positions < 0).any():
+                missing = [s for s, p in zip(symbols, positions) if p < 0]
+                raise KeyError(f"Symbols not in panel: {', '.join(map(str, missing))}")
+            data = {name: values[:, positions] for name, values in data.items()}
+            symbol_index = self.symbols[positions]
+        return Panel(data, self.dates[lo:hi], symbol_index)
@@ -0,0 +1,98 @@
+"""
+Point-in-time fundamentals.
+
+Statements are aligned to a trading-day grid with a sorted as-of join: every statement
+becomes usable on the trading day after it was announced (f_ann_date, falling back to
+ann_date), and each (symbol, day) row takes the latest statement usable by then. The join
+is one binary search over a (symbol, grid position) key for all rows at once, so a whole
+universe is aligned without looping over dates or symbols in Python.
+
+Restatements of the period currently in force replace it from their announcement on;
+late restatements of older periods never roll a symbol back to an older period.
+"""
+import numpy as np
+import pandas as pd
+from kkdatac.adjust import _to_days
+
+STATEMENT_KEYS = ('ts_code', 'ann_date', 'f_ann_date', 'end_date')
+
+# Keys combine a symbol index with a position on the date grid
+_POSITION_BITS = 32
+
+
+def _announced_days(statements: pd.DataFrame) -> pd.Series:
+    """Announcement date of each statement: f_ann_date where known, else ann_date"""
+    return statements['f_ann_date'].where(statements['f_ann_date'].notna(), statements['ann_date'])
+
+
+def asof_join(
+    statements: pd.DataFrame,
+    ts_codes: list[str],
+    dates,
+    fields: list[str] | None = None,
+    lag: int = 1,
+) -> pd.DataFrame:
+    """
+    Align statements onto the grid of ts_codes x dates.
+
+    :param statements: rows with ts_code, ann_date and/or f_ann_date, end_date and the fields
+    :param ts_codes: symbols of the grid
+    :param dates: consecutive trading dates of the grid
+    :param fields: statement columns to carry, defaults to every non-key column
+    :param lag: trading days after the announcement date before a statement is used;
+        1 uses it from the next session, 0 from the announcement day itself
+    :return: one row per (ts_code, trade_date), sorted by ts_code then trade_date, with the
+        end_date, ann_date (original announcement) and f_ann_date (announcement of this
+        version) of the statement in force and its fields (missing before the first known
+        statement)
+    """
+    dates = np.unique(np.asarray(dates, dtype='datetime64[D]'))
+    codes = pd.Index(list(dict.fromkeys(ts_codes)))
+    if fields is None:
+        fields = [c for c in statements.columns if c not in STATEMENT_KEYS]
+    # Tables without one of the announcement dates, or an empty result, still join
+    statements = statements.reindex(columns=list(dict.fromkeys([*STATEMENT_KEYS, *statements.columns, *fields])))
+
+    announced = _announced_days(statements)
+    usable = statements['ts_code'].isin(codes) & announced.notna() & statements['end_date'].notna()
+    statements = statements.loc[usable]
+    announced = announced[usable]
+    stmt_symbols = codes.get_indexer(statements['ts_code']).astype(np.int64)
+    ann_days = _to_days(announced.to_numpy())
+    end_days = _to_days(statements['end_date'].to_numpy())
+
+    # First grid position at which each statement may be used
+    grid_days = dates.astype(np.int64)
+    if lag > 0:
+        positions = np.searchsorted(grid_days, ann_days, side='right') + lag - 1
+    else:
+        positions = np.searchsorted(grid_days, ann_days, side='left')
+
+    order = np.lexsort((end_days, positions, stmt_symbols))
+    stmt_symbols, positions, end_days = stmt_symbols[order], positions[order], end_days[order]
+    # Drop restatements of periods older than one already in force
+    latest_end = pd.Series(end_days).groupby(stmt_symbols).cummax().to_numpy()
+    current = end_days >= latest_end
+    order, stmt_symbols, positions = order[current], stmt_symbols[current], positions[current]
+    stmt_keys = (stmt_symbols << _POSITION_BITS) | positions
+
+    grid_symbols = np.repeat(np.arange(len(codes), dtype=np.int64), len(dates))
+    grid_positions = np.tile(np.arange(len(dates), dtype=np.int64), len(codes))
+    grid_keys = (grid_symbols << _POSITION_BITS) | grid_positions
+    idx = np.searchsorted(stmt_keys, grid_keys, side='right') - 1
+    found = idx >= 0
+    found[found] = stmt_symbols[idx[found]] == grid_symbols[found]
+    rows = np.full(len(grid_keys), -1, dtype=np.int64)
+    rows[found] = order[idx[found]]
+
+    result = {
+        'ts_code': pd.Categorical.from_codes(grid_symbols, categories=codes),
+        'trade_date': dates[grid_positions],
+        'end_date': pd.api.extensions.take(statements['end_date'].to_numpy(), rows, allow_fill=True),
+        'ann_date': pd.api.extensions.take(statements['ann_date'].to_numpy(), rows, allow_fill=True),
+        'f_ann_date': pd.api.extensions.take(statements['f_ann_date'].to_numpy(), rows, allow_fill=True),
+    }
+    for field in fields:
+        if field not in result:
+            result[field] = pd.api.extensions.take(statements[field].array, rows, allow_fill=True)
+    return pd.DataFrame(result)
@@ -0,0 +1,161 @@
+"""
+Local resampling of bars.
+
+Bars of any frequency are derived from the 1-minute or daily table. Minute bars are binned
+within trading sessions, so a bar never spans the lunch break or two days, and labelled
+with the end of their bin; daily bars are grouped into runs of n trading days, calendar
+weeks or months and labelled with their last trading date. Aggregation is vectorized
+across symbols: with rows ordered by (symbol, time), groups are the runs of equal
+(symbol, bin) keys and every column is reduced over them with one ufunc.reduceat call.
+"""
+import re
+import numpy as np
+import pandas as pd
+from kkdatac.config import TRADING_SESSIONS
+
+# Frequencies kkdatad serves from a table of their own
+NATIVE_TABLES = {
+    '1d': 'daily',
+    '1w': 'weekly',
+    '1m': 'monthly',
+    '1min': 'mins1',
+    '5min': 'mins5',
+    '15min': 'mins15',
+    '30min': 'mins30',
+    '60min': 'mins60'
+}
+# RiceQuant style: '5min', '2h', '1d', '2w', '1m' (months)
+_FREQUENCY_PATTERN = re.compile(r"^(\d*)\s*(min|h|d|w|m)$")
+
+_FIRST_COLUMNS = ('open', 'pre_close')
+_MAX_COLUMNS = ('high',)
+_MIN_COLUMNS = ('low',)
+_SUM_COLUMNS = ('vol', 'volume', 'amount', 'change')
+# Percent changes compound over the bars of a group
+_COMPOUND_COLUMNS = ('pct_chg',)
+_AGGREGATED_COLUMNS = _MAX_COLUMNS + _MIN_COLUMNS + _SUM_COLUMNS + _COMPOUND_COLUMNS
+
+
+def parse_frequency(frequency: str) -> tuple[int, str]:
+    """Split a frequency into a count and a unit: 'min', 'd', 'w' or 'm'"""
+    match = _FREQUENCY_PATTERN.match(frequency.strip().lower())
+    if match is None or match.group(1) in ('0', '00'):
+        raise ValueError(f"Unknown frequency: {frequency}")
+    n, unit = int(match.group(1) or 1), match.group(2)
+    if unit == 'h':
+        return n * 60, 'min'
+    return n, unit
+
+
+def base_table(frequency: str) -> str:
+    """Table a frequency is derived from: mins1 for intraday bars, daily otherwise"""
+    return 'mins1' if parse_frequency(frequency)[1] == 'min' else 'daily'
+
+
+def _session_minutes(sessions) -> tuple[np.ndarray, np.ndarray]:
+    def minute(hhmm: str) -> int:
+        hours, minutes = hhmm.split(':')
+        return int(hours) * 60 + int(minutes)
+    return np.array([minute(s) for s, _ in sessions]), np.array([minute(e) for _, e in sessions])
+
+
+def _minute_labels(times: np.ndarray, n: int, sessions) -> np.ndarray:
+    """End of the n-minute bin of each bar, counted from the open of the bar's session"""
+    times = times.astype('datetime64[m]')
+    days = times.astype('datetime64[D]')
+    minutes = (times - days).astype(np.int64)
+    if sessions:
+        starts, ends = _session_minutes(sessions)
+        # Bars before the first open (call auction) join the first bin of the session
+        session = np.clip(np.searchsorted(starts, minutes, side='right') - 1, 0, len(starts) - 1)
+        start, end = starts[session], ends[session]
+    else:
+        start, end = 0, 24 * 60
+    bins = np.maximum(-(-(minutes - start) // n), 1)
+    return days + np.minimum(start + bins * n, end).astype('timedelta64[m]')
+
+
+def _day_keys(times: np.ndarray, n: int, unit: str) -> np.ndarray:
+    """Group key of each daily bar: runs of n trading days, n weeks (Monday first) or n months"""
+    days = times.astype('datetime64[D]')
+    if unit == 'd':
+        # Trading days are the distinct dates present in the data
+        return np.unique(days, return_inverse=True)[1].reshape(-1) // n
+    if unit == 'w':
+        # 1970-01-01 was a Thursday: shift so that weeks start on Monday
+        return (days.astype(np.int64) + 3) // 7 // n
+    return days.astype('datetime64[M]').astype(np.int64) // n
+
+
+def _parse_times(values: pd.Series) -> np.ndarray:
+    """datetime64 values of a date column, parsing each distinct value once"""
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(pd.Index(uniques).astype(str)).to_numpy()
+    return parsed[codes]
+
+
+def resample_bars(
+    df: pd.DataFrame,
+    frequency: str,
+    date_col: str | None = None,
+    symbol_col: str = 'ts_code',
+    market: str = 'cn',
+) -> pd.DataFrame:
+    """
+    Aggregate 1-minute or daily bars into bars of frequency: open and pre_close first,
+    high max, low min, volume, amount and change summed, pct_chg compounded and other
+    columns last. Missing values are skipped.
+    """
+    n, unit = parse_frequency(frequency)
+    date_col = date_col or ('trade_time' if unit == 'min' else 'trade_date')
+    if df.empty:
+        return df
+    times = _parse_times(df[date_col])
+    symbols = pd.factorize(df[symbol_col])[0]
+    order = None
+    step_symbols, step_times = np.diff(symbols), np.diff(times)
+    if not np.all((step_symbols > 0) | ((step_symbols == 0) & (step_times >= np.timedelta64(0)))):
+        order = np.lexsort((times, symbols))
+        times, symbols = times[order], symbols[order]
+
+    if unit == 'min':
+        labels = _minute_labels(times, n, TRADING_SESSIONS.get(market))
+        keys = labels.astype(np.int64)
+    else:
+        labels = None
+        keys = _day_keys(times, n, unit)
+    boundary = np.empty(len(keys), dtype=bool)
+    boundary[0] = True
+    boundary[1:] = (symbols[1:] != symbols[:-1]) | (keys[1:] != keys[:-1])
+    starts = np.flatnonzero(boundary)
+    lasts = np.append(starts[1:], len(keys)) - 1
+
+    first_rows = starts if order is None else order[starts]
+    last_rows = lasts if order is None else order[lasts]
+    result = {}
+    for column in df.columns:
+        series = df[column]
+        numeric = series.dtype.kind in 'fiu'
+        if column == date_col and labels is not None:
+            label_index = pd.DatetimeIndex(labels[starts])
+            result[column] = label_index.to_numpy() if series.dtype.kind == 'M' \
+                else label_index.strftime('%Y-%m-%d %H:%M:%S')
+            continue
+        if not numeric or column not in _AGGREGATED_COLUMNS:
+            # Text columns are only taken at group ends, never converted whole
+            rows = first_rows if column in _FIRST_COLUMNS or column == symbol_col else last_rows
+            result[column] = series.take(rows).reset_index(drop=True)
+            continue
+        values = series.to_numpy()
+        if order is not None:
+            values = values[order]
+        if column in _MAX_COLUMNS:
+            result[column] = np.fmax.reduceat(values.astype(float), starts)
+        elif column in _MIN_COLUMNS:
+            result[column] = np.fmin.reduceat(values.astype(float), starts)
+        elif column in _SUM_COLUMNS:
+            result[column] = np.add.reduceat(np.nan_to_num(values) if values.dtype.kind == 'f' else values, starts)
+        else:
+            growth = np.multiply.reduceat(1 + np.nan_to_num(values.astype(float)) / 100, starts)
+            result[column] = (growth - 1) * 100
+    return pd.DataFrame(result, columns=df.columns)
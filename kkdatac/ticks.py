@@ -0,0 +1,229 @@
+"""
+Live level-1 snapshots.
+
+A TickStream long-polls kkdatad for the snapshots of a set of symbols (each request is
+held by the server until new snapshots arrive) on a background thread, and writes every
+batch into a TickRingBuffer: one preallocated (symbol x capacity) array per field, so
+steady-state streaming allocates nothing per tick and the last `capacity` snapshots of
+each symbol are always at hand. Batches are also handed to callbacks and to async
+iterators; snapshot() turns the buffer into a DataFrame on demand.
+"""
+import asyncio
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from kkdatac.client import get_client
+from kkdatac.config import TICK_BUFFER_SIZE, TICK_POLL_TIMEOUT, TICK_RETRY_DELAY
+
+logger = logging.getLogger("kkdatac")
+
+TICK_CHANNELS = ('tick', 'auction')
+TICK_FIELDS = (
+    ('open', 'last', 'high', 'low', 'prev_close', 'limit_up', 'limit_down', 'volume', 'total_turnover')
+    + tuple(f"{side}{level}" for side in ('a', 'b') for level in range(1, 6))
+    + tuple(f"{side}{level}_v" for side in ('a', 'b') for level in range(1, 6))
+)
+
+
+class TickRingBuffer:
+    def __init__(self, symbols: list[str], capacity: int = TICK_BUFFER_SIZE, fields: tuple[str, ...] = TICK_FIELDS):
+        """
+        :param symbols: symbols the buffer holds snapshots of
+        :param capacity: snapshots kept per symbol; older ones are overwritten
+        :param fields: numeric snapshot fields to keep
+        """
+        self.symbols = pd.Index(symbols)
+        self.capacity = capacity
+        self.fields = fields
+        shape = (len(self.symbols), capacity)
+        self.times = np.full(shape, np.datetime64('NaT'), dtype='datetime64[ns]')
+        self.data = {field: np.full(shape, np.nan) for field in fields}
+        # Snapshots ever written per symbol; the next one goes to slot count % capacity
+        self.counts = np.zeros(len(self.symbols), dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return int(np.minimum(self.counts, self.capacity).sum())
+
+    def write(self, ticks: pd.DataFrame, symbol_col: str = 'order_book_id', time_col: str = 'datetime') -> int:
+        """Write a batch of snapshots (any order of symbols); returns the number written"""
+        rows = self.symbols.get_indexer(ticks[symbol_col])
+        keep = rows >= 0
+        if not keep.any():
+            return 0
+        rows = rows[keep]
+        # Slot of each snapshot: its symbol's count plus its rank among the batch's snapshots of that symbol
+        order = np.argsort(rows, kind='stable')
+        sorted_rows = rows[order]
+        group_start = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+        rank = np.arange(len(rows)) - np.repeat(group_start, np.diff(np.r_[group_start, len(rows)]))
+        times = pd.to_datetime(ticks[time_col]).to_numpy(dtype='datetime64[ns]')[keep][order]
+        with self._lock:
+            slots = (self.counts[sorted_rows] + rank) % self.capacity
+            self.times[sorted_rows, slots] = times
+            for field in self.fields:
+                if field in ticks.columns:
+                    values = ticks[field].to_numpy(dtype=float, na_value=np.nan)[keep][order]
+                    self.data[field][sorted_rows, slots] = values
+                else:
+                    self.data[field][sorted_rows, slots] = np.nan
+            self.counts += np.bincount(sorted_rows, minlength=len(self.symbols))
+        return len(rows)
+
+    def _positions(self, last_n: int | None) -> tuple[np.ndarray, np.ndarray]:
+        """(row, slot) of the held snapshots, oldest first within each symbol"""
+        held = np.minimum(self.counts, self.capacity if last_n is None else min(last_n, self.capacity))
+        rows = np.repeat(np.arange(len(self.symbols)), held)
+        # Position counted back from the newest snapshot of the row
+        back = np.arange(held.sum()) - np.repeat(np.cumsum(held) - held, held)
+        slots = (np.repeat(self.counts - held, held) + back) % self.capacity
+        return rows, slots
+
+    def to_frame(self, last_n: int | None = None) -> pd.DataFrame:
+        """Held snapshots as a DataFrame sorted by symbol, then time (the last_n newest per symbol)"""
+        with self._lock:
+            rows, slots = self._positions(last_n)
+            result = {
+                'order_book_id': pd.Categorical.from_codes(rows, categories=self.symbols),
+                'datetime': self.times[rows, slots],
+            }
+            result.update({field: values[rows, slots] for field, values in self.data.items()})
+        return pd.DataFrame(result)
+
+    def latest(self) -> pd.DataFrame:
+        """The newest snapshot of each symbol that has one"""
+        return self.to_frame(last_n=1)
+
+
+class TickStream:
+    def __init__(
+        self,
+        order_book_ids: str | list[str],
+        channel: str = 'tick',
+        capacity: int = TICK_BUFFER_SIZE,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        poll_timeout: float = TICK_POLL_TIMEOUT,
+    ):
+        """
+        :param order_book_ids: symbols to subscribe to
+        :param channel: 'tick' for continuous trading, 'auction' for the opening call auction
+        :param capacity: snapshots kept per symbol in the ring buffer
+        :param poll_timeout: seconds the server may hold each long-poll request
+        """
+        if channel not in TICK_CHANNELS:
+            raise ValueError(f"Unknown tick channel: {channel}")
+        self.order_book_ids = [order_book_ids] if isinstance(order_book_ids, str) else list(order_book_ids)
+        self.channel = channel
+        self.buffer = TickRingBuffer(self.order_book_ids, capacity)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.poll_timeout = poll_timeout
+        self.cursor = None
+        self.error = None
+        self._callbacks = []
+        self._queues = []
+        self._queues_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def on_tick(self, callback):
+        """
+        Call callback(batch) with each batch of snapshots, on the polling thread. Usable as
+        a decorator. Exceptions it raises are logged and kept in `error`; polling goes on.
+        """
+        self._callbacks.append(callback)
+        return callback
+
+    def start(self) -> 'TickStream':
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='kkdatac-ticks', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stop polling; pending async iterators finish."""
+        self._stop.set()
+        self._publish(None)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def __enter__(self) -> 'TickStream':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        client = get_client(api_key=self.api_key, base_url=self.base_url)
+        while not self._stop.is_set():
+            try:
+                self.cursor, batch = client.poll_ticks(self.order_book_ids, self.channel, self.cursor, self.poll_timeout)
+            except Exception as e:
+                # The session already retries server errors; keep the stream alive through outages
+                self.error = e
+                self._stop.wait(TICK_RETRY_DELAY)
+                continue
+            self.error = None
+            if batch is None or batch.empty or self._stop.is_set():
+                continue
+            self.buffer.write(batch)
+            for callback in self._callbacks:
+                try:
+                    callback(batch)
+                except Exception as e:
+                    # A failing callback must not stop the stream or starve the other consumers
+                    logger.exception("Tick callback %r failed", callback)
+                    self.error = e
+            self._publish(batch)
+
+    def _publish(self, batch) -> None:
+        with self._queues_lock:
+            queues = list(self._queues)
+        for loop, queue in queues:
+            loop.call_soon_threadsafe(queue.put_nowait, batch)
+
+    async def __aiter__(self):
+        """Async iteration over batches of snapshots as they arrive, starting the stream if needed"""
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._queues_lock:
+            self._queues.append(entry)
+        self.start()
+        try:
+            while True:
+                batch = await entry[1].get()
+                if batch is None:
+                    return
+                yield batch
+        finally:
+            with self._queues_lock:
+                self._queues.remove(entry)
+
+    def snapshot(self, last_n: int | None = None) -> pd.DataFrame:
+        """Buffered snapshots as a DataFrame, the last_n newest per symbol"""
+        return self.buffer.to_frame(last_n)
+
+    def latest(self) -> pd.DataFrame:
+        """The newest snapshot of each symbol"""
+        return self.buffer.latest()
+
+
+def subscribe_ticks(
+    order_book_ids: str | list[str],
+    callback=None,
+    channel: str = 'tick',
+    capacity: int = TICK_BUFFER_SIZE,
+    api_key: str | None = None,
+    base_url: str | None = None,
+) -> TickStream:
+    """Start streaming level-1 snapshots of symbols; stop() the returned stream when done."""
+    stream = TickStream(order_book_ids, channel, capacity, api_key=api_key, base_url=base_url)
+    if callback is not None:
+        stream.on_tick(callback)
+    return stream.start()
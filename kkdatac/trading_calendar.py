@@ -0,0 +1,155 @@
+"""
+In-process trading calendars.
+
+A calendar is a sorted, de-duplicated numpy datetime64[D] array; every lookup is a
+binary search (np.searchsorted), so previous/next/latest trading dates cost O(log n)
+and whole arrays of dates are offset in one vectorized call. Calendars are loaded from
+kkdatad once, kept on disk under CALENDAR_DIR and refreshed after CALENDAR_TTL.
+"""
+import datetime
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from kkdatac.client import get_client
+from kkdatac.config import CALENDAR_DIR, CALENDAR_TTL
+
+# Queries tried in order; the trading calendar table also knows future sessions
+_CALENDAR_QUERIES = {
+    "cn": [
+        "SELECT cal_date AS trade_date FROM trade_cal WHERE exchange = 'SSE' AND is_open = 1 ORDER BY cal_date",
+        "SELECT DISTINCT trade_date FROM daily ORDER BY trade_date",
+    ],
+}
+# Markets that trade every calendar day
+_CONTINUOUS_MARKETS = ("okx", "binance", "crypto")
+_CONTINUOUS_START = np.datetime64("2010-01-01", "D")
+
+
+def _as_days(dates) -> np.ndarray | np.datetime64:
+    """Convert a date or array of dates to datetime64[D], keeping scalars scalar."""
+    if isinstance(dates, (str, datetime.date, np.datetime64, pd.Timestamp)):
+        return np.datetime64(pd.Timestamp(dates), "D")
+    return pd.to_datetime(np.asarray(dates)).to_numpy().astype("datetime64[D]")
+
+
+class TradingCalendar:
+    def __init__(self, dates, market: str = "cn"):
+        """
+        :param dates: trading dates in any order, as strings, dates or datetime64
+        :param market: market the calendar belongs to
+        """
+        self.market = market
+        self.dates = np.unique(_as_days(np.asarray(dates)))
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def _take(self, idx):
+        """Dates at the given positions; positions outside the calendar give NaT (or raise for scalars)."""
+        valid = (idx >= 0) & (idx < len(self.dates))
+        if np.ndim(idx) == 0:
+            if not valid:
+                raise ValueError(f"Date is outside the {self.market} trading calendar "
+                                 f"({self.dates[0]} to {self.dates[-1]})")
+            return self.dates[idx]
+        result = np.full(np.shape(idx), np.datetime64("NaT"), dtype="datetime64[D]")
+        result[valid] = self.dates[idx[valid]]
+        return result
+
+    def is_trading_date(self, dates):
+        """Whether each date is a trading date"""
+        days = _as_days(dates)
+        idx = np.searchsorted(self.dates, days)
+        return (idx < len(self.dates)) & (self.dates[np.minimum(idx, len(self.dates) - 1)] == days)
+
+    def previous(self, dates, n: int = 1):
+        """The n-th trading date strictly before each date"""
+        return self._take(np.searchsorted(self.dates, _as_days(dates), side="left") - n)
+
+    def next(self, dates, n: int = 1):
+        """The n-th trading date strictly after each date"""
+        return self._take(np.searchsorted(self.dates, _as_days(dates), side="right") + n - 1)
+
+    def latest(self, dates=None):
+        """The last trading date on or before each date (today by default)"""
+        days = _as_days(datetime.date.today() if dates is None else dates)
+        return self._take(np.searchsorted(self.dates, days, side="right") - 1)
+
+    def offset(self, dates, n: int):
+        """
+        Shift each date by n trading days: n > 0 moves forward, n < 0 backward and n == 0
+        rolls non-trading dates back to the previous trading date.
+        """
+        if n > 0:
+            return self.next(dates, n)
+        if n < 0:
+            return self.previous(dates, -n)
+        return self.latest(dates)
+
+    def between(self, start_date, end_date) -> np.ndarray:
+        """Trading dates in [start_date, end_date]"""
+        lo = np.searchsorted(self.dates, _as_days(start_date), side="left")
+        hi = np.searchsorted(self.dates, _as_days(end_date), side="right")
+        return self.dates[lo:hi]
+
+
+def to_date_str(dates):
+    """Format datetime64 days as 'YYYY-MM-DD', a string for scalars and a list for arrays"""
+    if np.ndim(dates) == 0:
+        return str(dates)
+    return [None if np.isnat(d) else str(d) for d in dates]
+
+
+def _continuous_calendar(market: str) -> TradingCalendar:
+    end = np.datetime64(datetime.date.today(), "D") + 366
+    return TradingCalendar(np.arange(_CONTINUOUS_START, end, dtype="datetime64[D]"), market)
+
+
+def _load_from_server(market: str) -> np.ndarray:
+    queries = _CALENDAR_QUERIES.get(market)
+    if queries is None:
+        raise ValueError(f"Unsupported market: {market}")
+    error = None
+    for query in queries:
+        try:
+            df = get_client().run_query(query, use_cache=False)
+        except Exception as e:
+            error = e
+            continue
+        if len(df):
+            return _as_days(df.iloc[:, 0].astype(str).to_numpy())
+    raise Exception(f"Failed to load the {market} trading calendar: {error}")
+
+
+_calendars: dict[str, tuple[float, TradingCalendar]] = {}
+_calendars_lock = threading.Lock()
+
+
+def get_trading_calendar(market: str = "cn", refresh: bool = False) -> TradingCalendar:
+    """
+    Return the trading calendar of a market, loading it at most once per CALENDAR_TTL:
+    from memory, then from the copy on disk, then from the server. Calendars of markets
+    trading every day are generated instead, and kept in memory the same way.
+    """
+    now = time.time()
+    with _calendars_lock:
+        loaded = _calendars.get(market)
+        if loaded is not None and not refresh and now - loaded[0] < CALENDAR_TTL:
+            return loaded[1]
+        if market in _CONTINUOUS_MARKETS:
+            calendar = _continuous_calendar(market)
+            _calendars[market] = (now, calendar)
+            return calendar
+        path = os.path.join(CALENDAR_DIR, f"{market}.npy")
+        if not refresh and os.path.exists(path) and now - os.path.getmtime(path) < CALENDAR_TTL:
+            loaded_at, dates = os.path.getmtime(path), np.load(path)
+        else:
+            loaded_at, dates = now, _load_from_server(market)
+            os.makedirs(CALENDAR_DIR, exist_ok=True)
+            np.save(path + ".tmp.npy", dates)
+            os.replace(path + ".tmp.npy", path)
+        calendar = TradingCalendar(dates, market)
+        _calendars[market] = (loaded_at, calendar)
+        return calendar
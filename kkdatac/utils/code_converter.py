@@ -1,4 +1,7 @@
-from typing import Dict, Union, List
+from functools import lru_cache
+from typing import Union, List
+import numpy as np
+import pandas as pd
 
 class CodeConverter:
     """Convert between different stock code formats:
@@ -6,7 +9,7 @@ class CodeConverter:
     - KakiQuant/Tushare: 000001.SZ, 600000.SH
     - GoldMiner: SZSE.000001, SSE.600000
     """
-    
+
     # Mapping between exchange codes
     EXCHANGE_MAPPING = {
         # RiceQuant to KakiQuant
@@ -16,74 +19,96 @@ class CodeConverter:
         'SZSE': 'SZ',
         'SSE': 'SH',
     }
-    
+
     # Reverse mapping
     REVERSE_MAPPING = {v: k for k, v in EXCHANGE_MAPPING.items()}
-    
+
+    # KakiQuant exchange to each external format
+    RQ_MAPPING = {'SZ': 'XSHE', 'SH': 'XSHG'}
+    GM_MAPPING = {'SZ': 'SZSE', 'SH': 'SSE'}
+
+    @classmethod
+    def _parse(cls, code: str) -> tuple[str, str] | None:
+        """Split a code in any known format into (number, KakiQuant exchange)"""
+        left, _, right = code.partition('.')
+        # RiceQuant format (000001.XSHE)
+        if right in ('XSHE', 'XSHG'):
+            return left, cls.EXCHANGE_MAPPING[right]
+        # GoldMiner format (SZSE.000001)
+        if left in ('SZSE', 'SSE'):
+            return right, cls.EXCHANGE_MAPPING[left]
+        # Internal format (000001.SZ)
+        if right in cls.RQ_MAPPING:
+            return left, right
+        return None
+
     @classmethod
     def to_internal(cls, code: str) -> str:
         """Convert external code to internal format (KakiQuant)"""
-        # Handle RiceQuant format (000001.XSHE)
-        if any(ex in code for ex in ['XSHE', 'XSHG']):
-            number, exchange = code.split('.')
-            return f"{number}.{cls.EXCHANGE_MAPPING[exchange]}"
-            
-        # Handle GoldMiner format (SZSE.000001)
-        if any(ex in code for ex in ['SZSE', 'SSE']):
-            exchange, number = code.split('.')
-            return f"{number}.{cls.EXCHANGE_MAPPING[exchange]}"
-            
-        # Already in internal format
-        return code
+        parsed = cls._parse(code)
+        if parsed is None:
+            # Already in internal format, or not a stock code
+            return code
+        number, exchange = parsed
+        return f"{number}.{exchange}"
 
     @classmethod
     def to_rq(cls, code: str) -> str:
         """Convert to RiceQuant format"""
-        # Already in RQ format
-        if any(ex in code for ex in ['XSHE', 'XSHG']):
+        parsed = cls._parse(code)
+        if parsed is None:
             return code
-            
-        # From internal format
-        if any(ex in code for ex in ['SZ', 'SH']):
-            number, exchange = code.split('.')
-            return f"{number}.{cls.REVERSE_MAPPING[exchange]}"
-            
-        # From GoldMiner format
-        if any(ex in code for ex in ['SZSE', 'SSE']):
-            exchange, number = code.split('.')
-            rq_exchange = cls.REVERSE_MAPPING[cls.EXCHANGE_MAPPING[exchange]]
-            return f"{number}.{rq_exchange}"
+        number, exchange = parsed
+        return f"{number}.{cls.RQ_MAPPING[exchange]}"
 
     @classmethod
     def to_gm(cls, code: str) -> str:
         """Convert to GoldMiner format"""
-        # Already in GM format
-        if any(ex in code for ex in ['SZSE', 'SSE']):
+        parsed = cls._parse(code)
+        if parsed is None:
             return code
-            
-        # From internal format
-        if any(ex in code for ex in ['SZ', 'SH']):
-            number, exchange = code.split('.')
-            gm_exchange = 'SZSE' if exchange == 'SZ' else 'SSE'
-            return f"{gm_exchange}.{number}"
-            
-        # From RiceQuant format
-        if any(ex in code for ex in ['XSHE', 'XSHG']):
-            number, exchange = code.split('.')
-            gm_exchange = 'SZSE' if exchange == 'XSHE' else 'SSE'
-            return f"{gm_exchange}.{number}"
+        number, exchange = parsed
+        return f"{cls.GM_MAPPING[exchange]}.{number}"
 
     @classmethod
     def convert_codes(cls, codes: Union[str, List[str]], to_format: str = 'internal') -> Union[str, List[str]]:
         """Convert a list of codes to specified format"""
         if isinstance(codes, str):
-            if to_format == 'internal':
-                return cls.to_internal(codes)
-            elif to_format == 'rq':
-                return cls.to_rq(codes)
-            elif to_format == 'gm':
-                return cls.to_gm(codes)
-            else:
-                raise ValueError(f"Unknown format: {to_format}")
-                
-        return [cls.convert_codes(code, to_format) for code in codes] 
\ No newline at end of file
+            return _convert_code(codes, to_format)
+        if isinstance(codes, pd.Series):
+            return cls.convert_series(codes, to_format)
+        # Each distinct code is converted once
+        converted = {code: _convert_code(code, to_format) for code in set(codes)}
+        return [converted[code] for code in codes]
+
+    @classmethod
+    def convert_series(
+        cls,
+        codes: pd.Series | pd.Index | pd.Categorical | np.ndarray | List[str],
+        to_format: str = 'internal'
+    ) -> pd.Series:
+        """
+        Convert a whole column of codes and return it as a categorical Series.
+        Only the distinct codes are converted (and memoized across calls); rows are
+        remapped through their integer category codes.
+        """
+        index = codes.index if isinstance(codes, pd.Series) else None
+        categorical = pd.Categorical(codes)
+        converted = [_convert_code(code, to_format) for code in categorical.categories]
+        # Different spellings of one code collapse into a single category
+        remap, categories = pd.factorize(pd.Index(converted, dtype=object))
+        row_codes = categorical.codes
+        new_codes = np.where(row_codes >= 0, remap[row_codes], -1) if len(remap) else row_codes
+        return pd.Series(pd.Categorical.from_codes(new_codes, categories=categories), index=index)
+
+
+@lru_cache(maxsize=1 << 16)
+def _convert_code(code: str, to_format: str) -> str:
+    if to_format == 'internal':
+        return CodeConverter.to_internal(code)
+    elif to_format == 'rq':
+        return CodeConverter.to_rq(code)
+    elif to_format == 'gm':
+        return CodeConverter.to_gm(code)
+    else:
+        raise ValueError(f"Unknown format: {to_format}")
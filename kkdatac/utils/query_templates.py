@@ -1,40 +1,322 @@
+"""
+Parameterized SQL templates.
+
+A template is SQL text with named placeholders (``:name``) for values; identifiers such
+as table and column names are part of the text, so a template describes a query shape.
+Templates are compiled once per shape (whitespace-canonicalized and split around their
+placeholders) and bound to parameters to give a Query. Values are rendered as quoted
+literals, with IN-lists deduplicated and sorted, so identical shapes and values always
+produce byte-identical SQL, and the query cache keys on (template, params).
+"""
+import datetime
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# String literals are skipped so that e.g. '09:30:00' is not taken for a placeholder
+_TOKEN_PATTERN = re.compile(r"'(?:[^']|'')*'|(?<!:):([A-Za-z_]\w*)")
+_WHITESPACE_PATTERN = re.compile(r"'(?:[^']|'')*'|\s+")
+
+
+def canonical_sql(text: str) -> str:
+    """Collapse whitespace outside string literals and drop a trailing semicolon."""
+    text = _WHITESPACE_PATTERN.sub(lambda m: " " if m.group().isspace() else m.group(), text)
+    return text.strip().rstrip(";").strip()
+
+
+def sql_literal(value) -> str:
+    """Render a parameter value as a SQL literal; sequences become a comma-separated list."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, (bool, np.bool_)):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return repr(value.item() if isinstance(value, np.generic) else value)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, (datetime.date, np.datetime64)):
+        return sql_literal(pd.Timestamp(value).strftime('%Y%m%d'))
+    if isinstance(value, tuple):
+        return ', '.join(sql_literal(v) for v in value)
+    raise TypeError(f"Unsupported query parameter: {value!r}")
+
+
+def _canonical_param(value):
+    """Hashable canonical form of a value: sequences become a sorted tuple of distinct items"""
+    if isinstance(value, (list, tuple, set, frozenset, np.ndarray, pd.Index, pd.Series)):
+        items = dict.fromkeys(v.item() if isinstance(v, np.generic) else v for v in value)
+        return tuple(sorted(items, key=lambda v: (type(v).__name__, v)))
+    return value
+
+
+class CompiledTemplate:
+    """A query shape: canonical text split into literal parts and placeholder names"""
+    __slots__ = ('text', 'names', '_parts')
+
+    def __init__(self, text: str):
+        self.text = canonical_sql(text)
+        self._parts = []
+        position = 0
+        for match in _TOKEN_PATTERN.finditer(self.text):
+            if match.group(1) is None:
+                continue
+            self._parts.append(self.text[position:match.start()])
+            self._parts.append(match.group(1))
+            position = match.end()
+        self._parts.append(self.text[position:])
+        self.names = frozenset(self._parts[1::2])
+
+    def bind(self, **params) -> 'Query':
+        """Bind values to every placeholder of the template."""
+        missing = self.names.difference(params)
+        if missing:
+            raise ValueError(f"Missing query parameters: {', '.join(sorted(missing))}")
+        unknown = set(params).difference(self.names)
+        if unknown:
+            raise ValueError(f"Unknown query parameters: {', '.join(sorted(unknown))}")
+        return Query(self, {name: _canonical_param(value) for name, value in params.items()})
+
+    def render(self, params: dict) -> str:
+        parts = self._parts
+        rendered = [parts[0]]
+        for i in range(1, len(parts), 2):
+            rendered.append(sql_literal(params[parts[i]]))
+            rendered.append(parts[i + 1])
+        return "".join(rendered)
+
+    def __repr__(self) -> str:
+        return f"CompiledTemplate({self.text!r})"
+
+
+@lru_cache(maxsize=1024)
+def compile_template(text: str) -> CompiledTemplate:
+    """Compile a template, reusing the compiled form for a text seen before."""
+    return CompiledTemplate(text)
+
+
+class Query:
+    """A compiled template bound to its parameters; str() gives the SQL sent to the server"""
+    __slots__ = ('template', 'params', '_sql')
+
+    def __init__(self, template: CompiledTemplate, params: dict):
+        self.template = template
+        self.params = params
+        self._sql = None
+
+    @property
+    def sql(self) -> str:
+        if self._sql is None:
+            self._sql = self.template.render(self.params)
+        return self._sql
+
+    def cache_key(self) -> str:
+        """Shape plus canonical parameters, independent of how the values were ordered."""
+        return f"{self.template.text}\n{sorted(self.params.items())!r}"
+
+    def __str__(self) -> str:
+        return self.sql
+
+    def __repr__(self) -> str:
+        return f"Query({self.template.text!r}, {self.params!r})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Query) and self.cache_key() == other.cache_key()
+
+    def __hash__(self) -> int:
+        return hash(self.cache_key())
+
+
+def bind_params(sql_query: str | Query, params: dict | None = None) -> str | Query:
+    """Compile a template string and bind params to it; without params the query is returned as is."""
+    if params is None:
+        return sql_query
+    return compile_template(query_text(sql_query)).bind(**params)
+
+
+def query_text(sql_query: str | Query) -> str:
+    """SQL text of a plain string or a bound Query"""
+    return sql_query.sql if isinstance(sql_query, Query) else sql_query
+
+
+def _format_security_list(securities: str | list[str]) -> str:
+    """Format security list for SQL query"""
+    return sql_literal(_canonical_param([securities] if isinstance(securities, str) else securities))
+
+
+def _as_list(ts_codes: str | list[str]) -> list[str]:
+    return [ts_codes] if isinstance(ts_codes, str) else ts_codes
+
+
+def date_column(table: str) -> str:
+    """Timestamp column of a price table"""
+    return 'trade_time' if table.startswith('mins') else 'trade_date'
+
+
+def date_literal(table: str, date, end: bool = False) -> str:
+    """
+    Format a date for comparison against a price table's timestamp column:
+    'YYYYMMDD' for trade_date, 'YYYY-MM-DD HH:MM:SS' for trade_time, where a bare
+    end date covers the whole day.
+    """
+    ts = pd.Timestamp(date)
+    if date_column(table) == 'trade_date':
+        return ts.strftime('%Y%m%d')
+    if end and ts == ts.normalize():
+        ts += pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+    return ts.strftime('%Y-%m-%d %H:%M:%S')
+
+
 class QueryTemplates:
     @staticmethod
-    def daily_price(ts_codes: str | list[str], start_date: str | None = None, end_date: str | None = None) -> str:
-        ts_codes_str = _format_security_list(ts_codes)
-        query = f"""
+    def price(
+        table: str,
+        ts_codes: str | list[str],
+        fields: list[str] | None = None,
+        start_date: str | None = None,
+        end_date: str | None = None,
+        skip_suspended: bool = False,
+    ) -> Query:
+        """Bars of a price table with the date range, projection and suspension filter pushed down"""
+        date_col = date_column(table)
+        columns = list(dict.fromkeys(['ts_code', date_col] + fields)) if fields else ['*']
+        query = f"SELECT {', '.join(columns)} FROM {table} WHERE ts_code IN (:ts_codes)"
+        params = {'ts_codes': _as_list(ts_codes)}
+        if start_date:
+            query += f" AND {date_col} >= :start_date"
+            params['start_date'] = date_literal(table, start_date)
+        if end_date:
+            query += f" AND {date_col} <= :end_date"
+            params['end_date'] = date_literal(table, end_date, end=True)
+        if skip_suspended:
+            query += " AND vol > 0"
+        query += f" ORDER BY ts_code, {date_col}"
+        return compile_template(query).bind(**params)
+
+    @staticmethod
+    def price_after(
+        table: str,
+        ts_codes: str | list[str],
+        after: str | None = None,
+        until: str | None = None,
+    ) -> Query:
+        """All columns of the bars strictly after a timestamp and up to another (open-ended if None)"""
+        date_col = date_column(table)
+        query = f"SELECT * FROM {table} WHERE ts_code IN (:ts_codes)"
+        params = {'ts_codes': _as_list(ts_codes)}
+        if after is not None:
+            query += f" AND {date_col} > :after"
+            params['after'] = after
+        if until is not None:
+            query += f" AND {date_col} <= :until"
+            params['until'] = until
+        query += f" ORDER BY ts_code, {date_col}"
+        return compile_template(query).bind(**params)
+
+    @staticmethod
+    def adj_factor(ts_codes: str | list[str], start_date: str | None = None) -> Query:
+        """Adjustment factors from start_date on"""
+        query = "SELECT ts_code, trade_date, adj_factor FROM adj_factor WHERE ts_code IN (:ts_codes)"
+        params = {'ts_codes': _as_list(ts_codes)}
+        if start_date:
+            query += " AND trade_date >= :start_date"
+            params['start_date'] = date_literal('adj_factor', start_date)
+        query += " ORDER BY ts_code, trade_date"
+        return compile_template(query).bind(**params)
+
+    @staticmethod
+    def fundamentals(
+        table: str,
+        ts_codes: str | list[str] | None = None,
+        fields: list[str] | None = None,
+        start_date: str | None = None,
+        end_date: str | None = None,
+        limit: int | None = None,
+    ) -> Query:
+        """Rows of any table filtered by security and trade_date"""
+        query = f"SELECT {', '.join(fields) if fields else '*'} FROM {table}"
+        conditions = []
+        params = {}
+        if ts_codes:
+            conditions.append("ts_code IN (:ts_codes)")
+            params['ts_codes'] = _as_list(ts_codes)
+        if start_date:
+            conditions.append("trade_date >= :start_date")
+            params['start_date'] = start_date
+        if end_date:
+            conditions.append("trade_date <= :end_date")
+            params['end_date'] = end_date
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if limit:
+            query += " LIMIT :limit"
+            params['limit'] = int(limit)
+        return compile_template(query).bind(**params)
+
+    @staticmethod
+    def statements(
+        table: str,
+        ts_codes: str | list[str],
+        fields: list[str] | None = None,
+        period_start: str | None = None,
+        announced_by: str | None = None,
+    ) -> Query:
+        """
+        Financial statements with their announcement and period dates, for periods ending
+        on or after period_start and announced on or before announced_by
+        """
+        keys = ['ts_code', 'ann_date', 'f_ann_date', 'end_date']
+        columns = list(dict.fromkeys(keys + fields)) if fields else ['*']
+        query = f"SELECT {', '.join(columns)} FROM {table} WHERE ts_code IN (:ts_codes)"
+        params = {'ts_codes': _as_list(ts_codes)}
+        if period_start:
+            query += " AND end_date >= :period_start"
+            params['period_start'] = pd.Timestamp(period_start).strftime('%Y%m%d')
+        if announced_by:
+            query += " AND ann_date <= :announced_by"
+            params['announced_by'] = pd.Timestamp(announced_by).strftime('%Y%m%d')
+        return compile_template(query + " ORDER BY ts_code, end_date").bind(**params)
+
+    @staticmethod
+    def daily_price(ts_codes: str | list[str], start_date: str | None = None, end_date: str | None = None) -> Query:
+        query = """
         SELECT ts_code, trade_date, open, high, low, close, vol as volume, amount
         FROM daily
-        WHERE ts_code IN ({ts_codes_str})
+        WHERE ts_code IN (:ts_codes)
         """
+        params = {'ts_codes': _as_list(ts_codes)}
         if start_date:
-            query += f" AND trade_date >= '{start_date}'"
+            query += " AND trade_date >= :start_date"
+            params['start_date'] = start_date
         if end_date:
-            query += f" AND trade_date <= '{end_date}'"
-        return query + " ORDER BY ts_code, trade_date"
+            query += " AND trade_date <= :end_date"
+            params['end_date'] = end_date
+        return compile_template(query + " ORDER BY ts_code, trade_date").bind(**params)
 
     @staticmethod
-    def income_statement(ts_codes: str | list[str], start_date: str | None = None) -> str:
-        ts_codes_str = _format_security_list(ts_codes)
-        query = f"""
-        SELECT ts_code, ann_date, f_ann_date, end_date, 
+    def income_statement(ts_codes: str | list[str], start_date: str | None = None) -> Query:
+        query = """
+        SELECT ts_code, ann_date, f_ann_date, end_date,
                revenue, operate_profit, total_profit, n_income
         FROM income
-        WHERE ts_code IN ({ts_codes_str})
+        WHERE ts_code IN (:ts_codes)
         """
+        params = {'ts_codes': _as_list(ts_codes)}
         if start_date:
-            query += f" AND end_date >= '{start_date}'"
-        return query + " ORDER BY ts_code, end_date"
+            query += " AND end_date >= :start_date"
+            params['start_date'] = start_date
+        return compile_template(query + " ORDER BY ts_code, end_date").bind(**params)
 
     @staticmethod
-    def balance_sheet(ts_codes: str | list[str], start_date: str | None = None) -> str:
-        ts_codes_str = _format_security_list(ts_codes)
-        query = f"""
+    def balance_sheet(ts_codes: str | list[str], start_date: str | None = None) -> Query:
+        query = """
         SELECT ts_code, ann_date, f_ann_date, end_date,
                total_assets, total_liab, total_hldr_eqy_exc_min_int
         FROM balancesheet
-        WHERE ts_code IN ({ts_codes_str})
+        WHERE ts_code IN (:ts_codes)
         """
+        params = {'ts_codes': _as_list(ts_codes)}
         if start_date:
-            query += f" AND end_date >= '{start_date}'"
-        return query + " ORDER BY ts_code, end_date" 
\ No newline at end of file
+            query += " AND end_date >= :start_date"
+            params['start_date'] = start_date
+        return compile_template(query + " ORDER BY ts_code, end_date").bind(**params)
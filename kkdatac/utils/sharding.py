@@ -0,0 +1,49 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, TypeVar
+from .check_date import date_to_datetime
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def chunk_list(items: str | list[T], size: int | None) -> list[list[T]]:
+    """Split items into consecutive chunks of at most size elements."""
+    if isinstance(items, str):
+        items = [items]
+    items = list(items)
+    if not size or len(items) <= size:
+        return [items]
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def split_date_range(
+    start_date: str | None, end_date: str | None, days: int | None
+) -> list[tuple[str | None, str | None]]:
+    """
+    Split an inclusive date range into consecutive windows of at most days calendar days,
+    keeping the input's date format ('YYYY-MM-DD' or 'YYYYMMDD'). Open ranges are not split.
+    """
+    if not days or not start_date or not end_date:
+        return [(start_date, end_date)]
+    fmt = "%Y-%m-%d" if "-" in start_date else "%Y%m%d"
+    start = date_to_datetime(start_date).date()
+    end = date_to_datetime(end_date).date()
+    windows = []
+    while start <= end:
+        stop = min(start + datetime.timedelta(days=days - 1), end)
+        windows.append((start.strftime(fmt), stop.strftime(fmt)))
+        start = stop + datetime.timedelta(days=1)
+    return windows or [(start_date, end_date)]
+
+
+def run_concurrently(func: Callable[..., R], args_list: Iterable[tuple], max_workers: int) -> list[R]:
+    """
+    Call func(*args) for every tuple in args_list on a bounded thread pool and return
+    the results in input order. A single call runs inline.
+    """
+    args_list = list(args_list)
+    if len(args_list) <= 1 or max_workers <= 1:
+        return [func(*args) for args in args_list]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(args_list))) as executor:
+        return list(executor.map(lambda args: func(*args), args_list))
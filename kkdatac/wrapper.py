@@ -1,8 +1,23 @@
 from datetime import datetime
+import numpy as np
 import pandas as pd
 from enum import Enum
-from kkdatac.client import KKDataClient
+from typing import Iterator
+from kkdatac.adjust import adjust_prices
+from kkdatac.client import get_client
+from kkdatac.codec import concat_frames, to_arrow
+from kkdatac.instruments import Instrument, get_instrument_master
+from kkdatac.mirror import get_mirror
+from kkdatac.panel import Panel
+from kkdatac.pit import asof_join
+from kkdatac.resample import NATIVE_TABLES, base_table, parse_frequency, resample_bars
+from kkdatac.trading_calendar import get_trading_calendar, to_date_str
+from kkdatac.config import (
+    STREAM_CHUNK_ROWS, RESULT_FORMAT, SHARD_SIZE, SHARD_DAYS, MAX_CONCURRENCY, PIT_LOOKBACK_DAYS
+)
 from .utils.code_converter import CodeConverter
+from .utils.query_templates import Query, QueryTemplates, bind_params, date_column
+from .utils.sharding import chunk_list, run_concurrently, split_date_range
 
 ODER_BOOK_IDS = str | list[str]
 FIELDS = str | list[str]
@@ -38,6 +53,8 @@ def all_instruments(type=None, market="cn", date=None):
     :param date: str, optional, default None 指定日期，筛选指定日期可交易的合约
     :return: pd.DataFrame - 所有合约的基本信息。详细字段注释请参考 instruments 返回字段说明
     """
+    master = get_instrument_master(market)
+    return master.frame(master.mask(type=type, date=date))
 
 
 class instruments:
@@ -51,24 +68,44 @@ class instruments:
         """
         self.order_book_ids = order_book_ids
         self.market = market
+        self._master = get_instrument_master(market)
+        self._positions = self._master.positions(order_book_ids)
 
-    def __post_init__(self) -> None:
-        # 打印对象：Instrument(listed_date='2016-04-28', exchange='XSHG', underlying_symbol='510050.XSHG', symbol='510050C1612A02050', underlying_order_book_id='510050.XSHG', round_lot=1, de_listed_date='2016-12-28', maturity_date='2016-12-28', option_type='C', exercise_type='E', type='Option', contract_multiplier=10220, strike_price=2.006, order_book_id='10000615', market_tplus=0, trading_hours='09:31-11:30,13:01-15:00')
-        pass
+    def _result(self, values: np.ndarray):
+        return int(values[0]) if isinstance(self.order_book_ids, str) else values
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __iter__(self):
+        return (Instrument(self._master, int(p)) for p in self._positions)
+
+    def __getitem__(self, i: int) -> Instrument:
+        return Instrument(self._master, int(self._positions[i]))
+
+    def __repr__(self) -> str:
+        # 打印对象：Instrument(order_book_id='000001.XSHE', symbol='平安银行', type='CS', ...)
+        if isinstance(self.order_book_ids, str):
+            return repr(self[0])
+        return f"[{', '.join(repr(instrument) for instrument in self)}]"
+
+    def to_frame(self) -> pd.DataFrame:
+        """合约基本信息，每个合约一行"""
+        return self._master.frame(self._positions)
 
-    def days_from_listed(self, date: str) -> int:
+    def days_from_listed(self, date: str | None = None) -> int | np.ndarray:
         """
-        :param date: str 日期，格式为'YYYYMMDD'
-        :return: int 从上市到 date 的天数
+        :param date: str 日期，格式为'YYYYMMDD'，默认今天
+        :return: int 从上市到 date 的天数，未上市为 -1；传入合约列表时返回数组
         """
-        pass
+        return self._result(self._master.days_from_listed(self._positions, date))
 
-    def days_to_expire(self, date: str) -> int:
+    def days_to_expire(self, date: str | None = None) -> int | np.ndarray:
         """
-        :param date: str 日期，格式为'YYYYMMDD'
-        :return: int 从 date 到到期日的天数, 仅期货合约有到期日
+        :param date: str 日期，格式为'YYYYMMDD'，默认今天
+        :return: int 从 date 到到期日的天数, 仅期货合约有到期日，没有到期日为 -1；传入合约列表时返回数组
         """
-        pass
+        return self._result(self._master.days_to_expire(self._positions, date))
 
 
 def id_convert(order_book_ids: ODER_BOOK_IDS, to="normal") -> ODER_BOOK_IDS:
@@ -109,31 +146,65 @@ def get_price(
     fields: list[str] | None = None,
     adjust_type: str = 'pre',
     skip_suspended: bool = False,
+    return_type: str = 'pandas',
+    mirror: bool = False,
+    resample: bool | None = None,
+    shard_size: int | None = SHARD_SIZE,
+    shard_days: int | None = SHARD_DAYS,
+    max_workers: int = MAX_CONCURRENCY,
 ) -> pd.DataFrame:
-    """Get price data for securities"""
+    """
+    Get price data for securities. return_type='arrow' returns a pyarrow.Table and
+    return_type='panel' a kkdatac.panel.Panel of (date x security) arrays per field.
+    adjust_type 'pre' (forward) or 'post' (backward) adjusts OHLC prices with the
+    adjustment factors, 'none' returns raw prices.
+    The date range, fields and suspension filter are pushed into the SQL, so the server
+    only scans and ships the bars asked for.
+    With mirror=True bars are served from the local mirror (kkdatac.mirror), which only
+    fetches bars newer than its last sync from the server.
+    Frequencies without a table of their own (e.g. '3min', '2h', '2w') are derived locally
+    from mins1 or daily bars (kkdatac.resample); resample=True derives every frequency
+    that way, which is also the default with mirror=True.
+    Long requests are queried in shards of shard_size codes and shard_days calendar days,
+    max_workers at a time.
+    """
     # Convert RiceQuant codes to internal format
     internal_codes = CodeConverter.convert_codes(order_book_ids, 'internal')
     
     # Rest of the implementation...
     table = _get_table_by_frequency(frequency)
-    field_str = ', '.join(fields) if fields else '*'
-    order_book_ids_str = _format_security_list(internal_codes)
-    
-    query = f"""
-    SELECT {field_str} 
-    FROM {table}
-    WHERE ts_code IN ({order_book_ids_str})
-    """
-    
-    # ... rest of the code ...
-    
-    df = sql(query)
+    if resample is None:
+        # The mirror keeps only the base tables
+        resample = table is None or (mirror and table not in ('daily', 'mins1'))
+    if resample:
+        table = base_table(frequency)
+    fetch_type = 'pandas' if return_type == 'panel' or resample else return_type
+    if mirror:
+        codes = [internal_codes] if isinstance(internal_codes, str) else internal_codes
+        df = get_mirror().get(table, codes, start_date, end_date)
+        if skip_suspended:
+            df = _remove_suspended(df)
+        df = _adjust_price(df, adjust_type, table)
+        if fields:
+            df = df[list(dict.fromkeys(['ts_code', date_column(table)] + fields))]
+        if fetch_type == 'arrow':
+            df = to_arrow(df)
+    else:
+        queries = _price_queries(internal_codes, table, fields, start_date, end_date, skip_suspended,
+                                 shard_size, shard_days)
+        df = _run_sharded(queries, max_workers, return_type=fetch_type)
+        if len(split_date_range(start_date, end_date, shard_days)) > 1:
+            # Date shards interleave securities; restore the per-query ORDER BY
+            df = _sort_bars(df, date_column(table))
+        df = _adjust_price(df, adjust_type, table)
+    if resample:
+        # Bars are adjusted before aggregation, so derived bars use each day's own factor
+        df = resample_bars(df, frequency, date_column(table))
+        if return_type == 'arrow':
+            df = to_arrow(df)
     
     # Convert codes back to RiceQuant format in result
-    if 'ts_code' in df.columns:
-        df['ts_code'] = CodeConverter.convert_codes(df['ts_code'].tolist(), 'rq')
-    
-    return df
+    return _as_return_type(_convert_code_column(df, 'rq'), return_type, date_column(table))
 
 def get_fundamentals(
     table: str,
@@ -141,7 +212,11 @@ def get_fundamentals(
     fields: list[str] | None = None,
     start_date: str | None = None,
     end_date: str | None = None,
-    limit: int | None = None
+    limit: int | None = None,
+    return_type: str = 'pandas',
+    shard_size: int | None = SHARD_SIZE,
+    shard_days: int | None = SHARD_DAYS,
+    max_workers: int = MAX_CONCURRENCY
 ) -> pd.DataFrame:
     """
     Get fundamental data, similar to RQData's API
@@ -153,70 +228,151 @@ def get_fundamentals(
         start_date: Start date
         end_date: End date
         limit: Limit number of records
+        return_type: 'pandas' for a DataFrame, 'arrow' for a pyarrow.Table
+        shard_size: Securities per concurrent query shard
+        shard_days: Calendar days per concurrent query shard
+        max_workers: Shards queried at a time
     """
-    field_str = ', '.join(fields) if fields else '*'
-    query = f"SELECT {field_str} FROM {table}"
-    
-    conditions = []
-    if security_list:
-        securities_str = _format_security_list(security_list)
-        conditions.append(f"ts_code IN ({securities_str})")
-    if start_date:
-        conditions.append(f"trade_date >= '{start_date}'")
-    if end_date:
-        conditions.append(f"trade_date <= '{end_date}'")
-        
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-        
     if limit:
-        query += f" LIMIT {limit}"
-        
-    return sql(query)
+        # A row limit applies to the whole result, so it cannot be split
+        shard_size = shard_days = None
+
+    queries = [
+        QueryTemplates.fundamentals(table, securities, fields, start, end, limit)
+        for securities in (chunk_list(security_list, shard_size) if security_list else [None])
+        for start, end in split_date_range(start_date, end_date, shard_days)
+    ]
+    return _run_sharded(queries, max_workers, return_type=return_type)
+
+def get_fundamentals_pit(
+    order_book_ids: str | list[str],
+    start_date: str,
+    end_date: str,
+    table: str = 'income',
+    fields: list[str] | None = None,
+    lag: int = 1,
+    market: str = 'cn',
+    lookback_days: int = PIT_LOOKBACK_DAYS,
+    shard_size: int | None = SHARD_SIZE,
+    max_workers: int = MAX_CONCURRENCY,
+    return_type: str = 'pandas',
+) -> pd.DataFrame | Panel:
+    """
+    Get point-in-time fundamentals: for every security and trading date in
+    [start_date, end_date], the latest statement of a financial table (income,
+    balancesheet, cashflow, ...) that had been announced by then.
+
+    Args:
+        order_book_ids: Security codes
+        start_date: First trading date of the grid
+        end_date: Last trading date of the grid
+        table: Statement table name
+        fields: Statement fields to fetch, defaults to all
+        lag: Trading days after the announcement before a statement is used, 1 avoids
+            look-ahead on statements published after the close
+        market: Market whose trading calendar forms the grid
+        lookback_days: Statements for periods ending this long before start_date are
+            fetched so the report in force on the first day is known
+        shard_size: Securities per concurrent query shard
+        max_workers: Shards queried at a time
+        return_type: 'pandas' for a DataFrame, 'panel' for a kkdatac.panel.Panel
+
+    Returns one row per (order_book_id, trade_date), with end_date, ann_date and
+    f_ann_date of the statement in force followed by its fields.
+    """
+    internal_codes = CodeConverter.convert_codes(order_book_ids, 'internal')
+    codes = [internal_codes] if isinstance(internal_codes, str) else internal_codes
+    period_start = pd.Timestamp(start_date) - pd.Timedelta(days=lookback_days)
+    queries = [
+        QueryTemplates.statements(table, shard, fields, period_start, end_date)
+        for shard in chunk_list(codes, shard_size)
+    ]
+    statements = _run_sharded(queries, max_workers)
+    dates = get_trading_calendar(market).between(start_date, end_date)
+    df = asof_join(statements, codes, dates, fields, lag=lag)
+    return _as_return_type(_convert_code_column(df, 'rq'), return_type, 'trade_date')
 
 def get_trading_dates(
     start_date: str,
-    end_date: str
+    end_date: str,
+    market: str = "cn"
 ) -> list:
-    """Get trading dates between start_date and end_date"""
-    query = f"""
-    SELECT DISTINCT trade_date 
-    FROM daily 
-    WHERE trade_date BETWEEN '{start_date}' AND '{end_date}'
-    ORDER BY trade_date
     """
-    df = sql(query)
-    return df['trade_date'].tolist()
-
-def _get_table_by_frequency(frequency: str) -> str:
-    """Map frequency to table name"""
-    mapping = {
-        '1d': 'daily',
-        '1w': 'weekly',
-        '1m': 'monthly',
-        '1min': 'mins1',
-        '5min': 'mins5',
-        '15min': 'mins15',
-        '30min': 'mins30',
-        '60min': 'mins60'
-    }
-    return mapping.get(frequency, 'daily')
-
-def _format_security_list(securities: str | list[str]) -> str:
-    """Format security list for SQL query"""
-    if isinstance(securities, str):
-        return f"'{securities}'"
-    return ', '.join(f"'{s}'" for s in securities)
-
-def _adjust_price(df: pd.DataFrame, adjust_type: str) -> pd.DataFrame:
-    """Apply price adjustments"""
-    # TODO: Implement price adjustment logic
+    Get trading dates between start_date and end_date as datetime.date objects.
+    Served from the cached trading calendar (kkdatac.trading_calendar).
+    """
+    dates = get_trading_calendar(market).between(start_date, end_date)
+    return dates.astype(object).tolist()
+
+def _price_queries(
+    internal_codes: str | list[str],
+    table: str,
+    fields: list[str] | None,
+    start_date: str | None,
+    end_date: str | None,
+    skip_suspended: bool,
+    shard_size: int | None,
+    shard_days: int | None,
+) -> list[Query]:
+    """Build the price query for each shard of securities and dates"""
+    return [
+        QueryTemplates.price(table, codes, fields, start, end, skip_suspended)
+        for codes in chunk_list(internal_codes, shard_size)
+        for start, end in split_date_range(start_date, end_date, shard_days)
+    ]
+
+def _run_sharded(queries: list[Query], max_workers: int, return_type: str = 'pandas'):
+    """Run query shards concurrently and concatenate their results in order"""
+    if len(queries) == 1:
+        return sql(queries[0], return_type=return_type)
+    parts = run_concurrently(lambda query: sql(query, return_type=return_type),
+                             [(query,) for query in queries], max_workers)
+    return concat_frames(parts)
+
+def _as_return_type(df: pd.DataFrame, return_type: str, date_col: str):
+    """Long results as they are, or pivoted into a Panel for return_type='panel'"""
+    if return_type == 'panel':
+        return Panel.from_long(df, date_col=date_col, symbol_col='ts_code')
     return df
 
+def _sort_bars(data, date_col: str):
+    """Sort a DataFrame or pyarrow.Table of bars by security, then time"""
+    keys = [k for k in ('ts_code', date_col)
+            if k in (data.columns if isinstance(data, pd.DataFrame) else data.column_names)]
+    if isinstance(data, pd.DataFrame):
+        return data.sort_values(keys, kind='stable').reset_index(drop=True)
+    return data.sort_by([(k, 'ascending') for k in keys])
+
+def _get_table_by_frequency(frequency: str) -> str | None:
+    """Map frequency to table name, None for frequencies derived by resampling"""
+    if frequency not in NATIVE_TABLES:
+        parse_frequency(frequency)
+    return NATIVE_TABLES.get(frequency)
+
+def _convert_code_column(data, to_format: str, column: str = 'ts_code'):
+    """Convert the code column of a DataFrame or pyarrow.Table to the given format"""
+    columns = data.columns if isinstance(data, pd.DataFrame) else data.column_names
+    if column not in columns:
+        return data
+    if isinstance(data, pd.DataFrame):
+        data[column] = CodeConverter.convert_series(data[column], to_format)
+        return data
+    # Arrow: convert each distinct code once through a dictionary encoding
+    import pyarrow as pa
+    encoded = data.column(column).combine_chunks().dictionary_encode()
+    converted = pa.array(CodeConverter.convert_codes(encoded.dictionary.to_pylist(), to_format))
+    codes = pa.DictionaryArray.from_arrays(encoded.indices, converted)
+    return data.set_column(data.column_names.index(column), column, codes)
+
+def _adjust_price(df: pd.DataFrame, adjust_type: str, table: str = 'daily') -> pd.DataFrame:
+    """Apply price adjustments ('pre', 'post' or 'none') to bars still in internal codes"""
+    return adjust_prices(df, adjust_type or 'none', date_column(table))
+
 def _remove_suspended(df: pd.DataFrame) -> pd.DataFrame:
-    """Remove suspended trading days"""
-    # TODO: Implement suspended days removal
-    return df
+    """Remove suspended trading days, i.e. bars without volume"""
+    if 'vol' not in df.columns:
+        return df
+    return df[df['vol'] > 0].reset_index(drop=True)
 
 def get_ticks(order_book_id) -> pd.DataFrame:
     """
@@ -224,8 +380,9 @@ def get_ticks(order_book_id) -> pd.DataFrame:
     获取当日给定合约的 level1 快照行情，无法获取历史。
     :param order_book_id: str 合约代码
     :return: pd.DataFrame 合约的 tick 数据
+    实时订阅请使用 kkdatac.ticks.subscribe_ticks
     """
-    pass
+    return get_client().get_ticks(order_book_id)
 
 
 def get_open_auction_info(
@@ -238,44 +395,96 @@ def get_open_auction_info(
     :param market: str, optional, default 'cn' 默认是中国内地市场('cn') 。可选'cn' - 中国内地市场；'hk' - 香港市场
     :return: pd.DataFrame multi-index DataFrame 合约的盘前集合竞价期间的 level1 快照行情
     """
-    pass
+    if market != "cn":
+        raise ValueError(f"Unsupported market: {market}")
+    df = get_client().get_ticks(order_book_ids, channel='auction', start_date=start_date, end_date=end_date)
+    if {'order_book_id', 'datetime'}.issubset(df.columns):
+        df = df.set_index(['order_book_id', 'datetime']).sort_index()
+    return df
 
 
-def get_previous_trading_date(date, n, market="cn"):
+def get_previous_trading_date(date, n=1, market="cn"):
     """获取指定日期前 n 个交易日
     获取指定日期前 n 个交易日的日期。
-    :param date: str 日期，格式为'YYYY-MM-DD'
+    :param date: str 日期，格式为'YYYY-MM-DD'. 也可传入日期列表，批量计算
     :param n: int 获取前 n 个交易日
     :param market: str, optional, default 'cn' 默认是中国内地市场('cn') . 仅支持中国市场. 加密货币市场不会暂停交易
     :return: str 日期，格式为'YYYY-MM-DD'
     """
-    pass
+    return to_date_str(get_trading_calendar(market).previous(date, n))
 
 
-def get_next_trading_date(date, n, market="cn"):
+def get_next_trading_date(date, n=1, market="cn"):
     """获取指定日期后 n 个交易日
     获取指定日期后 n 个交易日的日期。
-    :param date: str 日期，格式为'YYYY-MM-DD'
+    :param date: str 日期，格式为'YYYY-MM-DD'. 也可传入日期列表，批量计算
     :param n: int 获取后 n 个交易日
     :param market: str, optional, default 'cn' 默认是中国内地市场('cn') . 仅支持中国市场. 加密货币市场不会暂停交易
     :return: str 日期，格式为'YYYY-MM-DD'
     """
-    pass
+    return to_date_str(get_trading_calendar(market).next(date, n))
 
 
-def get_latest_trading_date() -> datetime.date:
+def get_latest_trading_date(market="cn") -> datetime.date:
     """获取最近一个交易日
     获取最近一个交易日的日期。
     :return: datetime.date 日期
     """
-    pass
-
-def sql(sql_query: str, api_key: str | None = None, base_url: str | None = None) -> pd.DataFrame:
+    return get_trading_calendar(market).latest().astype(object)
+
+def sql(
+    sql_query: str | Query,
+    api_key: str | None = None,
+    base_url: str | None = None,
+    stream: bool = False,
+    chunk_size: int | None = None,
+    result_format: str | None = None,
+    return_type: str = 'pandas',
+    use_cache: bool = True,
+    params: dict | None = None,
+) -> pd.DataFrame | Iterator[pd.DataFrame]:
     """
     Send a SQL query to the kkdatad server and return the result as a pandas DataFrame.
+    Queries share a pooled client per (base_url, api_key).
+    With stream=True an iterator of DataFrame chunks is returned, see iter_sql.
+    result_format picks the wire encoding ('pickle', 'arrow', 'parquet'); it defaults to
+    RESULT_FORMAT, or 'arrow' when return_type='arrow' asks for a pyarrow.Table.
+    use_cache=False bypasses the local query cache (kkdatac.cache.enable_cache).
+    With params, sql_query is a template with :name placeholders bound to those values,
+    e.g. sql("SELECT * FROM daily WHERE ts_code IN (:codes)", params={'codes': codes}).
+    """
+    sql_query = bind_params(sql_query, params)
+    if stream:
+        return iter_sql(sql_query, api_key=api_key, base_url=base_url, chunk_size=chunk_size,
+                        result_format=result_format, return_type=return_type)
+    client = get_client(api_key=api_key, base_url=base_url)
+    return client.run_query(sql_query, result_format=_result_format(result_format, return_type),
+                            return_type=return_type, use_cache=use_cache)
+
+def iter_sql(
+    sql_query: str | Query,
+    api_key: str | None = None,
+    base_url: str | None = None,
+    chunk_size: int | None = None,
+    result_format: str | None = None,
+    return_type: str = 'pandas',
+    params: dict | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Send a SQL query and yield the result as DataFrame chunks, decoding the response
+    incrementally so large exports (e.g. a full-market mins1 pull) fit in bounded memory.
+    chunk_size defaults to STREAM_CHUNK_ROWS.
     """
-    client = KKDataClient(api_key=api_key, base_url=base_url)
-    return client.run_query(sql_query)
+    client = get_client(api_key=api_key, base_url=base_url)
+    return client.iter_query(bind_params(sql_query, params), chunk_size=chunk_size or STREAM_CHUNK_ROWS,
+                             result_format=_result_format(result_format, return_type),
+                             return_type=return_type)
+
+def _result_format(result_format: str | None, return_type: str) -> str:
+    """Default wire format: Arrow when the caller wants a pyarrow.Table back"""
+    if result_format:
+        return result_format
+    return 'arrow' if return_type == 'arrow' else RESULT_FORMAT
 
 if __name__ == "__main__":
     pass
@@ -22,6 +22,11 @@ setup(
     ],
     python_requires='>=3.9',
     install_requires=install_requires,
+    extras_require={
+        "arrow": ["pyarrow>=12.0.0"],
+        "async": ["aiohttp>=3.8.0"],
+        "otel": ["opentelemetry-api>=1.20"],
+    },
     project_urls={
         "Bug Tracker": "https://github.com/KAKIQUANT/kkdatac/issues",
     },
@@ -0,0 +1,269 @@
+"""
+Benchmarks of the client data path against a local mock kkdatad (mock_kkdatad.py).
+
+Each case runs one call end to end (sql, get_price or get_factor) for a result size and
+wire format, and reports:
+- latency percentiles over --repeat runs, after --warmup runs
+- throughput in rows and received megabytes per second at the median latency
+- peak memory traced by tracemalloc during one extra run (Python and numpy allocations;
+  Arrow buffers are not traced)
+- mean seconds per run of every stage recorded by kkdatac.metrics (network, unhex,
+  decompress, unpickle, Arrow decoding, post-processing); sharded calls overlap their
+  stages, so these can add up to more than the latency
+
+The mock runs in a subprocess so its allocations and threads stay out of the numbers, and
+answers repeated queries from memory. Results can be recorded and compared:
+
+    python test/bench_client.py --output baseline.json
+    python test/bench_client.py --compare baseline.json --threshold 0.1
+
+--compare exits with status 1 when a case's median latency regressed by more than the
+threshold.
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+from mock_kkdatad import FACTOR_NAMES
+
+MOCK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_kkdatad.py")
+END_DATE = "2024-12-31"
+# Wire formats: (result_format, binary); json is the legacy hex-encoded LZ4 pickle for SQL
+# and JSON records for factors
+FORMATS = {
+    "json": ("pickle", False),
+    "pickle": ("pickle", True),
+    "arrow": ("arrow", True),
+    "parquet": ("parquet", True),
+}
+ARROW_FORMATS = ("arrow", "parquet")
+PERCENTILES = (50, 90, 99)
+
+
+def start_mock() -> tuple[subprocess.Popen, str]:
+    """Start mock_kkdatad.py on a free port and return the process and its URL"""
+    process = subprocess.Popen([sys.executable, MOCK, "--port", "0"], stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Serving on "):
+        process.kill()
+        raise RuntimeError(f"Failed to start the mock kkdatad: {line!r}")
+    return process, line.split()[-1]
+
+
+def has_pyarrow() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def date_range(days: int) -> tuple[str, str]:
+    """Start and end dates spanning the last `days` business days up to END_DATE"""
+    start = pd.bdate_range(end=END_DATE, periods=days)[0]
+    return start.strftime("%Y-%m-%d"), END_DATE
+
+
+def build_cases(args) -> list[dict]:
+    """Every (call, table, size, format) combination asked for on the command line"""
+    import kkdatac
+    from kkdatac.utils.query_templates import QueryTemplates
+
+    client = kkdatac.get_client()
+    formats = [f for f in args.formats if f not in ARROW_FORMATS or has_pyarrow()]
+    grids = {"daily": (args.symbols, args.days), "mins1": (args.mins_symbols, args.mins_days)}
+    cases = []
+
+    def add(name: str, call: str, run):
+        if call in args.calls:
+            cases.append({"name": name, "call": call, "run": run})
+
+    for table, (symbol_counts, days) in grids.items():
+        start, end = date_range(days)
+        for n in symbol_counts:
+            codes = [f"{i:06d}.SZ" for i in range(1, n + 1)]
+            order_book_ids = [f"{i:06d}.XSHE" for i in range(1, n + 1)]
+            query = QueryTemplates.price(table, codes, None, start, end)
+            for fmt in formats:
+                result_format, binary = FORMATS[fmt]
+                add(f"sql/{table}/{n}x{days}/{fmt}", "sql",
+                    lambda q=query, r=result_format, b=binary: client.run_query(
+                        q, binary=b, result_format=r, use_cache=False))
+            frequency = "1min" if table == "mins1" else "1d"
+            for return_type in ("pandas", "arrow") if has_pyarrow() else ("pandas",):
+                add(f"get_price/{frequency}/{n}x{days}/{return_type}", "get_price",
+                    lambda ids=order_book_ids, f=frequency, s=start, e=end, r=return_type: kkdatac.get_price(
+                        ids, s, e, frequency=f, return_type=r))
+
+    start, end = date_range(args.days)
+    for n in args.symbols:
+        order_book_ids = [f"{i:06d}.XSHE" for i in range(1, n + 1)]
+        for fmt in formats:
+            result_format, binary = FORMATS[fmt]
+            add(f"get_factor/{n}x{args.days}x{args.factors}/{fmt}", "get_factor",
+                lambda ids=order_book_ids, r=result_format, b=binary: client.get_factor_data(
+                    ids, factors=list(FACTOR_NAMES[:args.factors]), start_date=start, end_date=end,
+                    binary=b, result_format=r))
+    return cases
+
+
+def result_rows(result) -> int:
+    return result.num_rows if hasattr(result, "num_rows") else len(result)
+
+
+def run_case(case: dict, repeat: int, warmup: int) -> dict:
+    """Time one case and collect its per-stage costs and peak traced memory"""
+    from kkdatac import metrics
+
+    for _ in range(warmup):
+        case["run"]()
+    latencies, stages, received, rows = [], {}, 0.0, 0
+    for _ in range(repeat):
+        metrics.reset()
+        start = time.perf_counter()
+        result = case["run"]()
+        latencies.append(time.perf_counter() - start)
+        rows = result_rows(result)
+        del result
+        stats = metrics.stats()
+        received += stats["counters"].get("bytes.received", 0)
+        for stage, timing in stats["timings"].items():
+            stages[stage] = stages.get(stage, 0.0) + timing["total"]
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        case["run"]()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    median = float(np.median(latencies))
+    return {
+        "name": case["name"],
+        "call": case["call"],
+        "rows": rows,
+        "repeat": repeat,
+        "latency": {
+            "mean": float(latencies.mean()),
+            "min": float(latencies.min()),
+            **{f"p{p}": float(np.percentile(latencies, p)) for p in PERCENTILES},
+        },
+        "rows_per_second": rows / median if median else None,
+        "mb_per_second": received / repeat / 1e6 / median if median else None,
+        "bytes_received": received / repeat,
+        "peak_memory_mb": peak / 1e6,
+        "stages": {stage: total / repeat for stage, total in sorted(stages.items())},
+    }
+
+
+def print_results(results: list[dict]) -> None:
+    header = f"{'case':<40} {'rows':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'Mrows/s':>8} {'MB/s':>8} {'peak MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        latency = r["latency"]
+        print(f"{r['name']:<40} {r['rows']:>9} {latency['p50'] * 1e3:>9.1f} {latency['p90'] * 1e3:>9.1f} "
+              f"{latency['p99'] * 1e3:>9.1f} {(r['rows_per_second'] or 0) / 1e6:>8.2f} "
+              f"{r['mb_per_second'] or 0:>8.1f} {r['peak_memory_mb']:>8.1f}")
+        stages = ", ".join(f"{stage} {seconds * 1e3:.1f}" for stage, seconds in r["stages"].items())
+        print(f"    stages (ms): {stages}")
+
+
+def compare(results: list[dict], baseline_path: str, threshold: float) -> list[str]:
+    """Print the median latency change of every case also in the baseline; return the regressions"""
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\nAgainst {baseline_path} (median latency, regression above +{threshold:.0%}):")
+    for r in results:
+        before = baseline.get(r["name"])
+        if before is None:
+            continue
+        change = r["latency"]["p50"] / before["latency"]["p50"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(r["name"])
+        print(f"{r['name']:<40} {before['latency']['p50'] * 1e3:>9.1f} -> {r['latency']['p50'] * 1e3:>9.1f} ms "
+              f"({change:+.1%}){flag}")
+    return regressions
+
+
+def environment() -> dict:
+    versions = {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__}
+    if has_pyarrow():
+        import pyarrow
+        versions["pyarrow"] = pyarrow.__version__
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "versions": versions,
+    }
+
+
+def _ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def _names(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the kkdatac data path against a mock kkdatad")
+    parser.add_argument("--url", help="benchmark a running server instead of starting mock_kkdatad.py")
+    parser.add_argument("--calls", type=_names, default=["sql", "get_price", "get_factor"])
+    parser.add_argument("--formats", type=_names, default=list(FORMATS), help=f"of {', '.join(FORMATS)}")
+    parser.add_argument("--symbols", type=_ints, default=[10, 100, 1000], help="securities per daily/factor case")
+    parser.add_argument("--days", type=int, default=250, help="business days per daily/factor case")
+    parser.add_argument("--mins-symbols", type=_ints, default=[10, 100], help="securities per mins1 case")
+    parser.add_argument("--mins-days", type=int, default=5, help="business days per mins1 case")
+    parser.add_argument("--factors", type=int, default=5, help="factors per get_factor case")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown counted as a regression")
+    args = parser.parse_args()
+    unknown = set(args.formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(sorted(unknown))}")
+
+    process = None
+    if args.url is None:
+        process, args.url = start_mock()
+    # The endpoint is read when kkdatac is imported
+    os.environ["KKDATAC_ENDPOINT"] = args.url
+    warnings.simplefilter("ignore")
+    try:
+        import kkdatac
+        kkdatac.disable_cache()
+        cases = [c for c in build_cases(args) if args.filter in c["name"]]
+        results = []
+        for case in cases:
+            results.append(run_case(case, args.repeat, args.warmup))
+            print(f"{case['name']}: p50 {results[-1]['latency']['p50'] * 1e3:.1f} ms", file=sys.stderr)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "url": args.url, "results": results}, f, indent=2)
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,14 @@
 import asyncio
 import kkdatac
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
-
-# Thread pool executor for parallel tasks
-executor = ThreadPoolExecutor(max_workers=10)
 
 
 async def fetch_table_info(table):
     try:
         # Fetch table description and first 100 rows
-        table_description = await asyncio.wait_for(
-            asyncio.get_event_loop().run_in_executor(executor, kkdatac.sql, f'DESCRIBE TABLE {table}'), timeout=1000
-        )
-        table_data = await asyncio.wait_for(
-            asyncio.get_event_loop().run_in_executor(executor, kkdatac.sql, f'SELECT * FROM {table} LIMIT 100'),
-            timeout=1000
+        table_description, table_data = await asyncio.gather(
+            kkdatac.async_sql(f'DESCRIBE TABLE {table}', timeout=1000),
+            kkdatac.async_sql(f'SELECT * FROM {table} LIMIT 100', timeout=1000),
         )
 
         return {
@@ -23,7 +16,7 @@ async def fetch_table_info(table):
             'columns': table_description,
             'sample_data': table_data
         }
-    except TimeoutError:
+    except asyncio.TimeoutError:
         return {
             'table': table,
             'error': 'Request timed out'
@@ -37,13 +30,15 @@ async def fetch_table_info(table):
 
 async def generate_report():
     # Fetch the list of tables asynchronously
-    tables_df = await asyncio.get_event_loop().run_in_executor(executor, kkdatac.sql, 'show tables')
+    tables_df = await kkdatac.async_sql('show tables')
 
-    # Create a list of async tasks for fetching table info
+    # Create a list of async tasks for fetching table info; the client's
+    # per-endpoint semaphore bounds how many run at once
     tasks = [fetch_table_info(table) for table in tables_df['name']]  # Assuming the table names are in 'name' column
 
     # Gather all the results
     report_data = await asyncio.gather(*tasks)
+    await kkdatac.get_async_client().close()
     return report_data
 
 
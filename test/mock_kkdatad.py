@@ -0,0 +1,412 @@
+"""
+Local stand-in for kkdatad.
+
+Serves synthetic data over the same HTTP endpoints and encodings as kkdatad, so the client
+can be exercised (and benchmarked, see bench_client.py) without network access or an API key:
+- POST /sql/, /sql-free/       SELECTs on the daily, mins1 and adj_factor tables
+- GET /api/v1/factors/data     factor values per security and date
+- GET /api/v1/ticks            today's level-1 snapshots (channel=tick|auction)
+- GET /api/v1/ticks/poll       long-poll for the snapshots after a cursor (X-Cursor header)
+
+Bars and factors are random walks over the business days of SyntheticMarket, deterministic
+per query, and encoded responses are kept so repeated queries cost the server nothing but
+the write. Snapshots are generated every --interval seconds for every symbol that has been
+asked for. Responses follow the Accept header: Arrow IPC stream, Parquet, LZ4 pickled
+DataFrame (application/octet-stream) or JSON, which is {"data": <hex LZ4 frame>} for SQL
+(the legacy transport) and {"data": <records>} elsewhere.
+
+    python test/mock_kkdatad.py --port 8765
+    kkdatac.subscribe_ticks(['000001.XSHE'], print, base_url='http://127.0.0.1:8765')
+"""
+import argparse
+import binascii
+import io
+import json
+import pickle
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import lz4.frame
+import numpy as np
+import pandas as pd
+
+JSON = "application/json"
+BINARY = "application/octet-stream"
+ARROW = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+
+
+# Factors served when a request does not name any
+FACTOR_NAMES = ('pe_ratio', 'pb_ratio', 'roe', 'momentum_20', 'volatility_20',
+                'turnover_rate', 'market_cap', 'beta', 'dividend_yield', 'liquidity')
+# Encoded responses kept for repeated requests
+RESPONSE_CACHE_SIZE = 64
+
+
+def encode_frame(df: pd.DataFrame, accept: str, legacy_json: bool = False) -> tuple[str, bytes]:
+    """
+    Encode a DataFrame in the first media type of an Accept header the server supports.
+    JSON holds records, or the hex-encoded LZ4 pickle with legacy_json=True.
+    """
+    for media in (part.split(";")[0].strip().lower() for part in accept.split(",")):
+        if media in (ARROW, PARQUET):
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                continue
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            sink = io.BytesIO()
+            if media == ARROW:
+                with pa.ipc.new_stream(sink, table.schema) as writer:
+                    writer.write_table(table)
+            else:
+                pq.write_table(table, sink)
+            return media, sink.getvalue()
+        if media == BINARY:
+            return media, lz4.frame.compress(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+    if legacy_json:
+        frame = lz4.frame.compress(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+        return JSON, json.dumps({"data": binascii.hexlify(frame).decode()}).encode()
+    return JSON, json.dumps({"data": json.loads(df.to_json(orient="records", date_format="iso"))}).encode()
+
+
+def _stable_unit(codes) -> np.ndarray:
+    """A number in [0, 1) per code, the same for a code in every request"""
+    return np.array([zlib.crc32(code.encode()) / 2 ** 32 for code in codes])
+
+
+class SyntheticMarket:
+    """Bars, adjustment factors and factor values of any securities over business days"""
+
+    MINUTES = np.r_[np.arange(9 * 60 + 31, 11 * 60 + 31), np.arange(13 * 60 + 1, 15 * 60 + 1)]
+
+    def __init__(self, start: str = "2015-01-01", end: str = "2025-12-31"):
+        self.days = pd.bdate_range(start, end)
+
+    def _days(self, start, end) -> pd.DatetimeIndex:
+        days = self.days
+        if start is not None:
+            days = days[days >= pd.Timestamp(start).normalize()]
+        if end is not None:
+            days = days[days <= pd.Timestamp(end)]
+        return days
+
+    @staticmethod
+    def _walk(rng: np.random.Generator, codes: list[str], steps: int, sigma: float) -> np.ndarray:
+        """(code x step) prices starting around a per-code level"""
+        base = 5 + 95 * _stable_unit(codes)
+        return base[:, None] * np.exp(np.cumsum(rng.normal(0, sigma, (len(codes), steps)), axis=1))
+
+    @staticmethod
+    def _bars(rng: np.random.Generator, close: np.ndarray) -> dict:
+        pre_close = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+        spread = np.abs(rng.normal(0, 0.005, close.shape))
+        vol = rng.integers(100, 100_000, close.shape).astype(float)
+        return {
+            "open": pre_close, "high": np.maximum(pre_close, close) * (1 + spread),
+            "low": np.minimum(pre_close, close) * (1 - spread), "close": close, "pre_close": pre_close,
+            "change": close - pre_close, "pct_chg": (close / pre_close - 1) * 100,
+            "vol": vol, "amount": vol * close / 10,
+        }
+
+    def daily(self, rng, codes: list[str], start=None, end=None) -> pd.DataFrame:
+        days = self._days(start, end)
+        bars = self._bars(rng, self._walk(rng, codes, len(days), 0.02))
+        return pd.DataFrame({
+            "ts_code": np.repeat(codes, len(days)),
+            "trade_date": np.tile(days.strftime("%Y%m%d"), len(codes)),
+            **{name: values.reshape(-1) for name, values in bars.items()},
+        })
+
+    def mins1(self, rng, codes: list[str], start=None, end=None) -> pd.DataFrame:
+        minutes = self.MINUTES.astype("timedelta64[m]")
+        times = (self._days(start, end).to_numpy()[:, None] + minutes).reshape(-1)
+        if start is not None:
+            times = times[times >= np.datetime64(pd.Timestamp(start))]
+        if end is not None:
+            times = times[times <= np.datetime64(pd.Timestamp(end))]
+        bars = self._bars(rng, self._walk(rng, codes, len(times), 0.001))
+        del bars["pre_close"], bars["change"], bars["pct_chg"]
+        return pd.DataFrame({
+            "ts_code": np.repeat(codes, len(times)),
+            "trade_time": np.tile(pd.DatetimeIndex(times).strftime("%Y-%m-%d %H:%M:%S"), len(codes)),
+            **{name: values.reshape(-1) for name, values in bars.items()},
+        })
+
+    def adj_factor(self, rng, codes: list[str], start=None, end=None) -> pd.DataFrame:
+        """Factors stepping up at a few dividends per code"""
+        days = self._days(start, end)
+        steps = rng.random((len(codes), len(days))) < 0.004
+        factors = np.cumprod(np.where(steps, 1.02, 1.0), axis=1)
+        return pd.DataFrame({
+            "ts_code": np.repeat(codes, len(days)),
+            "trade_date": np.tile(days.strftime("%Y%m%d"), len(codes)),
+            "adj_factor": factors.reshape(-1),
+        })
+
+    def factors(self, rng, codes: list[str], names, start=None, end=None) -> pd.DataFrame:
+        days = self._days(start, end)
+        data = {
+            "order_book_id": np.repeat(codes, len(days)),
+            "date": np.tile(days.to_numpy(), len(codes)),
+        }
+        for name in names:
+            data[name] = rng.normal(0, 1, len(codes) * len(days))
+        return pd.DataFrame(data)
+
+
+class TickFeed:
+    """Random-walk level-1 snapshots, kept in order with an increasing cursor"""
+
+    def __init__(self, interval: float = 0.5, seed: int = 0):
+        self.interval = interval
+        self.rng = np.random.default_rng(seed)
+        self.symbols: dict[str, float] = {}
+        self.ticks: list[tuple[int, str, pd.DataFrame]] = []
+        self.cursor = 0
+        self.condition = threading.Condition()
+
+    def subscribe(self, symbols: list[str]) -> None:
+        with self.condition:
+            for symbol in symbols:
+                self.symbols.setdefault(symbol, 10 + 90 * self.rng.random())
+
+    def generate(self, channel: str = "tick") -> None:
+        """Append one snapshot per known symbol and wake up the pollers"""
+        with self.condition:
+            if not self.symbols:
+                return
+            symbols = list(self.symbols)
+            last = np.array([self.symbols[s] for s in symbols]) * np.exp(self.rng.normal(0, 0.001, len(symbols)))
+            self.symbols.update(zip(symbols, last))
+            now = pd.Timestamp.now().floor("ms")
+            snapshot = {
+                "order_book_id": symbols,
+                "datetime": [now] * len(symbols),
+                "last": last,
+                "open": last, "high": last, "low": last, "prev_close": last,
+                "volume": self.rng.integers(100, 10_000, len(symbols)).astype(float),
+                "total_turnover": last * 1000,
+            }
+            for level in range(1, 6):
+                snapshot[f"a{level}"] = last + 0.01 * level
+                snapshot[f"b{level}"] = last - 0.01 * level
+                snapshot[f"a{level}_v"] = self.rng.integers(1, 100, len(symbols)) * 100.0
+                snapshot[f"b{level}_v"] = self.rng.integers(1, 100, len(symbols)) * 100.0
+            self.cursor += 1
+            self.ticks.append((self.cursor, channel, pd.DataFrame(snapshot)))
+            self.condition.notify_all()
+
+    def since(self, cursor: int | None, symbols: list[str], channel: str) -> tuple[int, pd.DataFrame | None]:
+        with self.condition:
+            batches = [df for c, ch, df in self.ticks if (cursor is None or c > cursor) and ch == channel]
+            if cursor is None:
+                batches = batches[-1:]
+            current = self.cursor
+        if not batches:
+            return current, None
+        df = pd.concat(batches, ignore_index=True)
+        return current, df[df["order_book_id"].isin(symbols)].reset_index(drop=True)
+
+    def run(self, stop: threading.Event) -> None:
+        while not stop.wait(self.interval):
+            self.generate()
+
+
+class MockKKDatad:
+    SQL_TABLES = ("daily", "mins1", "adj_factor")
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, tick_interval: float = 0.5):
+        self.feed = TickFeed(tick_interval)
+        self.market = SyntheticMarket()
+        self.requests = []
+        self._responses = OrderedDict()
+        self._responses_lock = threading.Lock()
+        self._stop = threading.Event()
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                mock.requests.append((url.path, params))
+                route = mock.routes.get(url.path.rstrip("/"))
+                if route is None:
+                    return self.reply(404, JSON, b'{"detail": "Not Found"}')
+                try:
+                    route(self, params)
+                except ValueError as e:
+                    self.reply(400, JSON, json.dumps({"detail": str(e)}).encode())
+
+            def do_POST(self):
+                # Queries travel in the URL; drain any body to keep the connection usable
+                self.rfile.read(int(self.headers.get("content-length") or 0))
+                self.do_GET()
+
+            def reply(self, status: int, media: str, body: bytes, headers: dict | None = None):
+                self.send_response(status)
+                self.send_header("content-type", media)
+                self.send_header("content-length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def frame(self, df: pd.DataFrame, headers: dict | None = None, legacy_json: bool = False):
+                media, body = encode_frame(df, self.headers.get("accept", JSON), legacy_json)
+                self.reply(200, media, body, headers)
+
+            def cached_frame(self, key, build, legacy_json: bool = False):
+                """Reply with a frame built once per key and Accept header"""
+                media, body = mock._cached((key, self.headers.get("accept", JSON)),
+                                           lambda: encode_frame(build(), self.headers.get("accept", JSON), legacy_json))
+                self.reply(200, media, body)
+
+        self.routes = {
+            "/sql": self._sql,
+            "/sql-free": self._sql,
+            "/api/v1/factors/data": self._factor_data,
+            "/api/v1/ticks": self._ticks,
+            "/api/v1/ticks/poll": self._poll_ticks,
+        }
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @staticmethod
+    def _symbols(params: dict) -> list[str]:
+        return params.get("order_book_ids", "").split(",")
+
+    def _cached(self, key, encode) -> tuple[str, bytes]:
+        with self._responses_lock:
+            if key in self._responses:
+                self._responses.move_to_end(key)
+                return self._responses[key]
+        response = encode()
+        with self._responses_lock:
+            self._responses[key] = response
+            while len(self._responses) > RESPONSE_CACHE_SIZE:
+                self._responses.popitem(last=False)
+        return response
+
+    @staticmethod
+    def _rng(key: str) -> np.random.Generator:
+        return np.random.default_rng(zlib.crc32(key.encode()))
+
+    def run_sql(self, query: str) -> pd.DataFrame:
+        """
+        Answer the SELECTs the client sends: projection, ts_code IN (...), comparisons of
+        the date column with literals, ORDER BY ts_code and LIMIT
+        """
+        match = re.match(r"\s*SELECT\s+(.+?)\s+FROM\s+(\w+)(.*)$", query, re.IGNORECASE | re.DOTALL)
+        if match is None:
+            raise ValueError(f"Unsupported query: {query[:200]}")
+        columns, table, rest = match.groups()
+        if table not in self.SQL_TABLES:
+            raise ValueError(f"Unknown table: {table}")
+        codes = re.search(r"ts_code\s+IN\s*\(([^)]*)\)", rest, re.IGNORECASE)
+        if codes is None:
+            raise ValueError("The mock needs a ts_code IN (...) filter")
+        codes = [code.strip(" '") for code in codes.group(1).split(",")]
+        date_col = "trade_time" if table == "mins1" else "trade_date"
+        # Strict comparisons move the bound by one bar
+        step = pd.Timedelta(minutes=1) if table == "mins1" else pd.Timedelta(days=1)
+        start = end = None
+        for op, value in re.findall(rf"{date_col}\s*(>=|<=|>|<)\s*'([^']*)'", rest):
+            value = pd.Timestamp(value)
+            if op == ">=":
+                start = value
+            elif op == ">":
+                start = value + step
+            elif op == "<=":
+                end = value
+            else:
+                end = value - step
+        df = getattr(self.market, table)(self._rng(query), sorted(dict.fromkeys(codes)), start, end)
+        if columns.strip() != "*":
+            df = df[[column.strip() for column in columns.split(",")]]
+        limit = re.search(r"LIMIT\s+(\d+)", rest, re.IGNORECASE)
+        return df.head(int(limit.group(1))) if limit else df
+
+    def _sql(self, handler, params: dict) -> None:
+        query = params.get("query")
+        if not query:
+            raise ValueError("Missing query")
+        handler.cached_frame(("sql", query), lambda: self.run_sql(query), legacy_json=True)
+
+    def _factor_data(self, handler, params: dict) -> None:
+        symbols = self._symbols(params)
+        names = params["factors"].split(",") if params.get("factors") else FACTOR_NAMES
+        key = json.dumps(params, sort_keys=True)
+        handler.cached_frame(("factors", key), lambda: self.market.factors(
+            self._rng(key), symbols, names, params.get("start_date"), params.get("end_date")))
+
+    def _ticks(self, handler, params: dict) -> None:
+        symbols = self._symbols(params)
+        self.feed.subscribe(symbols)
+        _, df = self.feed.since(0, symbols, params.get("channel", "tick"))
+        handler.frame(df if df is not None else pd.DataFrame({"order_book_id": [], "datetime": []}))
+
+    def _poll_ticks(self, handler, params: dict) -> None:
+        symbols = self._symbols(params)
+        channel = params.get("channel", "tick")
+        cursor = int(params["cursor"]) if "cursor" in params else None
+        deadline = time.time() + float(params.get("timeout", 30))
+        self.feed.subscribe(symbols)
+        while True:
+            current, df = self.feed.since(cursor, symbols, channel)
+            if df is not None and len(df):
+                return handler.frame(df, {"x-cursor": str(current)})
+            remaining = deadline - time.time()
+            if remaining <= 0 or self._stop.is_set():
+                return handler.reply(204, JSON, b"", {"x-cursor": str(current)})
+            # Nothing newer yet: hold the request until the feed moves on
+            if cursor is None:
+                cursor = current
+            with self.feed.condition:
+                self.feed.condition.wait(min(remaining, 1.0))
+
+    def start(self) -> "MockKKDatad":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self.feed.run, args=(self._stop,), daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockKKDatad":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for kkdatad")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between generated snapshots")
+    args = parser.parse_args()
+    server = MockKKDatad(args.host, args.port, args.interval)
+    print(f"Serving on {server.url}", flush=True)
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
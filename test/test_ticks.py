@@ -0,0 +1,150 @@
+"""
+Tick streaming against a local mock kkdatad (mock_kkdatad.py).
+
+The mock's feed is advanced by hand (its timer is set far beyond the test run), so each
+test knows exactly which batches the server holds. Run with pytest or unittest from the
+repository root.
+"""
+import logging
+import time
+import unittest
+import warnings
+import numpy as np
+import pandas as pd
+from mock_kkdatad import MockKKDatad
+from kkdatac.client import get_client
+from kkdatac.ticks import TickRingBuffer, TickStream
+
+SYMBOLS = ["000001.XSHE", "600000.XSHG"]
+POLL_TIMEOUT = 0.5
+
+
+def wait_until(condition, timeout: float = 10.0) -> None:
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("Timed out waiting for the tick stream")
+        time.sleep(0.01)
+
+
+class MockTickTest(unittest.TestCase):
+    def setUp(self):
+        warnings.simplefilter("ignore", UserWarning)
+        self.mock = MockKKDatad(tick_interval=3600).start()
+        self.addCleanup(self.mock.stop)
+        self.mock.feed.subscribe(SYMBOLS)
+
+    def stream(self, **kwargs) -> TickStream:
+        stream = TickStream(SYMBOLS, base_url=self.mock.url, poll_timeout=POLL_TIMEOUT, **kwargs)
+        self.addCleanup(stream.stop, 5)
+        return stream
+
+    def feed_batches(self, n: int) -> list[pd.DataFrame]:
+        for _ in range(n):
+            self.mock.feed.generate()
+        return [df for _, _, df in self.mock.feed.ticks[-n:]]
+
+
+class PollTicksTest(MockTickTest):
+    def test_cursor_handoff(self):
+        client = get_client(base_url=self.mock.url)
+        cursor, batch = client.poll_ticks(SYMBOLS, cursor=None, timeout=0.2)
+        self.assertEqual(cursor, 0)
+        self.assertIsNone(batch)
+
+        first = self.feed_batches(2)
+        cursor, batch = client.poll_ticks(SYMBOLS, cursor=cursor, timeout=0.2)
+        self.assertEqual(cursor, 2)
+        self.assertEqual(len(batch), 2 * len(SYMBOLS))
+        np.testing.assert_allclose(batch["last"], pd.concat(first)["last"])
+
+        # Polling from the returned cursor yields only what came after it
+        cursor, batch = client.poll_ticks(SYMBOLS, cursor=cursor, timeout=0.2)
+        self.assertEqual(cursor, 2)
+        self.assertIsNone(batch)
+        second = self.feed_batches(1)
+        cursor, batch = client.poll_ticks(SYMBOLS, cursor=cursor, timeout=0.2)
+        self.assertEqual(cursor, 3)
+        np.testing.assert_allclose(batch["last"], second[0]["last"])
+
+    def test_latest_without_cursor(self):
+        self.feed_batches(3)
+        client = get_client(base_url=self.mock.url)
+        cursor, batch = client.poll_ticks(SYMBOLS[:1], cursor=None, timeout=0.2)
+        self.assertEqual(cursor, 3)
+        self.assertEqual(batch["order_book_id"].tolist(), SYMBOLS[:1])
+
+
+class TickStreamTest(MockTickTest):
+    def test_stream_follows_cursor(self):
+        stream = self.stream().start()
+        wait_until(lambda: stream.cursor == 0)
+        batches = []
+        for n in range(1, 4):
+            batches += self.feed_batches(1)
+            wait_until(lambda: stream.cursor == n and stream.buffer.counts.min() == n)
+        self.assertEqual(stream.buffer.counts.tolist(), [3, 3])
+        snapshot = stream.snapshot()
+        expected = pd.concat(batches).sort_values("order_book_id", kind="stable")
+        np.testing.assert_allclose(snapshot["last"], expected["last"])
+        self.assertIsNone(stream.error)
+
+    def test_ring_buffer_wraparound(self):
+        stream = self.stream(capacity=3).start()
+        wait_until(lambda: stream.cursor == 0)
+        batches = []
+        for n in range(1, 6):
+            batches += self.feed_batches(1)
+            wait_until(lambda: stream.cursor == n)
+        wait_until(lambda: stream.buffer.counts.min() == 5)
+        self.assertEqual(len(stream.buffer), 3 * len(SYMBOLS))
+        snapshot = stream.snapshot()
+        expected = pd.concat(batches[-3:]).sort_values("order_book_id", kind="stable")
+        np.testing.assert_allclose(snapshot["last"], expected["last"])
+        self.assertTrue(snapshot.groupby("order_book_id", observed=True)["datetime"].is_monotonic_increasing.all())
+        latest = stream.latest()
+        np.testing.assert_allclose(latest["last"], batches[-1]["last"])
+
+    def test_callback_exception_keeps_polling(self):
+        stream = self.stream()
+        seen = []
+
+        @stream.on_tick
+        def failing(batch):
+            raise RuntimeError("callback failed")
+
+        stream.on_tick(seen.append)
+        with self.assertLogs("kkdatac", logging.ERROR) as logs:
+            stream.start()
+            wait_until(lambda: stream.cursor == 0)
+            for n in range(1, 4):
+                self.feed_batches(1)
+                wait_until(lambda: len(seen) == n)
+        self.assertEqual(len(logs.records), 3)
+        self.assertTrue(stream.running)
+        self.assertIsInstance(stream.error, RuntimeError)
+        self.assertEqual(stream.buffer.counts.tolist(), [3, 3])
+
+
+class TickRingBufferTest(unittest.TestCase):
+    def test_batch_larger_than_capacity(self):
+        buffer = TickRingBuffer(SYMBOLS, capacity=2, fields=("last",))
+        ticks = pd.DataFrame({
+            "order_book_id": [SYMBOLS[0]] * 5 + [SYMBOLS[1]],
+            "datetime": pd.date_range("2024-01-02 09:30", periods=6, freq="s"),
+            "last": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+        })
+        self.assertEqual(buffer.write(ticks), 6)
+        self.assertEqual(buffer.counts.tolist(), [5, 1])
+        self.assertEqual(buffer.to_frame()["last"].tolist(), [4.0, 5.0, 6.0])
+        self.assertEqual(buffer.latest()["last"].tolist(), [5.0, 6.0])
+
+    def test_unknown_symbols_are_ignored(self):
+        buffer = TickRingBuffer(SYMBOLS, capacity=2, fields=("last",))
+        ticks = pd.DataFrame({"order_book_id": ["000002.XSHE"], "datetime": [pd.Timestamp("2024-01-02")], "last": [1.0]})
+        self.assertEqual(buffer.write(ticks), 0)
+        self.assertEqual(len(buffer), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()